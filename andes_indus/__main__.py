@@ -16,9 +16,14 @@ def main():
         help="Fetch the data from the original sources and generates csv files.",
         action="store_true",
     )
+    parser.add_argument(
+        "--stream",
+        help="With --full, count the crimes page by page as they are fetched.",
+        action="store_true",
+    )
     args = parser.parse_args()
     if args.full:
-        gen_final_data(True)
+        gen_final_data(True, args.stream)
     else:
         if not path_puma.exists() or not path_neighborhood.exists():
             gen_final_data(False)
@@ -17,12 +17,14 @@ from .app_layout.app_utils import crime_labels
 from .app_layout.header import gen_header
 from .app_layout.load_data import (
     pumas_shp,
+    pumas_store,
     pumas_df_long,
     df_c,
     df_c_long,
     schools_df,
     pumas,
     neighborhood_shp,
+    neighborhood_store,
     crimes_shp,
 )
 from .app_layout.main_content import (
@@ -166,6 +168,7 @@ def update_charts(selected_year, selected_crime, selected_level, level_educ):
     if selected_level == "Puma":
         crime_map = create_crime_map(
             pumas_shp,
+            pumas_store,
             selected_crime,
             selected_year,
             crime_labels,
@@ -175,6 +178,7 @@ def update_charts(selected_year, selected_crime, selected_level, level_educ):
     else:
         crime_map = create_crime_map(
             neighborhood_shp,
+            neighborhood_store,
             selected_crime,
             selected_year,
             crime_labels,
@@ -5,17 +5,20 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from ..api_get import get_google_drive_files
+from ..geometry_store import GeometryStore
 
 
 def create_crime_map(
-    gdf: gpd.GeoDataFrame,
+    df: pd.DataFrame,
+    store: GeometryStore,
     selected_crime: str,
     selected_year: int,
     label_dict: dict,
     selected_level: str,
     level_label: str,
 ) -> alt.Chart:
-    gdf = gdf[gdf["year"] == selected_year].copy()
+    # Only the polygons of the selected year are built from the store
+    gdf = store.to_geodataframe(df[df["year"] == selected_year])
     map = (
         alt.Chart(gdf)
         .mark_geoshape(stroke="white", strokeWidth=0.5)
@@ -3,9 +3,13 @@ import pandas as pd
 import geopandas as gpd
 from .figures import load_crimes_shp
 from .app_utils import ATTENDANCE_COLS
+from ..geometry_store import load_geometry_store
+from ..shapefile_cache import load_shapefile
 
 # Loading data files - Puma level
-pumas_shp = gpd.read_file(Path("data/shapefiles/data_pumas.shp"))
+# The boundaries are kept once per polygon in a GeometryStore, and the
+# records point to them (see create_crime_map)
+pumas_store, pumas_shp = load_geometry_store(Path("data/shapefiles/data_pumas.shp"))
 pumas_shp = pumas_shp.rename(
     columns={"total_cr_1": "total_crim_pc", "non_viol_1": "non_violent_pc"}
 )
@@ -25,8 +29,10 @@ df_c = pd.read_csv(Path("data/census_df.csv"))
 df_c_long = pd.read_csv(Path("data/census_df_long.csv"))
 
 # Loading maps shapefiles
-pumas = gpd.read_file(Path("data/shapefiles/pumas/chicago_pumas.shp"))
-neighborhood_shp = gpd.read_file(Path("data/shapefiles/data_neighborhoods.shp"))
+pumas = load_shapefile(Path("data/shapefiles/pumas/chicago_pumas.shp"))
+neighborhood_store, neighborhood_shp = load_geometry_store(
+    Path("data/shapefiles/data_neighborhoods.shp")
+)
 neighborhood_shp = neighborhood_shp.rename(
     columns={"total_cr_1": "total_crim_pc", "non_viol_1": "non_violent_pc"}
 )
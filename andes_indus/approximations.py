@@ -0,0 +1,146 @@
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+# Cell states of a PolygonApproximation
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+# Cells along the longest side of the bbox of a polygon
+APPROX_RESOLUTION = 64
+
+
+class PolygonApproximation:
+    """
+    Conservative inner and outer approximations of a polygon, as a raster of
+    cells over its bbox. Each cell is:
+
+        - INSIDE: covered by the polygon. The INSIDE cells are the inner
+          approximation, a point in them is inside the polygon.
+        - OUTSIDE: does not touch the polygon. The cells that are not
+          OUTSIDE are the outer approximation, a point out of them is not
+          inside the polygon.
+        - BOUNDARY: crossed by the boundary of the polygon, only these
+          points need an exact contains test.
+
+    Cells are classified slightly enlarged (as in LookupGrid), so a point
+    rounded into a neighbouring cell is never resolved wrongly, and points
+    on the boundary of the polygon always fall in BOUNDARY cells.
+
+        - bounds: bbox of the polygon
+        - n_cols, n_rows: shape of the raster, with roughly square cells
+        - states: int8 array (n_rows * n_cols) with the state of each cell,
+          row by row from the south-west corner
+    """
+
+    def __init__(
+        self, geom: Polygon | MultiPolygon, resolution: int = APPROX_RESOLUTION
+    ):
+        if resolution < 1:
+            raise ValueError("resolution must be positive")
+        self.bounds = tuple(geom.bounds)
+        min_x, min_y, max_x, max_y = self.bounds
+        width, height = max_x - min_x, max_y - min_y
+        side = max(width, height) / resolution or 1.0
+        self.n_cols = max(1, int(np.ceil(width / side)))
+        self.n_rows = max(1, int(np.ceil(height / side)))
+        self.cell_width = width / self.n_cols or 1.0
+        self.cell_height = height / self.n_rows or 1.0
+
+        rows, cols = np.divmod(np.arange(self.n_rows * self.n_cols), self.n_cols)
+        pad_x, pad_y = self.cell_width * 1e-6, self.cell_height * 1e-6
+        cells = shapely.box(
+            min_x + cols * self.cell_width - pad_x,
+            min_y + rows * self.cell_height - pad_y,
+            min_x + (cols + 1) * self.cell_width + pad_x,
+            min_y + (rows + 1) * self.cell_height + pad_y,
+        )
+        shapely.prepare(geom)
+        states = np.full(len(cells), OUTSIDE, dtype=np.int8)
+        touched = shapely.intersects(geom, cells)
+        states[touched] = BOUNDARY
+        states[touched & shapely.covers(geom, cells)] = INSIDE
+        self.states = states
+        # bytes give plain ints to the scalar path
+        self._states = states.tobytes()
+
+    def __repr__(self) -> str:
+        counts = np.bincount(self.states, minlength=3)
+        return (
+            f"PolygonApproximation({self.n_cols}x{self.n_rows}, "
+            f"inside={counts[INSIDE]}, boundary={counts[BOUNDARY]})"
+        )
+
+    def classify_xy(self, x: float, y: float) -> int:
+        """
+        State of the cell of a single point (OUTSIDE out of the bbox).
+        """
+        min_x, min_y, max_x, max_y = self.bounds
+        if not (min_x < x < max_x and min_y < y < max_y):
+            return OUTSIDE
+        col = min(int((x - min_x) / self.cell_width), self.n_cols - 1)
+        row = min(int((y - min_y) / self.cell_height), self.n_rows - 1)
+        return self._states[row * self.n_cols + col]
+
+    def classify(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Vectorized classify_xy.
+
+        Returns:
+            An int8 array with the state of the cell of each point
+        """
+        min_x, min_y, max_x, max_y = self.bounds
+        states = np.full(len(xs), OUTSIDE, dtype=np.int8)
+        inside = np.flatnonzero(
+            (xs > min_x) & (xs < max_x) & (ys > min_y) & (ys < max_y)
+        )
+        cols = ((xs[inside] - min_x) / self.cell_width).astype(np.int64)
+        rows = ((ys[inside] - min_y) / self.cell_height).astype(np.int64)
+        np.minimum(cols, self.n_cols - 1, out=cols)
+        np.minimum(rows, self.n_rows - 1, out=rows)
+        states[inside] = self.states[rows * self.n_cols + cols]
+        return states
+
+    def contains_xy(
+        self, xs: np.ndarray, ys: np.ndarray, exact
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Two-tier contains test: points in INSIDE cells are accepted, points
+        in OUTSIDE cells rejected, and exact(xs, ys) is only called on the
+        points in BOUNDARY cells.
+
+        Returns:
+            A bool array, True for the points inside the polygon, and the
+            int64 positions of the points that needed the exact test
+        """
+        states = self.classify(xs, ys)
+        hits = states == INSIDE
+        boundary = np.flatnonzero(states == BOUNDARY)
+        if len(boundary):
+            hits[boundary] = exact(xs[boundary], ys[boundary])
+        return hits, boundary
+
+    def rectangles(self, state: int = INSIDE) -> np.ndarray:
+        """
+        The cells in a state as rectangles, with the runs of cells of each
+        row merged (rectangles(INSIDE) is the inner approximation).
+
+        Returns:
+            A float64 array (n_rectangles, 4) with min_x, min_y, max_x, max_y
+        """
+        grid = (self.states == state).reshape(self.n_rows, self.n_cols)
+        padded = np.zeros((self.n_rows, self.n_cols + 2), dtype=np.int8)
+        padded[:, 1:-1] = grid
+        steps = np.diff(padded, axis=1)
+        rows, starts = np.nonzero(steps == 1)
+        _, ends = np.nonzero(steps == -1)
+        min_x, min_y = self.bounds[:2]
+        return np.column_stack(
+            [
+                min_x + starts * self.cell_width,
+                min_y + rows * self.cell_height,
+                min_x + ends * self.cell_width,
+                min_y + (rows + 1) * self.cell_height,
+            ]
+        ).astype(np.float64)
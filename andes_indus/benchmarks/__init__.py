@@ -0,0 +1,57 @@
+import argparse
+
+from .assignment import bench_assign, bench_dedup, bench_parallel, bench_shared_index
+from .loading import bench_geometry_store, bench_shapefile_cache
+from .neighbors import bench_crosswalk, bench_kdtree
+from .queries import (
+    bench_approximations,
+    bench_clip,
+    bench_frozen,
+    bench_grid,
+    bench_morton,
+    bench_ray_casting,
+    bench_rtree,
+    bench_scalar_match,
+    bench_stats,
+)
+from .tables import bench_records, bench_stream
+
+# Benchmarks by name: each one takes the number of points n and prints its
+# results. queries: the quadtree and its variants, neighbors: radius and
+# overlap queries, assignment: crimes to divisions, tables: crime records,
+# loading: shapefiles and caches.
+BENCHMARKS = {
+    "scalar_match": bench_scalar_match,
+    "frozen": bench_frozen,
+    "clip": bench_clip,
+    "rtree": bench_rtree,
+    "kdtree": bench_kdtree,
+    "grid": bench_grid,
+    "approximations": bench_approximations,
+    "stats": bench_stats,
+    "ray_casting": bench_ray_casting,
+    "morton": bench_morton,
+    "assign": bench_assign,
+    "dedup": bench_dedup,
+    "records": bench_records,
+    "stream": bench_stream,
+    "geometry_store": bench_geometry_store,
+    "crosswalk": bench_crosswalk,
+    "shapefile_cache": bench_shapefile_cache,
+    "shared_index": bench_shared_index,
+    "parallel": bench_parallel,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks for the spatial assignment code."
+    )
+    parser.add_argument("benchmark", choices=[*BENCHMARKS, "all"])
+    parser.add_argument("-n", type=int, default=20000, help="number of points")
+    args = parser.parse_args()
+
+    names = BENCHMARKS if args.benchmark == "all" else [args.benchmark]
+    for name in names:
+        print(f"== {name} (n={args.n})")
+        BENCHMARKS[name](args.n)
@@ -0,0 +1,197 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ..coordinate_cache import CoordinateCache
+from ..crime_utils import Crime
+from ..merge_shp import (
+    assign_division_to_list,
+    assign_divisions,
+    assign_puma_neighborhood,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_multi_layer_index,
+    load_quadtree,
+)
+from ..parallel_assign import ParallelMatcher
+from ..quadtree import BBox
+from ..shared_index import SharedIndexHandle, SharedQuadtree
+from .common import (
+    PATH_PUMAS2020,
+    gen_sample_points,
+    load_layers,
+    timed,
+)
+
+
+def scalar_assign(crimes: list[Crime], quadtree) -> pd.DataFrame:
+    """
+    assign_puma_neighborhood as it was: assign_division per point and a
+    rebuilt Crime per match.
+    """
+    divisions = assign_division_to_list(crimes, quadtree)
+    return pd.DataFrame(
+        [
+            crime._replace(puma=puma)
+            for crime, puma in zip(crimes, divisions)
+            if puma is not None
+        ]
+    )
+
+
+def bench_assign(n: int) -> None:
+    """
+    assign_puma_neighborhood on n crimes: the scalar path (assign_division
+    per point and a rebuilt Crime per match, as before) against the id
+    column from assign_division_ids, from the list of crimes or from a
+    DataFrame.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        crimes = [
+            Crime(str(i), y, x, "", 2023, "", "", "", None, None)
+            for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))
+        ]
+        data = pd.DataFrame(crimes)
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        before = timed(scalar_assign, crimes, frozen)
+        from_list = timed(assign_puma_neighborhood, crimes, frozen, "puma")
+        from_frame = timed(assign_puma_neighborhood, data, frozen, "puma")
+        same = scalar_assign(crimes, frozen).equals(
+            assign_puma_neighborhood(data, frozen, "puma")
+        )
+        print(
+            f"{name:<14} scalar: {before:6.3f} s   vectorized: list "
+            f"{from_list:6.3f} s, DataFrame {from_frame:6.3f} s   identical: {same}"
+        )
+
+
+def bench_dedup(n: int) -> None:
+    """
+    assign_divisions on n crimes located on n / 20 blocks: every point
+    matched on the multi-layer index, against each block matched once
+    (CoordinateCache in memory) and against a cache file written by an
+    earlier run.
+    """
+    index = load_multi_layer_index()
+    rng = np.random.default_rng(30122)
+    n_blocks = max(n // 20, 1)
+    block_xs, block_ys = gen_sample_points(index.quadtree.bbox, n_blocks)
+    blocks = rng.integers(0, n_blocks, n)
+    data = pd.DataFrame({"longitude": block_xs[blocks], "latitude": block_ys[blocks]})
+    expected = assign_divisions(data, index)
+
+    cache_path = Path(tempfile.mkdtemp()) / "multi_layer.coords.npz"
+    cold = CoordinateCache(index, cache_path)
+    same = assign_divisions(data, index, cold).equals(expected)
+    cold.save()
+    print(f"report: {cold.report}")
+
+    every = timed(assign_divisions, data, index)
+    memory = timed(lambda: assign_divisions(data, index, CoordinateCache(index)))
+    warm = timed(
+        lambda: assign_divisions(data, index, CoordinateCache(index, cache_path))
+    )
+    print(
+        f"every point: {every:6.3f} s   dedup: {memory:6.3f} s   "
+        f"cache file: {warm:6.3f} s   identical: {same}"
+    )
+
+
+def private_memory() -> int:
+    """
+    Private (unshared) memory of this process in bytes, from
+    /proc/self/smaps_rollup (Linux only).
+    """
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def index_worker(args) -> tuple[int, float]:
+    """
+    Worker of bench_shared_index: gets the index (loads its cache file with
+    the given backend, or attaches to the shared block when given a handle)
+    and matches the points.
+
+    Returns:
+        The private memory added by the index and the queries, and the
+        time of the queries
+    """
+    source, backend, xs, ys = args
+    before = private_memory()
+    if isinstance(source, SharedIndexHandle):
+        quadtree = SharedQuadtree.attach(source)
+    else:
+        quadtree = load_quadtree(*source, backend=backend)
+    start = time.perf_counter()
+    quadtree.match_many(xs, ys)
+    elapsed = time.perf_counter() - start
+    return private_memory() - before, elapsed
+
+
+def bench_shared_index(n: int) -> None:
+    """
+    Private memory per worker process with its own copy of the pumas
+    quadtree (loaded from the cache file) against workers attached to one
+    SharedQuadtree, for 1, 2 and 4 spawned workers matching n points each.
+    Runs with the "shapely" backend (what load_quadtree, and so
+    ParallelMatcher, gives by default) and with "numpy".
+    """
+    layer = (PATH_PUMAS2020, 2020)
+    context = multiprocessing.get_context("spawn")
+    for backend in ("shapely", "numpy"):
+        frozen = load_quadtree(*layer, backend=backend)
+        xs, ys = gen_sample_points(BBox(*frozen.bounds[0]), n)
+        with SharedQuadtree.share(frozen) as shared:
+            print(f"{backend}: shared block {shared.nbytes / 1024:.1f} KiB")
+            for workers in (1, 2, 4):
+                for label, source in (("own copy", layer), ("shared", shared.handle)):
+                    args = [(source, backend, xs, ys)] * workers
+                    with context.Pool(workers) as pool:
+                        results = pool.map(index_worker, args)
+                    memory = np.mean([mem for mem, _ in results])
+                    elapsed = np.mean([t for _, t in results])
+                    print(
+                        f"{workers} workers  {label:<8}  private memory per "
+                        f"worker: {memory / 1024:8.1f} KiB   total: "
+                        f"{memory * workers / 1024:8.1f} KiB   "
+                        f"match_many: {elapsed * 1e3:6.1f} ms"
+                    )
+
+
+def bench_parallel(n: int) -> None:
+    """
+    Scaling of ParallelMatcher over 1 to N worker processes (N the number of
+    CPUs, and at least 4) on n points, against the serial match_many of the
+    same tree. Pool start-up is timed apart from the queries.
+    """
+    cpus = os.cpu_count() or 1
+    print(f"{cpus} CPUs")
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        expected = frozen.match_many(xs, ys)
+        serial = timed(frozen.match_many, xs, ys)
+        print(f"{name:<14} serial: {n / serial:11,.0f} points/s")
+        for workers in sorted({1, 2, 4, cpus}):
+            start = time.perf_counter()
+            with ParallelMatcher(frozen, workers) as matcher:
+                startup = time.perf_counter() - start
+                same = np.array_equal(matcher.match_many(xs, ys), expected)
+                elapsed = timed(matcher.match_many, xs, ys)
+            print(
+                f"{'':<14} {workers} workers: {n / elapsed:11,.0f} points/s "
+                f"(x{serial / elapsed:4.2f})   start-up: {startup * 1e3:6.1f} ms   "
+                f"identical: {same}"
+            )
@@ -0,0 +1,87 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from ..merge_shp import (
+    load_neighborhood_shp,
+    load_pumas_shp,
+)
+from ..quadtree import BBox
+
+PATH_PUMAS2020 = Path("data/shapefiles/pumas/pumas2022")
+PATH_NEIGHBORHOODS = Path("data/shapefiles/chicomm/chicomm")
+
+
+def load_layers() -> dict:
+    """
+    Load the boundary layers used in the benchmarks.
+
+    Returns:
+        dict: layer name -> list of Puma or Neighborhood objects
+    """
+    return {
+        "pumas2020": load_pumas_shp(PATH_PUMAS2020, 2020),
+        "neighborhoods": load_neighborhood_shp(PATH_NEIGHBORHOODS),
+    }
+
+
+def gen_sample_points(bbox: BBox, n: int, seed: int = 30122):
+    """
+    Random coordinates uniformly distributed over a bounding box.
+    """
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(bbox.min_x, bbox.max_x, n)
+    ys = rng.uniform(bbox.min_y, bbox.max_y, n)
+    return xs, ys
+
+
+def timed(func, *args, repeat: int = 3) -> float:
+    """
+    Best wall-clock time in seconds of func(*args) over a few repetitions.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def match_each(match_xy, xs, ys, *args) -> list:
+    """
+    Scalar queries: match_xy(x, y, *args) on every point, one call each.
+    """
+    return [match_xy(x, y, *args) for x, y in zip(xs, ys)]
+
+
+def traced(func, *args):
+    """
+    Result of func and the memory it allocated (traced by tracemalloc).
+    """
+    tracemalloc.start()
+    result = func(*args)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, memory
+
+
+def gen_crime_records(n: int, seed: int = 30122) -> list[dict]:
+    """
+    n crime records as returned by the API, over Chicago.
+    """
+    rng = np.random.default_rng(seed)
+    types = ["THEFT", "BATTERY", "ASSAULT", "ROBBERY", "HOMICIDE"]
+    return [
+        {
+            "case_number": f"JC{i:07d}",
+            "latitude": str(41.64 + 0.38 * rng.random()),
+            "longitude": str(-87.94 + 0.42 * rng.random()),
+            "block": f"0{i % 100:02d}XX S KEDZIE AVE",
+            "date": f"{(2013, 2018, 2023)[i % 3]}-04-12T08:30:00.000",
+            "primary_type": types[i % len(types)],
+            "description": ("SIMPLE", "AGGRAVATED - HANDGUN")[i % 7 == 0],
+        }
+        for i in range(n)
+    ]
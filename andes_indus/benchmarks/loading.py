@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+from shapely import get_num_coordinates
+
+from ..geometry_store import load_geometry_store
+from ..merge_shp import (
+    DIVISION_LAYERS,
+    PUMA_FIELDS,
+)
+from ..quadtree import BBox
+from ..ray_casting import RingPolygon
+from ..shapefile_cache import load_shapefile, read_shapefile
+from .common import (
+    gen_sample_points,
+    timed,
+)
+
+# Shapefiles loaded by the dashboard (app_layout/load_data.py)
+DASHBOARD_SHAPEFILES = [
+    Path("data/shapefiles/data_pumas.shp"),
+    Path("data/shapefiles/data_neighborhoods.shp"),
+    Path("data/shapefiles/pumas/chicago_pumas.shp"),
+]
+
+
+def bench_geometry_store(n: int) -> None:
+    """
+    Dashboard shapefiles read with geopandas against the cached
+    GeometryStore: load time, coordinate memory (float64 per record against
+    float32 per distinct polygon) and whether the ray-casting kernel fed
+    from the store gives the same answers on n points as the one built from
+    the float64 polygons.
+    """
+    for path in DASHBOARD_SHAPEFILES:
+        load_geometry_store(path)  # write the cache
+        gdf = gpd.read_file(path)
+        store, _ = load_geometry_store(path)
+        read = timed(gpd.read_file, path)
+        cached = timed(load_geometry_store, path)
+        coords = int(get_num_coordinates(gdf.geometry.values).sum()) * 16
+
+        geoms = store.to_shapely()
+        xs, ys = gen_sample_points(BBox(*gdf.total_bounds), n)
+        same = np.mean(
+            [
+                np.array_equal(
+                    store.ring_polygon(code).contains_xy(xs, ys),
+                    RingPolygon.from_geometry(geoms[code]).contains_xy(xs, ys),
+                )
+                for code in range(len(store))
+            ]
+        )
+        print(
+            f"{path.stem:<18} load: geopandas {read * 1e3:6.1f} ms, store "
+            f"{cached * 1e3:6.1f} ms   coordinates: {coords / 1024:7.1f} KiB -> "
+            f"{store.nbytes / 1024:6.1f} KiB ({len(gdf)} records, {len(store)} "
+            f"polygons)   identical kernels: {same:.0%}"
+        )
+
+
+def bench_shapefile_cache(n: int) -> None:
+    """
+    Loading the boundary layers: the shapefile read every time (all the
+    records with pyshp, as the loaders did, and with geopandas, as
+    gen_final_data did) against the filtered GeoDataFrame of the binary
+    cache (load_shapefile). n is not used.
+    """
+    for name, (path, pumas_year) in DIVISION_LAYERS.items():
+        where = None
+        if pumas_year:
+            where = (PUMA_FIELDS[pumas_year][1], "Chicago City")
+        load_shapefile(path, where)  # write the cache
+        pyshp = timed(read_shapefile, path, where)
+        geopandas = timed(gpd.read_file, path.with_suffix(".shp"))
+        cached = timed(load_shapefile, path, where)
+        print(
+            f"{name:<14} pyshp: {pyshp * 1e3:7.1f} ms   geopandas: "
+            f"{geopandas * 1e3:7.1f} ms   cache: {cached * 1e3:6.1f} ms "
+            f"({len(load_shapefile(path, where))} records)"
+        )
@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..crosswalk import OverlapMatrix
+from ..kdtree import KDTree, project_lonlat
+from ..merge_shp import (
+    gen_chi_bbox,
+)
+from .common import (
+    gen_sample_points,
+    load_layers,
+    timed,
+)
+
+
+def bench_kdtree(n: int) -> None:
+    """
+    Crimes within 500 m of 650 schools: KDTree radius counts and 10 nearest
+    crimes against a brute-force scan, over n random points in Chicago.
+    """
+    chi_bbox = gen_chi_bbox(load_layers()["neighborhoods"])
+    xs, ys = project_lonlat(*gen_sample_points(chi_bbox, n))
+    school_xs, school_ys = project_lonlat(*gen_sample_points(chi_bbox, 650, seed=1))
+
+    start = time.perf_counter()
+    kdtree = KDTree(xs, ys)
+    build = time.perf_counter() - start
+    counts = kdtree.count_within_radius_many(school_xs, school_ys, 500)
+    query = timed(kdtree.count_within_radius_many, school_xs, school_ys, 500)
+    brute = timed(
+        lambda: [
+            np.count_nonzero((xs - x) ** 2 + (ys - y) ** 2 <= 500**2)
+            for x, y in zip(school_xs, school_ys)
+        ],
+        repeat=1,
+    )
+    nearest = timed(kdtree.nearest_many, school_xs, school_ys, 10)
+    brute_nearest = timed(
+        lambda: [
+            np.argpartition((xs - x) ** 2 + (ys - y) ** 2, 9)[:10]
+            for x, y in zip(school_xs, school_ys)
+        ],
+        repeat=1,
+    )
+    print(
+        f"build: {build:6.2f} s   radius counts: {query:6.3f} s "
+        f"(brute force: {brute:6.3f} s)   10 nearest: {nearest:6.3f} s "
+        f"(brute force: {brute_nearest:6.3f} s)   "
+        f"mean crimes within 500 m: {counts.mean():.1f}"
+    )
+
+
+def bench_crosswalk(n: int) -> None:
+    """
+    Overlap areas between the two layers: every pair of polygons against
+    the candidates of Quadtree.overlap_areas, and n interpolations of a
+    value per polygon through the OverlapMatrix against a pandas merge of
+    its table.
+    """
+    layers = load_layers()
+    source, target = layers["pumas2020"], layers["neighborhoods"]
+    pairs = timed(
+        lambda: [
+            [s.polygon.intersection(t.polygon).area for t in target] for s in source
+        ],
+        repeat=1,
+    )
+    build = timed(OverlapMatrix.from_divisions, source, target, repeat=1)
+    matrix = OverlapMatrix.from_divisions(source, target)
+    values = pd.Series(
+        np.arange(len(source), dtype=np.float64), index=matrix.source_ids
+    )
+    table = matrix.to_frame()
+
+    def merged():
+        joined = table.merge(values.rename("value"), left_on="source", right_index=True)
+        return (
+            (joined["value"] * joined["source_share"]).groupby(joined["target"]).sum()
+        )
+
+    sparse = timed(lambda: [matrix.interpolate(values) for _ in range(n // 100)])
+    frame = timed(lambda: [merged() for _ in range(n // 100)])
+    print(
+        f"pumas2020 x neighborhoods ({len(source)}x{len(target)}, "
+        f"{len(matrix.areas)} overlaps)   all pairs: {pairs:5.2f} s   "
+        f"quadtree: {build:5.2f} s\n"
+        f"interpolate x{n // 100}: sparse {sparse * 1e3:7.1f} ms   "
+        f"pandas merge {frame * 1e3:7.1f} ms"
+    )
@@ -0,0 +1,329 @@
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+from shapely import contains_xy, destroy_prepared, get_num_coordinates
+from shapely.geometry import Point, box
+
+from ..crime_utils import Crime
+from ..lookup_grid import LookupGrid
+from ..merge_shp import (
+    assign_division_to_list,
+    gen_chi_bbox,
+    gen_quadtree,
+)
+from ..quadtree import Quadtree, morton_order
+from ..ray_casting import RingPolygon
+from .common import (
+    gen_sample_points,
+    load_layers,
+    match_each,
+    timed,
+)
+
+
+def legacy_match(node: Quadtree, point: Point) -> list[str]:
+    """
+    Reference copy of the original Quadtree.match, which builds a shapely
+    box for the node and each child and tests unprepared polygons.
+    """
+    results = []
+    node_box = box(node.bbox.min_x, node.bbox.min_y, node.bbox.max_x, node.bbox.max_y)
+    if not node_box.contains(point):
+        return results
+    if node.is_split():
+        for child in node.children:
+            child_box = box(
+                child.bbox.min_x, child.bbox.min_y, child.bbox.max_x, child.bbox.max_y
+            )
+            if child_box.contains(point):
+                results.extend(legacy_match(child, point))
+    else:
+        for pid, poly in node.polygons.items():
+            if poly.contains(point):
+                results.append(pid)
+    return results
+
+
+def legacy_point_match(node: Quadtree):
+    """
+    legacy_match as a function of the coordinates, for match_each.
+    """
+    return lambda x, y: legacy_match(node, Point(x, y))
+
+
+def morton_batch(frozen, xs: np.ndarray, ys: np.ndarray, bbox) -> np.ndarray:
+    """
+    match_many with the points sorted by Morton code, in the order of xs.
+    """
+    order = morton_order(xs, ys, bbox)
+    result = np.empty(len(xs), dtype=np.int64)
+    result[order] = frozen.match_many(xs[order], ys[order])
+    return result
+
+
+def contains_each(contains: list, xs: np.ndarray, ys: np.ndarray) -> list:
+    """
+    Every contains_xy function of a list on all the points.
+    """
+    return [contains_xy_of(xs, ys) for contains_xy_of in contains]
+
+
+def bench_scalar_match(n: int) -> None:
+    """
+    Per-query latency of the scalar path, before (legacy_match over
+    unprepared polygons) and after (match_xy over prepared polygons).
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+
+        # before: same tree shape, polygons unprepared
+        legacy_tree = gen_quadtree(division, chi_bbox)
+        destroy_prepared([div.polygon for div in division])
+        before = timed(match_each, legacy_point_match(legacy_tree), xs, ys)
+
+        quadtree = gen_quadtree(division, chi_bbox)
+        after_all = timed(match_each, quadtree.match_xy, xs, ys)
+        after_first = timed(match_each, quadtree.match_xy, xs, ys, True)
+        print(
+            f"{name:<14} before: {before / n * 1e6:7.2f} us/query   "
+            f"after: {after_all / n * 1e6:7.2f} us/query   "
+            f"after (first=True): {after_first / n * 1e6:7.2f} us/query"
+        )
+
+
+def bench_frozen(n: int) -> None:
+    """
+    Memory and query time of the Quadtree object tree against its
+    FrozenQuadtree compiled form.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+
+        # Python memory of the node objects (polygons are already loaded)
+        tracemalloc.start()
+        quadtree = gen_quadtree(division, chi_bbox)
+        tree_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        frozen = quadtree.freeze()
+
+        tree_scalar = timed(match_each, quadtree.match_xy, xs, ys)
+        frozen_scalar = timed(match_each, frozen.match_xy, xs, ys)
+        tree_batch = timed(quadtree.match_many, xs, ys)
+        frozen_batch = timed(frozen.match_many, xs, ys)
+        print(
+            f"{name:<14} nodes: {len(frozen.bounds):4d}   memory: "
+            f"{tree_bytes / 1024:7.1f} KiB -> {frozen.nbytes / 1024:5.1f} KiB   "
+            f"scalar: {tree_scalar / n * 1e6:6.2f} -> "
+            f"{frozen_scalar / n * 1e6:6.2f} us/query   "
+            f"batch: {n / tree_batch:10,.0f} -> {n / frozen_batch:10,.0f} points/s"
+        )
+
+
+def bench_clip(n: int) -> None:
+    """
+    Leaf-clipped polygon fragments against whole polygons on the leaves:
+    vertices per leaf geometry, fully covered leaf entries and throughput.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        for clip in (False, True):
+            frozen = gen_quadtree(division, chi_bbox, clip=clip).freeze()
+            vertices = get_num_coordinates(frozen.leaf_geoms).mean()
+            batch = timed(frozen.match_many, xs, ys)
+            scalar = timed(match_each, frozen.match_xy, xs, ys, True)
+            print(
+                f"{name:<14} clip={clip!s:<5}  "
+                f"vertices/leaf geometry: {vertices:7.1f}   "
+                f"full leaf entries: {frozen.leaf_full.mean():5.1%}   "
+                f"scalar: {scalar / n * 1e6:6.2f} us/query   "
+                f"batch: {n / batch:10,.0f} points/s"
+            )
+
+
+def bench_rtree(n: int) -> None:
+    """
+    Incremental Quadtree against the STR bulk-loaded RTree: build time,
+    memory of the node structures, depth and query throughput.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        for index in ("quadtree", "rtree"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            tree = gen_quadtree(division, chi_bbox, index=index)
+            build = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            is_quadtree = index == "quadtree"
+            depth = max(node_depths(tree)) if is_quadtree else len(tree.levels)
+
+            scalar = timed(match_each, tree.match_xy, xs, ys, True)
+            batch = timed(tree.match_many, xs, ys)
+            print(
+                f"{name:<14} {index:<9} build: {build * 1e3:6.1f} ms   "
+                f"memory: {memory / 1024:6.1f} KiB   depth: {depth}   "
+                f"scalar: {scalar / n * 1e6:6.2f} us/query   "
+                f"batch: {n / batch:10,.0f} points/s"
+            )
+
+
+def node_depths(quadtree: Quadtree) -> list[int]:
+    """
+    Depth of every leaf of a quadtree.
+    """
+    if quadtree.is_split():
+        return [depth for child in quadtree.children for depth in node_depths(child)]
+    return [quadtree.depth]
+
+
+def bench_stats(n: int) -> None:
+    """
+    Shape of the quadtree of each layer (stats), work per query (counters)
+    and the cost of match_xy with the counters disabled and enabled.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        stats = frozen.stats()
+
+        disabled = timed(match_each, frozen.match_xy, xs, ys, True)
+        counters = frozen.enable_counters()
+        enabled = timed(match_each, frozen.match_xy, xs, ys, True)
+        counters.reset()
+        frozen.match_many(xs, ys)
+        report = counters.report()
+        frozen.disable_counters()
+        print(
+            f"{name:<14} nodes: {stats['nodes']}   leaves: {stats['leaves']}   "
+            f"max depth: {stats['max_depth']}   "
+            f"duplication: {stats['duplication_factor']:.2f}\n"
+            f"{'':<14} depths: {stats['depth_histogram']}\n"
+            f"{'':<14} polygons per leaf: {stats['leaf_occupancy_histogram']}\n"
+            f"{'':<14} per query: {report['nodes_per_query']:.2f} nodes, "
+            f"{report['bbox_tests_per_query']:.2f} bbox tests, "
+            f"{report['contains_tests_per_query']:.2f} contains tests\n"
+            f"{'':<14} match_xy: {disabled / n * 1e6:.2f} us/query (counters off), "
+            f"{enabled / n * 1e6:.2f} us/query (counters on)"
+        )
+
+
+def bench_morton(n: int) -> None:
+    """
+    Scalar assignment (assign_division_to_list) and batched match_many with
+    the points in random order and sorted by Morton code first.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        crimes = [
+            Crime("", y, x, "", 2023, "", "", "", None, None)
+            for x, y in zip(xs.tolist(), ys.tolist())
+        ]
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        scalar = timed(assign_division_to_list, crimes, frozen, False)
+        scalar_morton = timed(assign_division_to_list, crimes, frozen, True)
+        batch = timed(frozen.match_many, xs, ys)
+        batch_morton = timed(morton_batch, frozen, xs, ys, chi_bbox)
+        print(
+            f"{name:<14} scalar: {n / scalar:9,.0f} -> {n / scalar_morton:9,.0f} "
+            f"points/s   batch: {n / batch:11,.0f} -> {n / batch_morton:11,.0f} "
+            f"points/s (random -> Morton order)"
+        )
+
+
+def bench_ray_casting(n: int) -> None:
+    """
+    shapely's contains_xy against the NumPy ray-casting kernel, both on
+    every polygon of a layer and as the leaf backend of the quadtree (run
+    with -n 1000000 for a million points).
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        rings = [RingPolygon.from_geometry(div.polygon) for div in division]
+        shapely_tests = [partial(contains_xy, div.polygon) for div in division]
+        polygons = timed(contains_each, shapely_tests, xs, ys, repeat=1)
+        kernel = timed(contains_each, [r.contains_xy for r in rings], xs, ys, repeat=1)
+
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        expected = frozen.match_many(xs, ys)
+        tree = timed(frozen.match_many, xs, ys, repeat=1)
+        frozen.backend = "numpy"
+        same = np.array_equal(frozen.match_many(xs, ys), expected)
+        tree_numpy = timed(frozen.match_many, xs, ys, repeat=1)
+        print(
+            f"{name:<14} all polygons: shapely {polygons:6.2f} s, "
+            f"numpy {kernel:6.2f} s   quadtree: shapely {n / tree:10,.0f} "
+            f"points/s, numpy {n / tree_numpy:10,.0f} points/s   identical: {same}"
+        )
+
+
+def bench_approximations(n: int) -> None:
+    """
+    Frozen quadtree with and without the inner/outer approximations of its
+    polygons at several resolutions: fraction of the scalar queries that
+    needed an exact contains test, build time of the approximations and
+    scalar and batched throughput (the batched path does not use them).
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        frozen = gen_quadtree(division, chi_bbox).freeze()
+        expected = frozen.match_many(xs, ys)
+        points = xs.tolist(), ys.tolist()
+        for resolution in (None, 16, 32, 64):
+            build = 0.0
+            if resolution is not None:
+                start = time.perf_counter()
+                frozen.approximate(resolution)
+                build = time.perf_counter() - start
+            counters = frozen.enable_counters()
+            codes = [frozen.match_xy(x, y, True) for x, y in zip(*points)]
+            exact = counters.report()["exact_fraction"]
+            frozen.disable_counters()
+            same = [match[0] if match else None for match in codes] == [
+                frozen.ids[code] if code >= 0 else None for code in expected
+            ]
+            scalar = timed(match_each, frozen.match_xy, *points, True, repeat=1)
+            label = "exact only" if resolution is None else f"approx {resolution:>3}"
+            print(
+                f"{name:<14} {label:<11} exact tests: {exact:6.2%}   "
+                f"build: {build:5.2f} s   "
+                f"scalar: {n / scalar:9,.0f} points/s   "
+                f"batch: {n / timed(frozen.match_many, xs, ys):11,.0f} points/s   "
+                f"identical: {same}"
+            )
+
+
+def bench_grid(n: int) -> None:
+    """
+    LookupGrid at several resolutions against the quadtree alone: build
+    time, memory, fraction of points that needed an exact test and
+    throughput.
+    """
+    for name, division in load_layers().items():
+        chi_bbox = gen_chi_bbox(division)
+        xs, ys = gen_sample_points(chi_bbox, n)
+        quadtree = gen_quadtree(division, chi_bbox)
+        batch = timed(quadtree.match_many, xs, ys)
+        print(f"{name:<14} quadtree          batch: {n / batch:11,.0f} points/s")
+        for resolution in (64, 256, 1024):
+            start = time.perf_counter()
+            grid = LookupGrid.from_index(quadtree, resolution)
+            build = time.perf_counter() - start
+            batch = timed(grid.match_many, xs, ys, repeat=1)
+            counters = grid.enable_counters()
+            grid.match_many(xs, ys)
+            print(
+                f"{name:<14} grid {resolution:>4}x{resolution:<4}   "
+                f"batch: {n / batch:11,.0f} points/s   "
+                f"exact tests: {counters.report()['exact_fraction']:6.2%}   "
+                f"build: {build:5.2f} s   memory: {grid.nbytes / 1024:7.1f} KiB"
+            )
@@ -0,0 +1,85 @@
+import time
+import tracemalloc
+
+import pandas as pd
+
+from ..crime_stream import count_crime_pages
+from ..crime_utils import CRIME_PAGE_SIZE, crime_table, process_results
+from ..join_data import group_crime_data_by
+from ..merge_shp import (
+    assign_divisions,
+    load_multi_layer_index,
+)
+from ..records import RecordTable
+from .common import (
+    gen_crime_records,
+    timed,
+    traced,
+)
+
+
+def bench_records(n: int) -> None:
+    """
+    n crimes (records of the API) as a list of Crime objects and as a
+    RecordTable: memory, time to build them, to split them by year and to
+    turn them into a pd.DataFrame.
+    """
+    results = gen_crime_records(n)
+    crimes, crimes_memory = traced(process_results, results, [], True)
+    table, table_memory = traced(crime_table, results)
+
+    def split_list():
+        by_year = {}
+        for crime in crimes:
+            by_year.setdefault(crime.year, []).append(crime)
+        return by_year
+
+    print(
+        f"memory: list {crimes_memory / 2**20:7.1f} MiB   table "
+        f"{table_memory / 2**20:7.1f} MiB\n"
+        f"build: list {timed(process_results, results, [], True, repeat=1):6.3f} s"
+        f"   table {timed(crime_table, results, repeat=1):6.3f} s\n"
+        f"split by year: list {timed(split_list) * 1e3:8.2f} ms   table "
+        f"{timed(table.split_years) * 1e3:8.2f} ms\n"
+        f"to DataFrame: list {timed(pd.DataFrame, crimes) * 1e3:8.2f} ms   "
+        f"table {timed(table.to_frame) * 1e3:8.2f} ms"
+    )
+
+
+def bench_stream(n: int) -> None:
+    """
+    Crimes by Puma and Neighborhood from n crime records: the batch path
+    (every record in one table, assigned and grouped at once) against
+    CrimeCounts fed one page at a time. The records are generated page by
+    page in both cases, so the peak memory traced is the one of the
+    pipeline.
+    """
+    index = load_multi_layer_index()
+    page_size = CRIME_PAGE_SIZE // 5
+
+    def pages():
+        for start in range(0, n, page_size):
+            yield gen_crime_records(min(page_size, n - start), seed=start)
+
+    def batch():
+        crimes = assign_divisions(
+            RecordTable.concat([crime_table(page) for page in pages()]), index
+        )
+        return group_crime_data_by(
+            crimes.assign(puma=crimes["pumas2020"]).dropna(subset="puma"), "puma"
+        )
+
+    def streamed():
+        return count_crime_pages(pages(), index, "pumas2020").to_frame("puma")
+
+    for name, func in (("batch", batch), ("stream", streamed)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        table = func()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"{name:<7} {elapsed:6.2f} s   peak memory: {peak / 2**20:7.1f} MiB   "
+            f"({len(table)} rows, {int(table['total_crimes'].sum())} crimes)"
+        )
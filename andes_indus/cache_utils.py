@@ -0,0 +1,103 @@
+import hashlib
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+# Bump when the layout of any cache file changes
+CACHE_VERSION = 5
+
+# Keys of the arrays of a table in a .npz cache file (see frame_to_arrays)
+TABLE_COLUMNS = "table_columns"
+COLUMN_PREFIX = "column:"
+NAMES_PREFIX = "names:"
+NULL_PREFIX = "null:"
+TEXT_BLOCK = "text"
+
+
+def file_hash(*paths: pathlib.Path) -> str:
+    """
+    SHA-256 hex digest of the content of one or more files, in order.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shapefile_hash(path: pathlib.Path) -> str:
+    """
+    Content hash of the .shp and .dbf files of a shapefile.
+
+    Inputs:
+        - path: path from a shapefile, with or without extension
+    """
+    path = pathlib.Path(path)
+    return file_hash(path.with_suffix(".shp"), path.with_suffix(".dbf"))
+
+
+def cache_key(*parts) -> str:
+    """
+    Builds a cache key from the cache version and any number of parts.
+    """
+    return "|".join(str(part) for part in (CACHE_VERSION, *parts))
+
+
+def frame_to_arrays(frame: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Columns of a DataFrame as arrays that np.savez can write without
+    pickling, grouped in blocks: the numeric and boolean columns of each
+    dtype in one 2-D array, and every other column as unicode strings in
+    another one, with a mask of the null values. Reading each member of a
+    .npz file has a fixed cost, so a wide table (data_pumas has 84
+    columns) is read in a few arrays instead of one or two per column.
+
+    Returns:
+        dict: TABLE_COLUMNS -> column names in order, and for each block
+        COLUMN_PREFIX + block -> values (n_rows, n_columns), NAMES_PREFIX +
+        block -> names of its columns, plus NULL_PREFIX + TEXT_BLOCK -> nulls
+        of the text columns
+    """
+    blocks = {}
+    for name, column in frame.items():
+        kind = column.to_numpy().dtype
+        block = kind.str if kind.kind in "biuf" else TEXT_BLOCK
+        blocks.setdefault(block, []).append(name)
+
+    arrays = {TABLE_COLUMNS: np.array(frame.columns.tolist(), dtype=str)}
+    for block, names in blocks.items():
+        arrays[f"{NAMES_PREFIX}{block}"] = np.array(names, dtype=str)
+        columns = [frame[name] for name in names]
+        if block != TEXT_BLOCK:
+            values = np.column_stack([column.to_numpy() for column in columns])
+        else:
+            null = np.column_stack([column.isna().to_numpy() for column in columns])
+            values = np.column_stack(
+                [column.to_numpy(dtype=object) for column in columns]
+            )
+            values[null] = ""
+            values = values.astype(str)
+            arrays[f"{NULL_PREFIX}{block}"] = null
+        arrays[f"{COLUMN_PREFIX}{block}"] = values
+    return arrays
+
+
+def arrays_to_frame(data) -> pd.DataFrame:
+    """
+    DataFrame written by frame_to_arrays, from an opened .npz file (or any
+    mapping of arrays), with the columns in their original order.
+    """
+    columns = {}
+    for key in data:
+        if not key.startswith(NAMES_PREFIX):
+            continue
+        block = key[len(NAMES_PREFIX) :]
+        values = data[f"{COLUMN_PREFIX}{block}"]
+        if block == TEXT_BLOCK:
+            values = values.astype(object)
+            values[data[f"{NULL_PREFIX}{block}"]] = None
+        for i, name in enumerate(data[key].tolist()):
+            columns[name] = values[:, i]
+    return pd.DataFrame({name: columns[name] for name in data[TABLE_COLUMNS].tolist()})
@@ -0,0 +1,239 @@
+import contextlib
+import hashlib
+import pathlib
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .cache_utils import cache_key
+from .quadtree import FrozenQuadtree, pack_wkb
+
+
+class CoordinateCacheError(Exception):
+    """Exception used within the coordinate cache for unexpected cases"""
+
+
+class DedupReport(NamedTuple):
+    """
+    Points matched through a CoordinateCache:
+
+        - points: points asked for
+        - located: points with coordinates (the others are not matched)
+        - unique: distinct coordinates among the located points
+        - cached: distinct coordinates answered by the cache
+        - queried: distinct coordinates matched on the index
+    """
+
+    points: int = 0
+    located: int = 0
+    unique: int = 0
+    cached: int = 0
+    queried: int = 0
+
+    @property
+    def unique_ratio(self) -> float:
+        """
+        Distinct coordinates per located point.
+        """
+        return self.unique / self.located if self.located else 0.0
+
+    @property
+    def queries_saved(self) -> int:
+        """
+        Spatial queries not run, against matching every located point.
+        """
+        return self.located - self.queried
+
+    def merge(self, other: "DedupReport") -> "DedupReport":
+        """
+        Counts of both reports added up.
+        """
+        return DedupReport(*(a + b for a, b in zip(self, other)))
+
+    def __str__(self) -> str:
+        return (
+            f"{self.points} points, {self.located} located, {self.unique} unique "
+            f"({self.unique_ratio:.1%}), {self.cached} from the cache: "
+            f"{self.queried} spatial queries ({self.queries_saved} saved)"
+        )
+
+
+def index_hash(matcher) -> str:
+    """
+    SHA-256 hex digest of the polygon ids and geometries of a FrozenQuadtree
+    (or of the quadtree of a MultiLayerIndex): two indexes with the same
+    hash match every point the same way. A SharedQuadtree keeps the hash
+    of the tree it was shared from (content_hash).
+    """
+    quadtree = getattr(matcher, "quadtree", matcher)
+    if not isinstance(quadtree, FrozenQuadtree):
+        raise CoordinateCacheError("index_hash needs a FrozenQuadtree")
+    content_hash = getattr(quadtree, "content_hash", None)
+    if content_hash is not None:
+        return content_hash
+    digest = hashlib.sha256()
+    digest.update("\0".join(quadtree.ids).encode())
+    digest.update(pack_wkb(quadtree.polygons)[0].tobytes())
+    return digest.hexdigest()
+
+
+def as_points(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Coordinates as complex128 (x + y j), so a pair can be sorted, searched
+    and compared as one value, exactly.
+    """
+    points = np.empty(len(xs), dtype=np.complex128)
+    points.real = xs
+    points.imag = ys
+    return points
+
+
+def unique_points(points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Same as np.unique(points, return_inverse=True), with a hash table
+    (pd.factorize) instead of sorting every point: only the distinct points
+    are sorted.
+
+    Returns:
+        The sorted distinct points, and the position of each point among them
+    """
+    inverse, uniques = pd.factorize(points)
+    order = np.argsort(uniques)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return uniques[order], rank[inverse]
+
+
+class CoordinateCache:
+    """
+    Wraps the match_many of an index (Quadtree, FrozenQuadtree,
+    MultiLayerIndex, ParallelMatcher...) so each distinct coordinate is
+    matched once. Crimes are located at block level, so many records share
+    the same longitude and latitude: the distinct points are matched and
+    the result is fanned back out to every point with an inverse index (see
+    unique_points).
+
+    The matches are kept (sorted by coordinate) and reused by the next
+    calls, and with a path they are saved to a .npz file and loaded again
+    in the next run, as long as the index did not change (the file is
+    keyed by index_hash, so the index must then be a FrozenQuadtree or a
+    MultiLayerIndex).
+
+    With max_points, the cache holds at most that many points (or the
+    distinct points of the last call, if there are more): when a call
+    would make it bigger, only the points of that call are kept.
+
+        - matcher: the wrapped index
+        - path: cache file, or None to keep the matches in memory only
+        - max_points: most points kept, or None for no limit
+        - points: complex128 array with the sorted coordinates matched
+        - codes: int64 array with the codes of match_many of each point
+        - report: DedupReport of every call since the cache was created
+        - last_report: DedupReport of the last call
+    """
+
+    def __init__(
+        self,
+        matcher,
+        path: pathlib.Path | None = None,
+        max_points: int | None = None,
+    ):
+        self.matcher = matcher
+        self.path = None if path is None else pathlib.Path(path)
+        self.max_points = max_points
+        self.key = (
+            None if path is None else cache_key("coordinates", index_hash(matcher))
+        )
+        self.points = np.empty(0, dtype=np.complex128)
+        self.codes = None
+        self.report = DedupReport()
+        self.last_report = DedupReport()
+        if self.path is not None and self.path.exists():
+            # stale or unreadable: start empty
+            with contextlib.suppress(
+                CoordinateCacheError, OSError, ValueError, KeyError
+            ):
+                self.load()
+
+    def __repr__(self) -> str:
+        return f"CoordinateCache(points={len(self.points)}, path={self.path})"
+
+    @property
+    def ids(self) -> list[str]:
+        """
+        Ids of the wrapped index, so the cache can be used instead of a
+        quadtree (e.g. by assign_division_ids).
+        """
+        return self.matcher.ids
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Same as the match_many of the wrapped index, with each distinct
+        coordinate matched at most once. Points with a NaN coordinate get
+        -1 (no match).
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise CoordinateCacheError(
+                "xs and ys must be 1-D arrays of the same length"
+            )
+
+        located = ~(np.isnan(xs) | np.isnan(ys))
+        points, inverse = unique_points(as_points(xs[located], ys[located]))
+        pos = np.searchsorted(self.points, points)
+        cached = np.zeros(len(points), dtype=bool)
+        if len(self.points):
+            in_range = pos < len(self.points)
+            cached[in_range] = self.points[pos[in_range]] == points[in_range]
+
+        new = points[~cached]
+        new_codes = self.matcher.match_many(
+            np.ascontiguousarray(new.real), np.ascontiguousarray(new.imag)
+        )
+        if self.codes is None:
+            self.codes = np.empty((0, *new_codes.shape[1:]), dtype=np.int64)
+        unique_codes = np.empty((len(points), *new_codes.shape[1:]), dtype=np.int64)
+        unique_codes[cached] = self.codes[pos[cached]]
+        unique_codes[~cached] = new_codes
+        if (
+            self.max_points is not None
+            and len(self.points) + len(new) > self.max_points
+        ):
+            # Full: start again from the points of this call (sorted)
+            self.points = points
+            self.codes = unique_codes
+        else:
+            # Both are sorted: inserting at pos keeps the cache sorted
+            self.points = np.insert(self.points, pos[~cached], new)
+            self.codes = np.insert(self.codes, pos[~cached], new_codes, axis=0)
+
+        codes = np.full((len(xs), *new_codes.shape[1:]), -1, dtype=np.int64)
+        codes[located] = unique_codes[inverse.ravel()]
+
+        self.last_report = DedupReport(
+            len(xs), int(located.sum()), len(points), int(cached.sum()), len(new)
+        )
+        self.report = self.report.merge(self.last_report)
+        return codes
+
+    def save(self) -> None:
+        """
+        Write the matches to the cache file (nothing without a path).
+        """
+        if self.path is None or self.codes is None:
+            return
+        with open(self.path, "wb") as f:
+            np.savez(f, key=np.array(self.key), points=self.points, codes=self.codes)
+
+    def load(self) -> None:
+        """
+        Read the matches of the cache file. A CoordinateCacheError is
+        raised when it was written for another index.
+        """
+        with np.load(self.path, allow_pickle=False) as data:
+            if str(data["key"]) != self.key:
+                raise CoordinateCacheError(f"stale coordinate cache in {self.path}")
+            self.points = data["points"]
+            self.codes = data["codes"]
@@ -0,0 +1,150 @@
+import pathlib
+from collections import Counter
+from collections.abc import Iterable
+
+import pandas as pd
+
+from .coordinate_cache import CoordinateCache
+from .crime_utils import (
+    CRIME_DATA_SET,
+    CRIME_PAGE_SIZE,
+    CRIME_SCHEMA,
+    classify_violent_crimes,
+    crime_client,
+    crime_table,
+    iter_crime_pages,
+    pivot_crime_counts,
+)
+from .merge_shp import assign_divisions, load_multi_layer_index
+from .multi_layer import MultiLayerIndex
+
+# Layer of the index with the Puma of the crimes of each period (the
+# Pumas changed in 2020), and the one with their Neighborhood
+PUMA_LAYERS = {(2023,): "pumas2020", (2013, 2018): "pumas2010"}
+NEIGHBORHOOD_LAYER = "neighborhoods"
+
+# Most distinct locations kept by the CoordinateCache of stream_crime_data,
+# so its memory does not grow with the number of crimes either
+STREAM_CACHE_POINTS = 200_000
+
+
+def stream_cache(
+    index: MultiLayerIndex, path: pathlib.Path | None = None
+) -> CoordinateCache:
+    """
+    CoordinateCache of the index for stream_crime_data: at most
+    STREAM_CACHE_POINTS, kept in path (e.g. COORDINATE_CACHE_PATH) for the
+    next runs if given, or in memory only.
+    """
+    return CoordinateCache(index, path, max_points=STREAM_CACHE_POINTS)
+
+
+class CrimeCounts:
+    """
+    Running number of crimes of each (division, year, crime_type), for the
+    Pumas and the Neighborhoods. Pages of crimes are added as they arrive
+    and only the counts are kept, so memory does not grow with the number
+    of crimes.
+
+        - counts: group ("puma" or "neighborhood") -> Counter of
+          (division id, year, crime_type) -> number of crimes
+        - n_crimes: crimes added with coordinates (records without a
+          latitude are dropped by crime_table), with or without a division
+    """
+
+    def __init__(self):
+        self.counts = {"puma": Counter(), "neighborhood": Counter()}
+        self.n_crimes = 0
+
+    def __repr__(self) -> str:
+        sizes = {group: len(counter) for group, counter in self.counts.items()}
+        return f"CrimeCounts(crimes={self.n_crimes}, keys={sizes})"
+
+    def add_page(
+        self,
+        page: list[dict] | pd.DataFrame,
+        index: MultiLayerIndex,
+        puma_layer: str,
+        cache: CoordinateCache | None = None,
+    ) -> None:
+        """
+        Classifies a page of crime records, assigns their Puma (from
+        puma_layer) and Neighborhood and adds them to the counts. Crimes
+        without coordinates or without a division are not counted, as in
+        the batch path (gen_final_data). With a CoordinateCache of the index
+        the blocks already seen in earlier pages are not matched again.
+        """
+        crimes = classify_violent_crimes(
+            assign_divisions(crime_table(page), index, cache)
+        )
+        self.n_crimes += len(crimes)
+        for group, layer in (
+            ("puma", puma_layer),
+            ("neighborhood", NEIGHBORHOOD_LAYER),
+        ):
+            located = crimes[crimes[layer].notna()]
+            sizes = located.groupby([layer, "year", "crime_type"]).size()
+            for (division, year, crime_type), size in sizes.items():
+                self.counts[group][division, int(year), crime_type] += int(size)
+
+    def to_frame(self, group: str) -> pd.DataFrame:
+        """
+        Same table as join_data.group_crime_data_by for the crimes added.
+        """
+        counts = pd.DataFrame(
+            [(*key, size) for key, size in self.counts[group].items()],
+            columns=[group, "year", "crime_type", "Count"],
+        ).astype({"year": CRIME_SCHEMA["year"]})
+        return pivot_crime_counts(counts, group)
+
+
+def stream_crime_data(
+    index: MultiLayerIndex | None = None,
+    client=None,
+    page_size: int = CRIME_PAGE_SIZE,
+    cache: CoordinateCache | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Streaming version of the crime tables of gen_final_data: the crimes are
+    fetched one page at a time and each page is assigned and counted before
+    the next one, so peak memory depends on page_size and not on the number
+    of crimes.
+
+    Inputs:
+        - index: MultiLayerIndex with the PUMA_LAYERS and the
+          NEIGHBORHOOD_LAYER (load_multi_layer_index by default)
+        - client: Socrata client (crime_client by default)
+        - page_size: records per request
+        - cache: CoordinateCache of the index shared by all the pages (by
+          default a new one, in memory, of at most STREAM_CACHE_POINTS).
+          Use stream_cache for one kept in a file: a cache without
+          max_points grows with the number of crimes.
+
+    Returns:
+        The crimes by Puma and by Neighborhood, as group_crime_data_by
+    """
+    index = load_multi_layer_index() if index is None else index
+    client = crime_client() if client is None else client
+    if cache is None:
+        cache = stream_cache(index)
+    counts = CrimeCounts()
+    for years, puma_layer in PUMA_LAYERS.items():
+        for page in iter_crime_pages(client, CRIME_DATA_SET, list(years), page_size):
+            counts.add_page(page, index, puma_layer, cache)
+    return counts.to_frame("puma"), counts.to_frame("neighborhood")
+
+
+def count_crime_pages(
+    pages: Iterable[list[dict]],
+    index: MultiLayerIndex,
+    puma_layer: str,
+    cache: CoordinateCache | None = None,
+) -> CrimeCounts:
+    """
+    CrimeCounts of the crimes of several pages, all of them assigned with
+    the same puma_layer (and the same CoordinateCache, if any).
+    """
+    counts = CrimeCounts()
+    for page in pages:
+        counts.add_page(page, index, puma_layer, cache)
+    return counts
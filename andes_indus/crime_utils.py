@@ -4,6 +4,7 @@ import os
 import pandas as pd
 import numpy as np
 from .api_get import get_google_drive_files
+from .records import RecordTable
 
 
 class Crime(NamedTuple):
@@ -19,27 +20,46 @@ class Crime(NamedTuple):
     neighborhood: None | str
 
 
+# Crimes data set of the City of Chicago, and records per page when streaming it
+CRIME_DATA_SET = "ijzp-q8t2"
+CRIME_PAGE_SIZE = 50000
+
+# Column types of the Crime fields in a RecordTable
+CRIME_SCHEMA = {
+    "case_number": "object",
+    "latitude": "float64",
+    "longitude": "float64",
+    "block": "category",
+    "year": "int16",
+    "date": "object",
+    "primary_type": "category",
+    "description": "category",
+    "puma": "category",
+    "neighborhood": "category",
+}
+
+
 def get_crime_data(
-    client, data_set: str, lst_years: list, full_fetch=False
-) -> list[Crime]:
+    client, data_set: str, lst_years: list, full_fetch=False, columnar=False
+) -> list[Crime] | RecordTable:
     """
     Gathers data from an specific dataset from the City of Chicago's Data
 
     Args:
         - data_set: data set code
         - lst_years: list of years to gather
+        - columnar: return a RecordTable (see crime_table) instead of a list
 
     Returns:
     """
+    process = crime_table if columnar else process_results
     if full_fetch:
         if data_set == "gumc-mgzr":
             results = client.get(data_set, limit=100000000)
-            return process_results(results, [], full_fetch)
+            return process(results, [], full_fetch)
         else:
             results = [client.get(data_set, year=y, limit=100000000) for y in lst_years]
-            return process_results(
-                [r for year in results for r in year], [], full_fetch
-            )
+            return process([r for year in results for r in year], [], full_fetch)
 
 
 def process_results(results, lst_results, full_fetch=False) -> list:
@@ -83,6 +103,30 @@ def process_results(results, lst_results, full_fetch=False) -> list:
     return lst_results
 
 
+def crime_table(results, lst_results=None, full_fetch=False) -> RecordTable:
+    """
+    Same as process_results, with the Crimes in a RecordTable (CRIME_SCHEMA)
+    built from whole columns instead of one Crime per row.
+
+    Inputs:
+        - results: the records (dicts) of the API, or a pd.DataFrame
+        - lst_results, full_fetch: unused, same signature as process_results
+    """
+    data = pd.DataFrame(results)
+    if "latitude" not in data.columns:
+        data = pd.DataFrame(columns=["latitude", "date"])
+    data = data[data["latitude"].notna()]
+    # Fields missing from a record (or from all of them) get the defaults of
+    # process_results
+    missing = pd.Series(index=data.index, dtype=object)
+    data = data.assign(
+        year=data["date"].astype(str).str[0:4],
+        primary_type=data.get("primary_type", missing),
+        description=data.get("description", missing),
+    ).fillna({"primary_type": "homicide", "description": "-"})
+    return RecordTable.from_frame(data, CRIME_SCHEMA)
+
+
 def classify_violent_crimes(df: pd.DataFrame) -> pd.DataFrame:
     '''
     Helper function to classify crimes into violent or non violent crime
@@ -98,9 +142,28 @@ def classify_violent_crimes(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def get_all_crime_data():
+def pivot_crime_counts(counts: pd.DataFrame, group: str) -> pd.DataFrame:
+    '''
+    Helper function that turns the number of crimes ("Count") of each Puma or
+    Neighborhood (group), year and crime_type into one row per group and year,
+    with a column per crime_type and the total_crimes
+    '''
+    final_data = counts.pivot_table(
+        index=[group, "year"],
+        columns="crime_type",
+        values="Count",
+        fill_value=0,
+        aggfunc="sum",
+    )
+    final_data = final_data.reset_index()
+    final_data["total_crimes"] = final_data.drop(columns=[group, "year"]).sum(axis=1)
+    return final_data
+
+
+def crime_client() -> Socrata:
     '''
-    Fetch the data from the original source
+    Client of the City of Chicago's Data, with the APP Token of the
+    environment
     '''
     # Creating the APP Key for the data sources.
     try:
@@ -109,22 +172,51 @@ def get_all_crime_data():
         raise Exception(
             "Make sure that you have set the APP Token environment variable as described in the README."
         )
+    return Socrata("data.cityofchicago.org", CHICAGO_APP_TOKEN)
 
+
+def get_all_crime_data(columnar=False):
+    '''
+    Fetch the data from the original source (as RecordTables if columnar)
+    '''
     # Gathering the crime data from the City of Chicago Data web
-    client = Socrata("data.cityofchicago.org", CHICAGO_APP_TOKEN)
-    crime_code = "ijzp-q8t2"
+    client = crime_client()
     lst_years = [2013, 2018, 2023]
 
-    crime_data_23 = get_crime_data(client, crime_code, [2023], True)
-    crime_data_1318 = get_crime_data(client, crime_code, lst_years[0:2], True)
+    crime_data_23 = get_crime_data(client, CRIME_DATA_SET, [2023], True, columnar)
+    crime_data_1318 = get_crime_data(
+        client, CRIME_DATA_SET, lst_years[0:2], True, columnar
+    )
 
-    crime_df_23 = classify_violent_crimes(pd.DataFrame(crime_data_23))
-    crime_df_1318 = classify_violent_crimes(pd.DataFrame(crime_data_1318))
-    crime_df = pd.concat([crime_df_23, crime_df_1318])
+    return crime_data_23, crime_data_1318
 
-    # crime_df.to_csv("data/crime_df.csv", index=False)
 
-    return crime_data_23, crime_data_1318
+def iter_crime_pages(
+    client, data_set: str, lst_years: list, page_size: int = CRIME_PAGE_SIZE
+):
+    """
+    Same records as get_crime_data, fetched one page at a time.
+
+    Args:
+        - data_set: data set code
+        - lst_years: list of years to gather
+        - page_size: records per request
+
+    Yields:
+        The records (dicts) of each page, at most page_size
+    """
+    for year in lst_years:
+        offset = 0
+        while True:
+            # a stable order, so the pages neither overlap nor skip records
+            page = client.get(
+                data_set, year=year, limit=page_size, offset=offset, order=":id"
+            )
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            offset += page_size
 
 
 def load_crime_data():
@@ -0,0 +1,291 @@
+import argparse
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from .cache_utils import cache_key, shapefile_hash
+from .merge_shp import (
+    DIVISION_LAYERS,
+    Neighborhood,
+    Puma,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_division,
+)
+
+CROSSWALK_DIR = pathlib.Path("data/shapefiles")
+
+
+class CrosswalkError(Exception):
+    """Exception used within the crosswalk for unexpected cases"""
+
+
+class OverlapMatrix:
+    """
+    Sparse matrix of the overlap areas between the polygons of a source
+    and a target layer, in CSR form:
+
+        - source_ids, target_ids: ids of the polygons of each layer
+        - indptr: int64 array, the overlaps of source polygon i are the
+          entries indptr[i] : indptr[i + 1]
+        - indices: int64 array with the target polygon of each entry
+        - areas: float64 array with the overlap area of each entry
+        - source_areas, target_areas: float64 arrays with the area of each
+          polygon
+
+    Only the pairs with a positive overlap are stored.
+    """
+
+    def __init__(
+        self,
+        source_ids: list[str],
+        target_ids: list[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        areas: np.ndarray,
+        source_areas: np.ndarray,
+        target_areas: np.ndarray,
+    ):
+        if len(indptr) != len(source_ids) + 1:
+            raise CrosswalkError("indptr must have len(source_ids) + 1 entries")
+        self.source_ids = list(source_ids)
+        self.target_ids = list(target_ids)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.areas = np.asarray(areas, dtype=np.float64)
+        self.source_areas = np.asarray(source_areas, dtype=np.float64)
+        self.target_areas = np.asarray(target_areas, dtype=np.float64)
+
+    @classmethod
+    def from_divisions(
+        cls,
+        source: list[Puma | Neighborhood],
+        target: list[Puma | Neighborhood],
+    ) -> "OverlapMatrix":
+        """
+        Build the matrix with a quadtree over the target polygons (see
+        Quadtree.overlap_areas).
+        """
+        quadtree = gen_quadtree(target, gen_chi_bbox(target)).freeze()
+        rows, codes, areas = quadtree.overlap_areas([div.polygon for div in source])
+        # target ids in the order of the division, not of the tree
+        position = {div.id: i for i, div in enumerate(target)}
+        columns = np.array([position[pid] for pid in quadtree.ids], dtype=np.int64)
+        indptr = np.zeros(len(source) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(source)), out=indptr[1:])
+        return cls(
+            [div.id for div in source],
+            [div.id for div in target],
+            indptr,
+            columns[codes] if len(codes) else codes,
+            areas,
+            np.array([div.polygon.area for div in source]),
+            np.array([div.polygon.area for div in target]),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"OverlapMatrix({len(self.source_ids)}x{len(self.target_ids)}, "
+            f"entries={len(self.areas)})"
+        )
+
+    @property
+    def rows(self) -> np.ndarray:
+        """
+        Source polygon of each entry.
+        """
+        return np.repeat(np.arange(len(self.source_ids)), np.diff(self.indptr))
+
+    def transpose(self) -> "OverlapMatrix":
+        """
+        Same overlaps, from the target layer to the source layer.
+        """
+        order = np.lexsort((self.rows, self.indices))
+        indptr = np.zeros(len(self.target_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.indices, minlength=len(self.target_ids)),
+            out=indptr[1:],
+        )
+        return OverlapMatrix(
+            self.target_ids,
+            self.source_ids,
+            indptr,
+            self.rows[order],
+            self.areas[order],
+            self.target_areas,
+            self.source_areas,
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        One row per overlap: source and target ids, area, and the share of
+        the source and of the target polygon that it covers.
+        """
+        rows = self.rows
+        return pd.DataFrame(
+            {
+                "source": np.array(self.source_ids, dtype=object)[rows],
+                "target": np.array(self.target_ids, dtype=object)[self.indices],
+                "area": self.areas,
+                "source_share": self.areas / self.source_areas[rows],
+                "target_share": self.areas / self.target_areas[self.indices],
+            }
+        )
+
+    def interpolate(
+        self, values: pd.Series | np.ndarray, extensive: bool = True
+    ) -> pd.Series:
+        """
+        Areal interpolation of source values onto the target polygons, as a
+        sparse matrix-vector product.
+
+        Inputs:
+            - values: one value per source polygon, a Series indexed by
+              source id or an array in the order of source_ids
+            - extensive: True for counts (population, crimes): each source
+              value is split by the share of the source polygon in each
+              target. False for rates and averages: each target gets the
+              mean of the sources, weighted by overlap area.
+
+        Returns:
+            A Series indexed by target id (NaN for targets without any
+            overlap with a source that has a value)
+        """
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.source_ids).to_numpy(np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) != len(self.source_ids):
+            raise ValueError("values must have one entry per source polygon")
+
+        rows = self.rows
+        known = ~np.isnan(values[rows])
+        n_targets = len(self.target_ids)
+        if extensive:
+            weights = self.areas / self.source_areas[rows]
+            result = np.bincount(
+                self.indices[known],
+                weights=(weights * values[rows])[known],
+                minlength=n_targets,
+            )
+            covered = np.bincount(self.indices[known], minlength=n_targets) > 0
+            result[~covered] = np.nan
+        else:
+            total = np.bincount(
+                self.indices[known],
+                weights=(self.areas * values[rows])[known],
+                minlength=n_targets,
+            )
+            area = np.bincount(
+                self.indices[known], weights=self.areas[known], minlength=n_targets
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = total / area
+        return pd.Series(result, index=pd.Index(self.target_ids, name="target"))
+
+    def save(self, path, key: str = "") -> None:
+        """
+        Write the matrix to a .npz file, with a cache key checked by load.
+        """
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                key=np.array(key),
+                source_ids=np.array(self.source_ids, dtype=str),
+                target_ids=np.array(self.target_ids, dtype=str),
+                indptr=self.indptr,
+                indices=self.indices,
+                areas=self.areas,
+                source_areas=self.source_areas,
+                target_areas=self.target_areas,
+            )
+
+    @classmethod
+    def load(cls, path, key: str | None = None) -> "OverlapMatrix":
+        """
+        Read a matrix written by save. A CrosswalkError is raised when key
+        is given and the stored key is different (stale matrix).
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if key is not None and str(data["key"]) != key:
+                raise CrosswalkError(f"stale overlap matrix in {path}")
+            return cls(
+                data["source_ids"].tolist(),
+                data["target_ids"].tolist(),
+                data["indptr"],
+                data["indices"],
+                data["areas"],
+                data["source_areas"],
+                data["target_areas"],
+            )
+
+
+def load_overlap_matrix(
+    source: str,
+    target: str,
+    layers: dict[str, tuple[pathlib.Path, int | None]] = DIVISION_LAYERS,
+    cache_dir: pathlib.Path = CROSSWALK_DIR,
+) -> OverlapMatrix:
+    """
+    Loads the OverlapMatrix between two boundary layers from a cache file,
+    rebuilt when it is missing or stale (keyed by the content of both
+    shapefiles, as load_quadtree).
+
+    Inputs:
+        - source, target: layer names, keys of layers
+        - layers: layer name -> (path from a shapefile, pumas_year)
+        - cache_dir: folder of the cache files
+    """
+    cache_path = pathlib.Path(cache_dir) / f"{source}_{target}.xwalk.npz"
+    key = cache_key(
+        "crosswalk",
+        *[
+            (layer, shapefile_hash(layers[layer][0]), layers[layer][1])
+            for layer in (source, target)
+        ],
+    )
+
+    if cache_path.exists():
+        try:
+            return OverlapMatrix.load(cache_path, key)
+        except (CrosswalkError, OSError, ValueError, KeyError):
+            pass  # stale or unreadable: rebuild it
+
+    matrix = OverlapMatrix.from_divisions(
+        load_division(*layers[source]), load_division(*layers[target])
+    )
+    matrix.save(cache_path, key)
+    return matrix
+
+
+def crosswalk_table(
+    source: str, target: str, output: pathlib.Path | None = None
+) -> pd.DataFrame:
+    """
+    Overlap table (OverlapMatrix.to_frame) between two boundary layers,
+    also written to a CSV file when output is given.
+    """
+    table = load_overlap_matrix(source, target).to_frame()
+    if output is not None:
+        table.to_csv(output, index=False)
+    return table
+
+
+def main() -> pd.DataFrame | None:
+    parser = argparse.ArgumentParser(
+        description="Overlap (crosswalk) table between two boundary layers."
+    )
+    parser.add_argument("source", choices=list(DIVISION_LAYERS))
+    parser.add_argument("target", choices=list(DIVISION_LAYERS))
+    parser.add_argument("-o", "--output", type=pathlib.Path, help="CSV file")
+    args = parser.parse_args()
+
+    table = crosswalk_table(args.source, args.target, args.output)
+    # Without a CSV file, the table is printed
+    return None if args.output else table
+
+
+if __name__ == "__main__":
+    table = main()
+    if table is not None:
+        print(table.to_string(index=False))
@@ -0,0 +1,372 @@
+import functools
+import itertools
+import pathlib
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyproj
+import shapefile
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+from .cache_utils import arrays_to_frame, cache_key, frame_to_arrays, shapefile_hash
+from .ray_casting import RingPolygon
+
+# Column of the records of from_shapefile with the code of each geometry
+GEOMETRY_CODE = "geometry_code"
+
+
+class GeometryStoreError(Exception):
+    """Exception used within GeometryStore for unexpected cases"""
+
+
+def read_records(path: pathlib.Path) -> pd.DataFrame:
+    """
+    Attribute table of a shapefile, with the same column types as
+    gpd.read_file but without reading the geometries.
+    """
+    return pd.DataFrame(
+        gpd.read_file(pathlib.Path(path).with_suffix(".shp"), ignore_geometry=True)
+    )
+
+
+def read_crs(path: pathlib.Path) -> str | None:
+    """
+    CRS of a shapefile from its .prj, None without one. "EPSG:4269" rather
+    than the WKT of the .prj when there is an EPSG code: it is much faster
+    to parse again.
+    """
+    prj = pathlib.Path(path).with_suffix(".prj")
+    if not prj.exists():
+        return None
+    return pyproj.CRS.from_wkt(prj.read_text()).to_string()
+
+
+class GeometryStore:
+    """
+    Polygons of a boundary layer in flat arrays (the GeoArrow layout of
+    shapely.to_ragged_array), instead of one shapely object per polygon:
+
+        - coords: float32 array (n_vertices, 2) with the closed rings one
+          after the other, as offsets from origin
+        - origin: float64 (x, y) added back to coords. Offsets from the
+          center of the layer keep float32 precise to a few millimeters
+          over a city, where absolute longitudes would be rounded to ~1 m.
+        - ring_offsets: int64 array with the n_rings + 1 offsets of each
+          ring in coords (the exterior of a part comes first, then its
+          holes)
+        - part_offsets: int64 array with the n_parts + 1 offsets of each
+          part in the rings
+        - geom_offsets: int64 array with the n_geoms + 1 offsets of each
+          geometry in the parts
+        - ids: id of each geometry (its code is its position)
+
+    Geometries with one part are returned as Polygons, the others as
+    MultiPolygons.
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        coords: np.ndarray,
+        ring_offsets: np.ndarray,
+        part_offsets: np.ndarray,
+        geom_offsets: np.ndarray,
+        origin: tuple[float, float] = (0.0, 0.0),
+        crs: str | None = None,
+    ):
+        if len(geom_offsets) != len(ids) + 1:
+            raise GeometryStoreError("geom_offsets must have len(ids) + 1 entries")
+        self.ids = list(ids)
+        self.coords = np.asarray(coords, dtype=np.float32).reshape(-1, 2)
+        self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        self.part_offsets = np.asarray(part_offsets, dtype=np.int64)
+        self.geom_offsets = np.asarray(geom_offsets, dtype=np.int64)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.crs = crs
+
+    @classmethod
+    def from_geometries(
+        cls,
+        geoms: list[Polygon | MultiPolygon],
+        ids: list[str] | None = None,
+        crs: str | None = None,
+    ) -> "GeometryStore":
+        """
+        Build a store from shapely Polygons and MultiPolygons. The ids
+        default to the position of each geometry.
+        """
+        geoms = np.asarray(geoms, dtype=object)
+        ids = [str(i) for i in range(len(geoms))] if ids is None else ids
+        if len(geoms) == 0:
+            empty = np.zeros(1, dtype=np.int64)
+            return cls(ids, np.zeros((0, 2)), empty, empty, empty, crs=crs)
+        geom_type, coords, offsets = shapely.to_ragged_array(geoms)
+        if geom_type == shapely.GeometryType.POLYGON:
+            # one part per geometry
+            offsets = (*offsets, np.arange(len(geoms) + 1))
+        elif geom_type != shapely.GeometryType.MULTIPOLYGON:
+            raise GeometryStoreError("only Polygons and MultiPolygons can be stored")
+        min_x, min_y, max_x, max_y = shapely.total_bounds(geoms)
+        origin = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+        return cls(ids, coords - origin, *offsets, origin=origin, crs=crs)
+
+    @classmethod
+    def from_division(cls, division: list) -> "GeometryStore":
+        """
+        Build a store from a list of Puma or Neighborhood objects.
+        """
+        return cls.from_geometries(
+            [div.polygon for div in division], [div.id for div in division]
+        )
+
+    @classmethod
+    def from_shapefile(cls, path: pathlib.Path) -> tuple["GeometryStore", pd.DataFrame]:
+        """
+        Read a polygon shapefile into a store and a DataFrame of its records.
+
+        Shapes repeated in several records (e.g. the same Puma for each
+        year) are stored once: the GEOMETRY_CODE column of the records has
+        the code of the geometry of each record, and the ids of the store
+        are the codes themselves.
+
+        Inputs:
+            - path: path from a shapefile, with or without extension
+        """
+        path = pathlib.Path(path)
+        records = read_records(path)
+        with shapefile.Reader(path.with_suffix(".shp")) as sf:
+            codes, unique, record_codes = {}, [], []
+            for shp in sf.iterShapes():
+                key = (tuple(shp.parts), tuple(map(tuple, shp.points)))
+                if key not in codes:
+                    codes[key] = len(unique)
+                    unique.append(shapely.geometry.shape(shp))
+                record_codes.append(codes[key])
+        records[GEOMETRY_CODE] = np.array(record_codes, dtype=np.int64)
+        store = cls.from_geometries(unique, crs=read_crs(path))
+        return store, records
+
+    @functools.cached_property
+    def pyproj_crs(self) -> pyproj.CRS | None:
+        """
+        Parsed crs, reused by every GeoDataFrame built from the store.
+        """
+        return None if self.crs is None else pyproj.CRS.from_user_input(self.crs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return (
+            f"GeometryStore(geometries={len(self)}, vertices={len(self.coords)}, "
+            f"nbytes={self.nbytes})"
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the coordinate and offset arrays.
+        """
+        return sum(
+            arr.nbytes
+            for arr in (
+                self.coords,
+                self.ring_offsets,
+                self.part_offsets,
+                self.geom_offsets,
+            )
+        )
+
+    def rings(self, code: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Coordinates of the rings of a geometry, in the format of
+        ray_casting.flatten_rings.
+
+        Returns:
+            A float64 array (n_vertices, 2) and an int64 array with the
+            n_rings + 1 offsets of each ring, starting at 0
+        """
+        first_part, last_part = self.geom_offsets[code : code + 2]
+        first_ring, last_ring = self.part_offsets[[first_part, last_part]]
+        ring_offsets = self.ring_offsets[first_ring : last_ring + 1]
+        coords = self.coords[ring_offsets[0] : ring_offsets[-1]]
+        return coords + self.origin, ring_offsets - ring_offsets[0]
+
+    def ring_polygon(self, code: int) -> RingPolygon:
+        """
+        RingPolygon of a geometry, built from the buffer without shapely.
+        """
+        return RingPolygon(*self.rings(code))
+
+    def to_shapely(self, codes: np.ndarray | None = None) -> np.ndarray:
+        """
+        Shapely geometries of some codes (all of them by default).
+
+        Returns:
+            An object array of Polygons and MultiPolygons
+        """
+        codes = np.arange(len(self)) if codes is None else np.asarray(codes)
+        if len(self) == 0:
+            return np.empty(0, dtype=object)
+        coords = self.coords.astype(np.float64) + self.origin
+        multi = shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON,
+            coords,
+            (self.ring_offsets, self.part_offsets, self.geom_offsets),
+        )[codes]
+        single = np.diff(self.geom_offsets)[codes] == 1
+        multi[single] = shapely.get_geometry(multi[single], 0)
+        return multi
+
+    def geometry(self, code: int) -> Polygon | MultiPolygon:
+        """
+        Shapely geometry of a single code.
+        """
+        coords, ring_offsets = self.rings(code)
+        first_part, last_part = self.geom_offsets[code : code + 2]
+        part_offsets = self.part_offsets[first_part : last_part + 1]
+        part_offsets = part_offsets - part_offsets[0]
+        parts = [
+            Polygon(
+                coords[ring_offsets[first] : ring_offsets[first + 1]],
+                [
+                    coords[ring_offsets[ring] : ring_offsets[ring + 1]]
+                    for ring in range(first + 1, last)
+                ],
+            )
+            for first, last in itertools.pairwise(part_offsets)
+        ]
+        return parts[0] if len(parts) == 1 else MultiPolygon(parts)
+
+    def to_geojson(self, code: int) -> dict:
+        """
+        GeoJSON geometry of a code, built straight from the buffer.
+        """
+        coords, ring_offsets = self.rings(code)
+        first_part, last_part = self.geom_offsets[code : code + 2]
+        part_offsets = self.part_offsets[first_part : last_part + 1]
+        part_offsets = part_offsets - part_offsets[0]
+        polygons = [
+            [
+                coords[ring_offsets[ring] : ring_offsets[ring + 1]].tolist()
+                for ring in range(first, last)
+            ]
+            for first, last in itertools.pairwise(part_offsets)
+        ]
+        if len(polygons) == 1:
+            return {"type": "Polygon", "coordinates": polygons[0]}
+        return {"type": "MultiPolygon", "coordinates": polygons}
+
+    @property
+    def __geo_interface__(self) -> dict:
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": pid,
+                    "properties": {},
+                    "geometry": self.to_geojson(code),
+                }
+                for code, pid in enumerate(self.ids)
+            ],
+        }
+
+    def to_geodataframe(self, records: pd.DataFrame | None = None) -> gpd.GeoDataFrame:
+        """
+        GeoDataFrame of some records, with the geometry of their
+        GEOMETRY_CODE. Only the geometries of the given records are built.
+        Without records, one row per geometry with its id.
+        """
+        if records is None:
+            records = pd.DataFrame(
+                {"id": self.ids, GEOMETRY_CODE: np.arange(len(self))}
+            )
+        codes = records[GEOMETRY_CODE].to_numpy(np.int64)
+        unique, inverse = np.unique(codes, return_inverse=True)
+        geometry = self.to_shapely(unique)[inverse]
+        return gpd.GeoDataFrame(records, geometry=geometry, crs=self.pyproj_crs)
+
+    def save(self, path, key: str = "", **arrays) -> None:
+        """
+        Write the store to a .npz file.
+
+        Inputs:
+            - path: output file
+            - key: cache key stored with the store, checked by load
+            - arrays: extra arrays saved in the same file
+        """
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                key=np.array(key),
+                ids=np.array(self.ids, dtype=str),
+                coords=self.coords,
+                ring_offsets=self.ring_offsets,
+                part_offsets=self.part_offsets,
+                geom_offsets=self.geom_offsets,
+                origin=self.origin,
+                crs=np.array("" if self.crs is None else self.crs),
+                **arrays,
+            )
+
+    @classmethod
+    def load(cls, path, key: str | None = None) -> "GeometryStore":
+        """
+        Read a store written by save.
+
+        Inputs:
+            - path: .npz file
+            - key: if given, expected cache key. A GeometryStoreError is
+              raised when the stored key is different (stale store).
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if key is not None and str(data["key"]) != key:
+                raise GeometryStoreError(f"stale geometry store in {path}")
+            return cls.from_arrays(data)
+
+    @classmethod
+    def from_arrays(cls, data) -> "GeometryStore":
+        """
+        Store from the arrays written by save, in an opened .npz file (or
+        any mapping of arrays).
+        """
+        return cls(
+            data["ids"].tolist(),
+            data["coords"],
+            data["ring_offsets"],
+            data["part_offsets"],
+            data["geom_offsets"],
+            tuple(data["origin"]),
+            str(data["crs"]) or None,
+        )
+
+
+def load_geometry_store(path: pathlib.Path) -> tuple[GeometryStore, pd.DataFrame]:
+    """
+    Same as GeometryStore.from_shapefile, with the store and the records
+    (with the geometry code of each one) read from a cache file next to the
+    shapefile. The cache is keyed by the content of the .shp/.dbf files and
+    rebuilt if it is missing or stale.
+
+    Inputs:
+        - path: path from a shapefile, with or without extension
+    """
+    path = pathlib.Path(path).with_suffix("")
+    cache_path = path.with_name(f"{path.name}.geom.npz")
+    key = cache_key("geometry_store", shapefile_hash(path))
+
+    if cache_path.exists():
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                if str(data["key"]) != key:
+                    raise GeometryStoreError(f"stale geometry store in {cache_path}")
+                return GeometryStore.from_arrays(data), arrays_to_frame(data)
+        except (GeometryStoreError, OSError, ValueError, KeyError):
+            pass  # stale or unreadable: rebuild it
+
+    store, records = GeometryStore.from_shapefile(path)
+    store.save(cache_path, key, **frame_to_arrays(records))
+    return store, records
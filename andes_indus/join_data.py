@@ -1,16 +1,21 @@
 from .merge_shp import (
-    load_pumas_shp,
-    load_neighborhood_shp,
-    gen_chi_bbox,
-    gen_quadtree,
-    load_schools,
-    assign_puma_neighborhood,
+    load_multi_layer_index,
+    load_school_table,
+    assign_divisions,
+    DIVISION_LAYERS,
+    PUMA_FIELDS,
+    COORDINATE_CACHE_PATH,
 )
+from .coordinate_cache import CoordinateCache
+from .shapefile_cache import load_shapefile
 from .crime_utils import (
     get_all_crime_data,
     load_crime_data,
     classify_violent_crimes,
+    pivot_crime_counts,
 )
+from .records import RecordTable
+from .crime_stream import stream_cache, stream_crime_data
 from .education import main_education
 from .census_utils import process_multiple_years
 from pathlib import Path
@@ -19,6 +24,17 @@ import geopandas as gpd
 import numpy as np
 
 
+def with_division(
+    data: pd.DataFrame, group: str, division: pd.Series
+) -> pd.DataFrame:
+    '''
+    Helper function that sets the Puma or Neighborhood (group) of each row of
+    a table built by assign_divisions, and keeps the rows with a match.
+    '''
+    data = data.assign(**{group: division})
+    return data[data[group].notna()].reset_index(drop=True)
+
+
 def group_crime_data_by(new_data_lst: pd.DataFrame, group: str) -> pd.DataFrame:
     '''
     Helper function to group crime data by Puma or Neighborhood
@@ -29,21 +45,12 @@ def group_crime_data_by(new_data_lst: pd.DataFrame, group: str) -> pd.DataFrame:
 
     new_data_lst = classify_violent_crimes(new_data_lst)
 
-    final_data = (
+    counts = (
         new_data_lst.groupby([group, "year", "crime_type"])
         .size()
         .reset_index(name="Count")
     )
-    final_data = final_data.pivot_table(
-        index=[group, "year"],
-        columns="crime_type",
-        values="Count",
-        fill_value=0,
-        aggfunc="sum",
-    )
-    final_data = final_data.reset_index()
-    final_data["total_crimes"] = final_data.drop(columns=[group, "year"]).sum(axis=1)
-    return final_data
+    return pivot_crime_counts(counts, group)
 
 
 def group_school_data_by(new_data_lst: pd.DataFrame, group: str) -> pd.DataFrame:
@@ -121,6 +128,18 @@ def zero_fill_cols(
     return df
 
 
+def chicago_pumas_shp(path: Path, pumas_year: int) -> gpd.GeoDataFrame:
+    '''
+    Helper function with the puma, name and geometry of the Chicago City
+    Pumas of a shapefile
+    '''
+    id_field, name_field = PUMA_FIELDS[pumas_year]
+    frame = load_shapefile(path, where=(name_field, "Chicago City"))
+    return frame[[id_field, name_field, "geometry"]].rename(
+        columns={id_field: "puma", name_field: "name"}
+    )
+
+
 def gen_pc_stats(df: pd.DataFrame, popvar: str, full_fetch) -> pd.DataFrame:
     '''
     Function that creates per capita indicators for crime data.
@@ -147,17 +166,25 @@ def gen_pc_stats(df: pd.DataFrame, popvar: str, full_fetch) -> pd.DataFrame:
     return df
 
 
-def gen_final_data(full_fetch=False):
+def gen_final_data(full_fetch=False, stream=False):
     '''
     Function that joins the data and creates csv files to be used in the dashboard.
+    With stream=True (and full_fetch) the crimes are counted page by page as
+    they are fetched (see stream_crime_data) instead of all at once.
+    Crimes and schools sharing a location are matched once, and the matches
+    are kept for the next runs in COORDINATE_CACHE_PATH (see CoordinateCache;
+    when streaming it holds at most STREAM_CACHE_POINTS, see stream_cache).
+
+    Returns:
+        The DedupReport of the coordinates matched
     '''
     # Gathering education data
     path_schools = Path("data/merged_school_data.csv")
     if path_schools.exists():
-        schools_data = load_schools(path_schools)
+        schools_data = load_school_table(path_schools)
     else:
         main_education()
-        schools_data = load_schools(path_schools)
+        schools_data = load_school_table(path_schools)
 
     # Gathering census data
     path_census = Path("data/census_df.csv")
@@ -167,40 +194,41 @@ def gen_final_data(full_fetch=False):
         process_multiple_years(path_census, True)
         census_data = lower_colnames(pd.read_csv(path_census))
 
-    # Merging crime and school data to pumas
-    path_pumas2020 = Path("data/shapefiles/pumas/pumas2022")
-    pumas2020 = load_pumas_shp(path_pumas2020, 2020)
-    quadtree_chi_pumas2020 = gen_quadtree(pumas2020, gen_chi_bbox(pumas2020))
-
-    path_pumas2010 = Path("data/shapefiles/pumas2010/pumas2010")
-    pumas2010 = load_pumas_shp(path_pumas2010, 2010)
-    quadtree_chi_pumas2010 = gen_quadtree(pumas2010, gen_chi_bbox(pumas2010))
-
-    path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
-    neighborhoods = load_neighborhood_shp(path_neighborhoods)
-    quadtree_chi_neighborhoods = gen_quadtree(
-        neighborhoods, gen_chi_bbox(neighborhoods)
-    )
+    # Assigning the Pumas 2010, Pumas 2020 and Neighborhoods in a single pass
+    division_index = load_multi_layer_index()
+    if full_fetch and stream:
+        coordinates = stream_cache(division_index, COORDINATE_CACHE_PATH)
+    else:
+        coordinates = CoordinateCache(division_index, COORDINATE_CACHE_PATH)
     # Creating the pd.Dataframes for crime
-    if full_fetch:
-        crime_data_23, crime_data_1318 = get_all_crime_data()
-
-        crimes_by_puma_23 = assign_puma_neighborhood(
-            crime_data_23, quadtree_chi_pumas2020, "puma"
+    if full_fetch and stream:
+        crimes_by_puma, crimes_by_neighborhood = stream_crime_data(
+            division_index, cache=coordinates
         )
-        crimes_by_puma_1318 = assign_puma_neighborhood(
-            crime_data_1318, quadtree_chi_pumas2010, "puma"
+        crimes_by_puma = lower_colnames(crimes_by_puma)
+        crimes_by_neighborhood = lower_colnames(crimes_by_neighborhood)
+    elif full_fetch:
+        crime_data_23, crime_data_1318 = get_all_crime_data(columnar=True)
+        crime_data = assign_divisions(
+            RecordTable.concat([crime_data_23, crime_data_1318]),
+            division_index,
+            coordinates,
         )
+        is_23 = np.arange(len(crime_data)) < len(crime_data_23)
 
-        crime_data = pd.concat([crimes_by_puma_23, crimes_by_puma_1318])
-        crimes_by_puma = lower_colnames(group_crime_data_by(crime_data, "puma"))
-
-        crime_data_23.extend(crime_data_1318)
-        crimes_by_neighborhood = lower_colnames(
+        crimes_by_puma = lower_colnames(
             group_crime_data_by(
-                assign_puma_neighborhood(
-                    crime_data_23, quadtree_chi_neighborhoods, "neighborhood"
+                with_division(
+                    crime_data,
+                    "puma",
+                    crime_data["pumas2020"].where(is_23, crime_data["pumas2010"]),
                 ),
+                "puma",
+            )
+        )
+        crimes_by_neighborhood = lower_colnames(
+            group_crime_data_by(
+                with_division(crime_data, "neighborhood", crime_data["neighborhoods"]),
                 "neighborhood",
             )
         )
@@ -215,35 +243,20 @@ def gen_final_data(full_fetch=False):
             crimes_by_neighborhood, "neighborhood", 4
         )
 
-    school_data23, school_data1318 = [], []
-    for school in schools_data:
-        if school.year == "2023":
-            school_data23.append(school)
-        elif (school.year == "2013") or (school.year == "2018"):
-            school_data1318.append(school)
-
-    schools_by_puma23 = lower_colnames(
-        group_school_data_by(
-            assign_puma_neighborhood(school_data23, quadtree_chi_pumas2020, "puma"),
-            "puma",
-        )
+    school_data = assign_divisions(schools_data, division_index, coordinates)
+    coordinates.save()
+    school_puma = school_data["pumas2020"].where(
+        school_data["year"] == 2023,
+        school_data["pumas2010"].where(school_data["year"].isin([2013, 2018])),
     )
-    schools_by_puma1318 = lower_colnames(
-        group_school_data_by(
-            assign_puma_neighborhood(school_data1318, quadtree_chi_pumas2010, "puma"),
-            "puma",
-        )
+    schools_by_puma = lower_colnames(
+        group_school_data_by(with_division(school_data, "puma", school_puma), "puma")
     )
-    schools_by_puma = pd.concat([schools_by_puma23, schools_by_puma1318])
 
-    pumas_shp23 = gpd.read_file(
-        "data/shapefiles/pumas/pumas2022.shp",
-        columns=["PUMACE20", "NAMELSAD20", "geometry"],
-    ).rename(columns={"PUMACE20": "puma", "NAMELSAD20": "name"})
-    pumas_shp1318 = gpd.read_file(
-        "data/shapefiles/pumas2010/pumas2010.shp",
-        columns=["PUMACE10", "NAME10", "geometry"],
-    ).rename(columns={"PUMACE10": "puma", "NAME10": "name"})
+    # Only the Chicago City Pumas can match the crimes and schools, read from
+    # the same cache as load_pumas_shp
+    pumas_shp23 = chicago_pumas_shp(DIVISION_LAYERS["pumas2020"][0], 2020)
+    pumas_shp1318 = chicago_pumas_shp(DIVISION_LAYERS["pumas2010"][0], 2010)
 
     pumas_shp = pd.concat([pumas_shp23, pumas_shp1318])
     pumas_shp = zero_fill_cols(pumas_shp, "puma", 5)
@@ -265,13 +278,11 @@ def gen_final_data(full_fetch=False):
 
     schools_by_neighborhood = lower_colnames(
         group_school_data_by(
-            assign_puma_neighborhood(
-                schools_data, quadtree_chi_neighborhoods, "neighborhood"
-            ),
+            with_division(school_data, "neighborhood", school_data["neighborhoods"]),
             "neighborhood",
         )
     )
-    neighborhoods_shp = gpd.read_file("data/shapefiles/chicomm/chicomm.shp")
+    neighborhoods_shp = load_shapefile(DIVISION_LAYERS["neighborhoods"][0])
     neighborhoods_shp = neighborhoods_shp.rename(columns={"CHICOMNO": "neighborhood"})
     schools_by_neighborhood["year"] = schools_by_neighborhood["year"].astype(int)
     data_neighborhoods = neighborhoods_shp.merge(
@@ -296,6 +307,8 @@ def gen_final_data(full_fetch=False):
     data_neighborhoods.to_csv("data/data_neighborhoods.csv")
     data_neighborhoods.to_file("data/shapefiles/data_neighborhoods.shp")
 
+    return coordinates.report
+
 
 def transform_to_long_format(
     input_csv: str = "data/census_df.csv",
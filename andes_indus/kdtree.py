@@ -0,0 +1,422 @@
+import heapq
+
+import numpy as np
+
+# Earth radius (meters) and reference latitude used to project Chicago
+# coordinates to a local plane.
+EARTH_RADIUS = 6_371_008.8
+CHI_LATITUDE = 41.84
+
+
+class KDTreeError(Exception):
+    """Exception used within KDTree for unexpected cases"""
+
+
+def project_lonlat(
+    lons: np.ndarray, lats: np.ndarray, lat0: float = CHI_LATITUDE
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Equirectangular projection of longitude/latitude to planar meters around
+    a reference latitude. Within the city the distance error is well under
+    1%, which is enough for radius and nearest-neighbour queries.
+
+    Returns:
+        x and y coordinates in meters
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    scale = np.pi / 180 * EARTH_RADIUS
+    return lons * scale * np.cos(np.radians(lat0)), lats * scale
+
+
+class KDTree:
+    """
+    Static 2-d tree over a set of points, stored as arrays.
+
+    Points are split at the median of the widest dimension until a node has
+    at most leaf_size points. The points of every node are a contiguous range
+    of xs/ys (sorted in tree order), and index maps them back to their
+    position in the input.
+
+        - node_start, node_end: int64 arrays with the range of points of
+          each node
+        - node_left, node_right: int64 arrays with the children, -1 for leaves
+        - node_bounds: float64 array (n_nodes, 4) with the bounding box of
+          the points of each node (min_x, min_y, max_x, max_y)
+
+    Coordinates must be planar (see project_lonlat), distances are in the
+    same unit.
+    """
+
+    def __init__(self, xs: np.ndarray, ys: np.ndarray, leaf_size: int = 32):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise KDTreeError("xs and ys must be 1-D arrays of the same length")
+        if leaf_size < 1:
+            raise KDTreeError("leaf_size must be positive")
+        if np.isnan(xs).any() or np.isnan(ys).any():
+            raise KDTreeError("coordinates must not be missing")
+
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(xs))
+        coords = np.column_stack([xs, ys])
+
+        # Nodes are numbered in creation order and split depth-first; the
+        # range of points of a node is filled in when its parent is split.
+        starts, ends, lefts, rights, bounds = [0], [len(xs)], [-1], [-1], [None]
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            points = coords[start:end]
+            if end > start:
+                low, high = points.min(axis=0), points.max(axis=0)
+            else:
+                low = high = np.full(2, np.nan)
+            bounds[node] = (low[0], low[1], high[0], high[1])
+            if end - start <= leaf_size:
+                continue
+
+            # Split at the median of the widest dimension
+            dim = int(np.argmax(high - low))
+            mid = start + (end - start) // 2
+            order = np.argpartition(points[:, dim], mid - start)
+            coords[start:end] = points[order]
+            self.index[start:end] = self.index[start:end][order]
+
+            lefts[node], rights[node] = len(starts), len(starts) + 1
+            for child_start, child_end in ((start, mid), (mid, end)):
+                stack.append(len(starts))
+                starts.append(child_start)
+                ends.append(child_end)
+                lefts.append(-1)
+                rights.append(-1)
+                bounds.append(None)
+
+        self.xs = np.ascontiguousarray(coords[:, 0])
+        self.ys = np.ascontiguousarray(coords[:, 1])
+        self.node_start = np.array(starts, dtype=np.int64)
+        self.node_end = np.array(ends, dtype=np.int64)
+        self.node_left = np.array(lefts, dtype=np.int64)
+        self.node_right = np.array(rights, dtype=np.int64)
+        self.node_bounds = np.array(bounds, dtype=np.float64)
+        # Zero-copy views used by the scalar traversal
+        self._bounds = memoryview(self.node_bounds)
+        self._start = memoryview(self.node_start)
+        self._end = memoryview(self.node_end)
+        self._left = memoryview(self.node_left)
+        self._right = memoryview(self.node_right)
+
+    @classmethod
+    def from_lonlat(
+        cls, lons: np.ndarray, lats: np.ndarray, leaf_size: int = 32
+    ) -> "KDTree":
+        """
+        Build the tree from longitude/latitude, projected with project_lonlat.
+        """
+        return cls(*project_lonlat(lons, lats), leaf_size)
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def __repr__(self) -> str:
+        return f"KDTree(points={len(self)}, nodes={len(self.node_start)})"
+
+    def _min_dist2(self, node: int, x: float, y: float) -> float:
+        """
+        Squared distance from a point to the bounding box of a node.
+        """
+        bounds = self._bounds
+        min_x, min_y = bounds[node, 0], bounds[node, 1]
+        max_x, max_y = bounds[node, 2], bounds[node, 3]
+        dx = max(min_x - x, 0.0, x - max_x)
+        dy = max(min_y - y, 0.0, y - max_y)
+        return dx * dx + dy * dy
+
+    def _box_dist2(self, nodes: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+        """
+        Vectorized _min_dist2: squared distance from each point to the
+        bounding box of its node.
+        """
+        bounds = self.node_bounds[nodes]
+        dx = np.maximum(np.maximum(bounds[:, 0] - xs, 0.0), xs - bounds[:, 2])
+        dy = np.maximum(np.maximum(bounds[:, 1] - ys, 0.0), ys - bounds[:, 3])
+        return dx * dx + dy * dy
+
+    def _max_dist2(self, node: int, x: float, y: float) -> float:
+        """
+        Squared distance from a point to the farthest corner of a node.
+        """
+        bounds = self._bounds
+        min_x, min_y = bounds[node, 0], bounds[node, 1]
+        max_x, max_y = bounds[node, 2], bounds[node, 3]
+        dx = max(x - min_x, max_x - x)
+        dy = max(y - min_y, max_y - y)
+        return dx * dx + dy * dy
+
+    def _radius_nodes(self, x: float, y: float, r: float):
+        """
+        Walk the tree for a radius query.
+
+        Returns:
+            The nodes entirely inside the circle, and the leaves that
+            overlap it (whose points must be checked one by one).
+        """
+        r2 = r * r
+        inside, partial = [], []
+        if len(self) == 0:
+            return inside, partial
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._min_dist2(node, x, y) > r2:
+                continue
+            if self._max_dist2(node, x, y) <= r2:
+                inside.append(node)
+            elif self._left[node] < 0:
+                partial.append(node)
+            else:
+                stack.append(self._left[node])
+                stack.append(self._right[node])
+        return inside, partial
+
+    def within_radius(self, x: float, y: float, r: float) -> np.ndarray:
+        """
+        Positions (in the input order) of the points at distance <= r from
+        (x, y), sorted.
+        """
+        inside, partial = self._radius_nodes(x, y, r)
+        found = [np.arange(self._start[node], self._end[node]) for node in inside]
+        for node in partial:
+            start, end = self._start[node], self._end[node]
+            dist2 = (self.xs[start:end] - x) ** 2 + (self.ys[start:end] - y) ** 2
+            found.append(start + np.flatnonzero(dist2 <= r * r))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(self.index[np.concatenate(found)])
+
+    def count_within_radius(self, x: float, y: float, r: float) -> int:
+        """
+        Number of points at distance <= r from (x, y). Nodes entirely inside
+        the circle are counted without looking at their points.
+        """
+        inside, partial = self._radius_nodes(x, y, r)
+        count = int(sum(self._end[node] - self._start[node] for node in inside))
+        for node in partial:
+            start, end = self._start[node], self._end[node]
+            dist2 = (self.xs[start:end] - x) ** 2 + (self.ys[start:end] - y) ** 2
+            count += int(np.count_nonzero(dist2 <= r * r))
+        return count
+
+    def nearest(self, x: float, y: float, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The k points nearest to (x, y), found with a best-first search.
+
+        Returns:
+            Distances and positions (in the input order) of the points,
+            sorted by distance (fewer than k if the tree is smaller).
+        """
+        if k < 1:
+            raise KDTreeError("k must be positive")
+        # best: max-heap (negated distances) with the k nearest points so far
+        best = []
+        queue = [(0.0, 0)] if len(self) else []
+        while queue:
+            dist2, node = heapq.heappop(queue)
+            if len(best) == k and dist2 > -best[0][0]:
+                break
+            if self._left[node] >= 0:
+                for child in (self._left[node], self._right[node]):
+                    heapq.heappush(queue, (self._min_dist2(child, x, y), child))
+                continue
+            start, end = self._start[node], self._end[node]
+            leaf_dist2 = (self.xs[start:end] - x) ** 2 + (self.ys[start:end] - y) ** 2
+            for point, point_dist2 in zip(range(start, end), leaf_dist2.tolist()):
+                if len(best) < k:
+                    heapq.heappush(best, (-point_dist2, -point))
+                elif point_dist2 < -best[0][0]:
+                    heapq.heapreplace(best, (-point_dist2, -point))
+
+        best = sorted((-dist2, -point) for dist2, point in best)
+        dists = np.sqrt(np.array([dist2 for dist2, _ in best], dtype=np.float64))
+        points = np.array([point for _, point in best], dtype=np.int64)
+        return dists, self.index[points]
+
+    def _radius_pairs(
+        self, xs: np.ndarray, ys: np.ndarray, r2: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Walk the tree for a radius query from every point at once, one level
+        at a time, with arrays of (query, node) pairs instead of a stack.
+
+        Inputs:
+            xs, ys: query points
+            r2: squared radius of each query
+
+        Returns:
+            Queries and nodes of the pairs where the node is entirely inside
+            the circle, and of the pairs where a leaf overlaps it.
+        """
+        queries = np.arange(len(xs) if len(self) else 0)
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        inside_queries, inside_nodes = [queries[:0]], [nodes[:0]]
+        partial_queries, partial_nodes = [queries[:0]], [nodes[:0]]
+        while len(queries):
+            x, y, bounds = xs[queries], ys[queries], self.node_bounds[nodes]
+            max_dx = np.maximum(x - bounds[:, 0], bounds[:, 2] - x)
+            max_dy = np.maximum(y - bounds[:, 1], bounds[:, 3] - y)
+            query_r2 = r2[queries]
+            overlap = self._box_dist2(nodes, x, y) <= query_r2
+            inside = overlap & (max_dx * max_dx + max_dy * max_dy <= query_r2)
+            leaf = self.node_left[nodes] < 0
+            partial = overlap & ~inside & leaf
+            split = overlap & ~inside & ~leaf
+            inside_queries.append(queries[inside])
+            inside_nodes.append(nodes[inside])
+            partial_queries.append(queries[partial])
+            partial_nodes.append(nodes[partial])
+            queries = np.repeat(queries[split], 2)
+            nodes = np.column_stack(
+                [self.node_left[nodes[split]], self.node_right[nodes[split]]]
+            ).ravel()
+
+        inside_queries, inside_nodes, partial_queries, partial_nodes = map(
+            np.concatenate,
+            (inside_queries, inside_nodes, partial_queries, partial_nodes),
+        )
+        return inside_queries, inside_nodes, partial_queries, partial_nodes
+
+    def _node_points(
+        self, queries: np.ndarray, nodes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Expand (query, node) pairs to (query, point) pairs, with the points
+        of each node (positions in tree order).
+        """
+        sizes = self.node_end[nodes] - self.node_start[nodes]
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        points = np.repeat(self.node_start[nodes], sizes) + offsets
+        return np.repeat(queries, sizes), points
+
+    def _dist2(self, xs: np.ndarray, ys: np.ndarray, queries, points) -> np.ndarray:
+        """
+        Squared distances of (query, point) pairs.
+        """
+        dx = self.xs[points] - xs[queries]
+        dy = self.ys[points] - ys[queries]
+        return dx * dx + dy * dy
+
+    def _within(self, xs: np.ndarray, ys: np.ndarray, r2: np.ndarray):
+        """
+        (query, point) pairs at distance <= r from every query: the points
+        of the nodes inside the circle, and the points of the overlapping
+        leaves that pass the distance test.
+
+        Returns:
+            Queries, points (in tree order) and squared distances
+        """
+        inside_queries, inside_nodes, partial_queries, partial_nodes = (
+            self._radius_pairs(xs, ys, r2)
+        )
+        queries, points = self._node_points(
+            np.concatenate([inside_queries, partial_queries]),
+            np.concatenate([inside_nodes, partial_nodes]),
+        )
+        dist2 = self._dist2(xs, ys, queries, points)
+        hit = dist2 <= r2[queries]
+        return queries[hit], points[hit], dist2[hit]
+
+    def within_radius_many(
+        self, xs: np.ndarray, ys: np.ndarray, r: float
+    ) -> list[np.ndarray]:
+        """
+        Batched within_radius: one array of positions per query point. The
+        tree is walked for every query at once (see _radius_pairs).
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        queries, points, _ = self._within(xs, ys, np.full(len(xs), float(r) ** 2))
+        positions = self.index[points]
+        order = np.lexsort((positions, queries))
+        counts = np.bincount(queries, minlength=len(xs))
+        return np.split(positions[order], np.cumsum(counts)[:-1])
+
+    def count_within_radius_many(
+        self, xs: np.ndarray, ys: np.ndarray, r: float
+    ) -> np.ndarray:
+        """
+        Batched count_within_radius: an int64 array with one count per query
+        point. Nodes entirely inside a circle are counted without looking at
+        their points, only the points of overlapping leaves are tested.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        r2 = np.full(len(xs), float(r) ** 2)
+        inside_queries, inside_nodes, partial_queries, partial_nodes = (
+            self._radius_pairs(xs, ys, r2)
+        )
+        sizes = self.node_end[inside_nodes] - self.node_start[inside_nodes]
+        counts = np.bincount(inside_queries, weights=sizes, minlength=len(xs))
+        queries, points = self._node_points(partial_queries, partial_nodes)
+        hit = self._dist2(xs, ys, queries, points) <= r2[queries]
+        counts += np.bincount(queries[hit], minlength=len(xs))
+        return counts.astype(np.int64)
+
+    def nearest_many(
+        self, xs: np.ndarray, ys: np.ndarray, k: int = 1
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batched nearest. Every query descends to the closest node that still
+        has at least k points; the k-th nearest of its points bounds the
+        distance, and a radius query with that bound gives the candidates.
+
+        Returns:
+            Arrays (n_queries, k) of distances and positions; rows are padded
+            with inf and -1 if the tree has fewer than k points.
+        """
+        if k < 1:
+            raise KDTreeError("k must be positive")
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        dists = np.full((len(xs), k), np.inf)
+        points = np.full((len(xs), k), -1, dtype=np.int64)
+        if len(self) == 0 or len(xs) == 0:
+            return dists, points
+
+        if len(self) < k:
+            r2 = np.full(len(xs), np.inf)
+        else:
+            nodes = np.zeros(len(xs), dtype=np.int64)
+            active = self.node_left[nodes] >= 0
+            while active.any():
+                queries = np.flatnonzero(active)
+                left = self.node_left[nodes[queries]]
+                right = self.node_right[nodes[queries]]
+                closer = np.where(
+                    self._box_dist2(left, xs[queries], ys[queries])
+                    <= self._box_dist2(right, xs[queries], ys[queries]),
+                    left,
+                    right,
+                )
+                big = self.node_end[closer] - self.node_start[closer] >= k
+                nodes[queries[big]] = closer[big]
+                active[queries[~big]] = False
+                active[queries[big]] = self.node_left[closer[big]] >= 0
+
+            # k-th smallest distance to the points of each node
+            queries, node_points = self._node_points(np.arange(len(xs)), nodes)
+            dist2 = self._dist2(xs, ys, queries, node_points)
+            order = np.lexsort((dist2, queries))
+            sizes = self.node_end[nodes] - self.node_start[nodes]
+            r2 = dist2[order][np.cumsum(sizes) - sizes + k - 1]
+
+        queries, found, dist2 = self._within(xs, ys, r2)
+        order = np.lexsort((found, dist2, queries))
+        queries, found, dist2 = queries[order], found[order], dist2[order]
+        counts = np.bincount(queries, minlength=len(xs))
+        rank = np.arange(len(queries)) - np.repeat(np.cumsum(counts) - counts, counts)
+        keep = rank < k
+        dists[queries[keep], rank[keep]] = np.sqrt(dist2[keep])
+        points[queries[keep], rank[keep]] = self.index[found[keep]]
+        return dists, points
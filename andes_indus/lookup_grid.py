@@ -0,0 +1,317 @@
+import numpy as np
+import shapely
+from shapely import contains_xy
+from shapely.geometry import Point
+
+from .approximations import INSIDE as APPROX_INSIDE
+from .approximations import OUTSIDE as APPROX_OUTSIDE
+from .quadtree import (
+    ApproximationMixin,
+    BBox,
+    CountersMixin,
+    FrozenQuadtree,
+    PolygonQueryMixin,
+    Quadtree,
+    QueryCounters,
+    RTree,
+)
+
+# Cell states in LookupGrid.cell_codes (codes of polygons are >= 0)
+OUTSIDE = -1
+AMBIGUOUS = -2
+
+
+class LookupGrid(CountersMixin, ApproximationMixin, PolygonQueryMixin):
+    """
+    Uniform grid over a bounding box that resolves most points with a single
+    array lookup.
+
+    Each cell is either fully inside one polygon (cell_codes holds its code),
+    outside every polygon (OUTSIDE), or AMBIGUOUS: a boundary crosses it and
+    its candidate polygons are candidate_codes[candidate_start[cell] :
+    candidate_start[cell + 1]], in insertion order. Only the points that fall
+    in ambiguous cells run exact contains tests.
+
+    Query counters and approximations work as on Quadtree (see
+    CountersMixin and ApproximationMixin): a cell plays the part of a leaf,
+    with its candidate polygons.
+    """
+
+    def __init__(
+        self,
+        bbox: BBox,
+        ids: list[str],
+        geoms: np.ndarray,
+        resolution: int = 256,
+    ):
+        if resolution < 1:
+            raise ValueError("resolution must be positive")
+        self.bbox = BBox(*bbox)
+        self.ids = list(ids)
+        self.geoms = np.asarray(geoms, dtype=object)
+        self.resolution = resolution
+        self.cell_width = (self.bbox.max_x - self.bbox.min_x) / resolution
+        self.cell_height = (self.bbox.max_y - self.bbox.min_y) / resolution
+        self._build()
+
+    @classmethod
+    def from_index(
+        cls, index: Quadtree | FrozenQuadtree | RTree, resolution: int = 256, bbox=None
+    ) -> "LookupGrid":
+        """
+        Build the grid for the polygons of an existing index, over its
+        bounding box (or the one given, mandatory for an RTree).
+        """
+        if bbox is None:
+            bbox = index.bbox
+        return cls(bbox, index.ids, index.geoms, resolution)
+
+    def _build(self) -> None:
+        """
+        Classify every cell. Cells are tested slightly enlarged, so a point
+        rounded into a neighbouring cell can never be resolved wrongly.
+        """
+        n = self.resolution
+        min_x, min_y = self.bbox.min_x, self.bbox.min_y
+        pad_x, pad_y = self.cell_width * 1e-6, self.cell_height * 1e-6
+        rows, cols = np.divmod(np.arange(n * n), n)
+        cells = shapely.box(
+            min_x + cols * self.cell_width - pad_x,
+            min_y + rows * self.cell_height - pad_y,
+            min_x + (cols + 1) * self.cell_width + pad_x,
+            min_y + (rows + 1) * self.cell_height + pad_y,
+        )
+
+        pair_cells, pair_codes, covered = [], [], []
+        for code, geom in enumerate(self.geoms):
+            # only the cells under the bounds of the polygon
+            g_min_x, g_min_y, g_max_x, g_max_y = geom.bounds
+            col0, row0 = self._cell_of(g_min_x, g_min_y)
+            col1, row1 = self._cell_of(g_max_x, g_max_y)
+            near_cols = np.arange(max(col0 - 1, 0), min(col1 + 1, n - 1) + 1)
+            near_rows = np.arange(max(row0 - 1, 0), min(row1 + 1, n - 1) + 1)
+            near = (near_rows[:, None] * n + near_cols[None, :]).ravel()
+            near = near[shapely.intersects(geom, cells[near])]
+            pair_cells.append(near)
+            pair_codes.append(np.full(len(near), code, dtype=np.int32))
+            covered.append(shapely.covers(geom, cells[near]))
+
+        pair_cells = np.concatenate(pair_cells) if pair_cells else np.empty(0, int)
+        pair_codes = np.concatenate(pair_codes) if pair_codes else np.empty(0, int)
+        covered = np.concatenate(covered) if covered else np.empty(0, bool)
+
+        # Candidates of each cell, in insertion order
+        order = np.argsort(pair_cells, kind="stable")
+        pair_cells, pair_codes, covered = (
+            pair_cells[order],
+            pair_codes[order],
+            covered[order],
+        )
+        counts = np.bincount(pair_cells, minlength=n * n)
+        self.candidate_start = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+        self.candidate_codes = pair_codes.astype(np.int32)
+
+        cell_codes = np.full(n * n, AMBIGUOUS, dtype=np.int32)
+        cell_codes[counts == 0] = OUTSIDE
+        single = np.flatnonzero(counts == 1)
+        first = self.candidate_start[single]
+        resolved = covered[first]
+        cell_codes[single[resolved]] = self.candidate_codes[first[resolved]]
+        self.cell_codes = cell_codes
+
+    def _cell_of(self, x, y):
+        """
+        Column and row of the cell of a point (or arrays of points), clipped
+        to the grid.
+        """
+        n = self.resolution
+        col = np.clip(
+            np.floor((np.asarray(x) - self.bbox.min_x) / self.cell_width), 0, n - 1
+        ).astype(np.int64)
+        row = np.clip(
+            np.floor((np.asarray(y) - self.bbox.min_y) / self.cell_height), 0, n - 1
+        ).astype(np.int64)
+        return col, row
+
+    def __repr__(self) -> str:
+        return (
+            f"LookupGrid(resolution={self.resolution}, "
+            f"ambiguous={self.ambiguous_fraction:.1%})"
+        )
+
+    @property
+    def ambiguous_fraction(self) -> float:
+        """
+        Fraction of the cells that need exact tests.
+        """
+        return float(np.mean(self.cell_codes == AMBIGUOUS))
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.cell_codes.nbytes
+            + self.candidate_start.nbytes
+            + self.candidate_codes.nbytes
+        )
+
+    def candidates(self, bounds: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Same as Quadtree.candidates: codes of the polygons that intersect the
+        cells overlapping bounds (min_x, min_y, max_x, max_y).
+        """
+        min_x, min_y, max_x, max_y = bounds
+        if (
+            min_x > self.bbox.max_x
+            or max_x < self.bbox.min_x
+            or min_y > self.bbox.max_y
+            or max_y < self.bbox.min_y
+        ):
+            return np.empty(0, dtype=np.int64)
+        col0, row0 = self._cell_of(min_x, min_y)
+        col1, row1 = self._cell_of(max_x, max_y)
+        rows, cols = np.arange(row0, row1 + 1), np.arange(col0, col1 + 1)
+        cells = (rows[:, None] * self.resolution + cols[None, :]).ravel()
+        codes = [
+            self.candidates_of(cell)
+            for cell in cells[self.cell_codes[cells] != OUTSIDE]
+        ]
+        if not codes:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(codes)).astype(np.int64)
+
+    def candidates_of(self, cell: int) -> np.ndarray:
+        """
+        Codes of the polygons that intersect a cell, in insertion order.
+        """
+        return self.candidate_codes[
+            self.candidate_start[cell] : self.candidate_start[cell + 1]
+        ]
+
+    def match(self, point: Point, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match.
+        """
+        return self.match_xy(point.x, point.y, first)
+
+    def match_xy(self, x: float, y: float, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match_xy: ids of the polygons that contain the
+        point, in insertion order.
+        """
+        return self._descend_xy(x, y, first)
+
+    def _descend_xy(
+        self,
+        x: float,
+        y: float,
+        first: bool = False,
+        counters: QueryCounters | None = None,
+        approximations: list | None = None,
+    ) -> list[str]:
+        """
+        Lookup of match_xy, with the optional hooks (see QueryHooksMixin).
+        """
+        if counters is not None:
+            counters.queries += 1
+            counters.bbox_tests += 1
+        if not (
+            self.bbox.min_x < x < self.bbox.max_x
+            and self.bbox.min_y < y < self.bbox.max_y
+        ):
+            return []
+        col, row = self._cell_of(x, y)
+        cell = int(row) * self.resolution + int(col)
+        code = self.cell_codes[cell]
+        candidates = self.candidates_of(cell)
+        if counters is not None:
+            counters.nodes_visited += 1
+            counters.add_leaf(len(candidates))
+        if code >= 0:
+            return [self.ids[code]]
+        if code == OUTSIDE:
+            return []
+
+        results = []
+        exact = False
+        for code in candidates:
+            state = None
+            if approximations is not None:
+                state = approximations[code].classify_xy(x, y)
+            if state == APPROX_OUTSIDE:
+                if counters is not None:
+                    counters.outer_rejects += 1
+                continue
+            if state == APPROX_INSIDE:
+                if counters is not None:
+                    counters.inner_hits += 1
+            else:
+                exact = True
+                if counters is not None:
+                    counters.contains_tests += 1
+                if not contains_xy(self.geoms[code], x, y):
+                    continue
+            results.append(self.ids[code])
+            if first:
+                break
+
+        if counters is not None:
+            counters.exact_queries += exact
+        return results
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Same as Quadtree.match_many. Points in resolved cells are answered
+        by the lookup; the others are expanded into (point, candidate) pairs
+        and each candidate polygon is tested once, in insertion order.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise ValueError("xs and ys must be 1-D arrays of the same length")
+
+        result = np.full(len(xs), -1, dtype=np.int64)
+        inside = np.flatnonzero(
+            (xs > self.bbox.min_x)
+            & (xs < self.bbox.max_x)
+            & (ys > self.bbox.min_y)
+            & (ys < self.bbox.max_y)
+        )
+        col, row = self._cell_of(xs[inside], ys[inside])
+        cells = row * self.resolution + col
+        codes = self.cell_codes[cells]
+        result[inside] = np.where(codes >= 0, codes, -1)
+
+        ambiguous = codes == AMBIGUOUS
+        counters = self.counters
+        if counters is not None:
+            counters.queries += len(xs)
+            counters.bbox_tests += len(xs)
+            counters.nodes_visited += len(inside)
+            occupancy = self.candidate_start[cells + 1] - self.candidate_start[cells]
+            for size, n in zip(*np.unique(occupancy, return_counts=True)):
+                counters.add_leaf(int(size), int(n))
+        points, cells = inside[ambiguous], cells[ambiguous]
+
+        starts = self.candidate_start[cells]
+        counts = self.candidate_start[cells + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        points = np.repeat(points, counts)
+        pair_codes = self.candidate_codes[np.repeat(starts, counts) + offsets]
+
+        order = np.argsort(pair_codes, kind="stable")
+        points, pair_codes = points[order], pair_codes[order]
+        unique_codes, code_starts = np.unique(pair_codes, return_index=True)
+        code_ends = np.append(code_starts[1:], len(pair_codes))
+        for code, start, end in zip(unique_codes, code_starts, code_ends):
+            candidates = points[start:end]
+            candidates = candidates[result[candidates] < 0]
+            hits = contains_xy(self.geoms[code], xs[candidates], ys[candidates])
+            result[candidates[hits]] = code
+            if counters is not None:
+                counters.contains_tests += len(candidates)
+        if counters is not None:
+            # The first candidate of every ambiguous point is always tested
+            counters.exact_queries += len(cells)
+        return result
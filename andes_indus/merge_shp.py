@@ -1,23 +1,56 @@
-from shapely.geometry import Polygon, MultiPolygon, Point
-from .quadtree import Quadtree, BBox
+from shapely.geometry import Polygon, MultiPolygon
+from .quadtree import (
+    Quadtree,
+    FrozenQuadtree,
+    RTree,
+    QuadtreeError,
+    BBox,
+    MAX_DEPTH,
+    morton_order,
+)
+from .cache_utils import shapefile_hash, cache_key
+from .kdtree import KDTree, project_lonlat
+from .multi_layer import MultiLayerIndex
 from .crime_utils import Crime
+from .records import RecordTable
+from .shapefile_cache import load_shapefile
+from .parallel_assign import ParallelMatcher
+from .coordinate_cache import CoordinateCache
 from typing import NamedTuple, Optional
 import pathlib
-import shapefile
 import csv
+import json
+import numpy as np
 import pandas as pd
 
 
+# Capacity and max_depth of each layer, written by the quadtree tuner
+QUADTREE_CONFIG_PATH = pathlib.Path("data/quadtree_config.json")
+
+# Boundary layers: name -> (path from the shapefile, pumas_year)
+DIVISION_LAYERS = {
+    "pumas2020": (pathlib.Path("data/shapefiles/pumas/pumas2022"), 2020),
+    "pumas2010": (pathlib.Path("data/shapefiles/pumas2010/pumas2010"), 2010),
+    "neighborhoods": (pathlib.Path("data/shapefiles/chicomm/chicomm"), None),
+}
+MULTI_LAYER_CACHE_PATH = pathlib.Path("data/shapefiles/multi_layer.qtree.npz")
+# Matches of the crime and school locations on the multi-layer index
+COORDINATE_CACHE_PATH = pathlib.Path("data/shapefiles/multi_layer.coords.npz")
+
+# Id and name fields of the Puma shapefile of each year
+PUMA_FIELDS = {2010: ("PUMACE10", "NAME10"), 2020: ("PUMACE20", "NAMELSAD20")}
+
+
 class Puma(NamedTuple):
     id: str
     name: str
-    polygon: Polygon
+    polygon: Polygon | MultiPolygon
 
 
 class Neighborhood(NamedTuple):
     id: str
     name: str
-    polygon: Polygon
+    polygon: Polygon | MultiPolygon
 
 
 class School(NamedTuple):
@@ -45,48 +78,78 @@ class School(NamedTuple):
     neighborhood: None | str
 
 
+# Column types of the School fields in a RecordTable, the others are kept as
+# read from the CSV
+SCHOOL_SCHEMA = {field: "object" for field in School._fields} | {
+    "latitude": "float64",
+    "longitude": "float64",
+    "year": "int16",
+    "puma": "category",
+    "neighborhood": "category",
+}
+
+# CSV column of each School field (see load_schools)
+SCHOOL_CSV_COLUMNS = {
+    "School ID": "id",
+    "School Name_x": "name",
+    "Latitude": "latitude",
+    "Longitude": "longitude",
+    "Student Count": "student_count",
+    "Is High School": "is_high_school",
+    "Is Middle School": "is_middle_school",
+    "Is Pre School": "is_pre_school",
+    "Is Elementarty School": "is_ele_school",
+    "Atttendance Rate Current Year": "attendance_rate",
+    "Graduation Rate": "graduation_rate",
+    "Address Street": "add_street",
+    "Address State": "add_state",
+    "Address Zip Code": "add_zipcode",
+    "Status as of 2024": "status_as_of_2024",
+    "Year": "year",
+    "DropoutRate": "dropout_rate",
+    "NumDropouts": "num_dropouts",
+    "TotalStudents": "total_students_dropout",
+    "AdjustedStudents": "adjusted_students",
+}
+
+
 def load_pumas_shp(path: pathlib.Path, pumas_year: int) -> list[Puma]:
     """
-    Creates a list of Pumas objects
+    Creates a list of Pumas objects. Shapes with several parts become
+    MultiPolygons (or Polygons with holes), following shape.parts.
+
+    The Chicago City records are read from the binary cache of the
+    shapefile (see load_shapefile), written the first time.
 
     Inputs: 
         - path: path from a shapefile
         - pumas_year: year from the correspondent shapefile
     """
-    name_dict = {2010: 4, 2020: 3}
-
-    pumas = []
-    with shapefile.Reader(path) as sf:
-        for shape_rec in sf.shapeRecords():
-            if shape_rec.record[name_dict[pumas_year]].startswith("Chicago City"):
-                pumas.append(
-                    Puma(
-                        id=shape_rec.record[1],
-                        name=shape_rec.record[name_dict[pumas_year]],
-                        polygon=Polygon(shape_rec.shape.points),
-                    )
-                )
-    return pumas
+    id_field, name_field = PUMA_FIELDS[pumas_year]
+    frame = load_shapefile(path, where=(name_field, "Chicago City"))
+    return [
+        Puma(id=puma_id, name=name, polygon=polygon)
+        for puma_id, name, polygon in zip(
+            frame[id_field], frame[name_field], frame.geometry
+        )
+    ]
 
 
 def load_neighborhood_shp(path: pathlib.Path) -> list[Neighborhood]:
     '''
-    Creates a list of Neighborhood objects
+    Creates a list of Neighborhood objects, with (Multi)Polygons built
+    from every part of the shapes as in load_pumas_shp.
 
     Inputs:
         - path: path from a shapefile
     '''
-    neighborhood = []
-    with shapefile.Reader(path) as sf:
-        for shape_rec in sf.shapeRecords():
-            neighborhood.append(
-                Neighborhood(
-                    id=shape_rec.record[0],
-                    name=shape_rec.record[2],
-                    polygon=Polygon(shape_rec.shape.points),
-                )
-            )
-    return neighborhood
+    frame = load_shapefile(path)
+    return [
+        Neighborhood(id=neighborhood_id, name=name, polygon=polygon)
+        for neighborhood_id, name, polygon in zip(
+            frame["CHICOMNO"], frame["DISTITLE"], frame.geometry
+        )
+    ]
 
 
 def load_schools(path: pathlib.Path) -> list[School]:
@@ -126,6 +189,28 @@ def load_schools(path: pathlib.Path) -> list[School]:
     return schools
 
 
+def load_school_table(path: pathlib.Path) -> RecordTable:
+    """
+    Same as load_schools, with the Schools in a RecordTable (SCHOOL_SCHEMA).
+    """
+    data = pd.read_csv(
+        path, usecols=list(SCHOOL_CSV_COLUMNS), dtype=str, keep_default_na=False
+    )
+    data = data.rename(columns=SCHOOL_CSV_COLUMNS)
+    return RecordTable.from_frame(data, SCHOOL_SCHEMA)
+
+
+def load_division(
+    path: pathlib.Path, pumas_year: int | None = None
+) -> list[Puma | Neighborhood]:
+    """
+    Loads the Pumas (if pumas_year is given) or Neighborhoods of a shapefile.
+    """
+    if pumas_year:
+        return load_pumas_shp(path, pumas_year)
+    return load_neighborhood_shp(path)
+
+
 def gen_chi_bbox(division: list[Puma | Neighborhood]):
     '''
     Helper function to create a Chicago BBox object from a given list of Puma or 
@@ -141,12 +226,34 @@ def gen_chi_bbox(division: list[Puma | Neighborhood]):
     return chi_bbox
 
 
-def gen_quadtree(division: list[Puma | Neighborhood], chi_bbox: BBox):
+def gen_quadtree(
+    division: list[Puma | Neighborhood],
+    chi_bbox: BBox,
+    capacity: int = 5,
+    clip: bool = False,
+    index: str = "quadtree",
+    max_depth: int = MAX_DEPTH,
+    backend: str = "shapely",
+) -> Quadtree | RTree:
     """
-    Helper function to create a quadtree for the Pumas o Neighborhoods
+    Helper function to create a quadtree for the Pumas o Neighborhoods.
+    With clip=True the leaves store the polygons clipped to their bbox, and
+    backend selects the point-in-polygon engine of match_many ("shapely"
+    or the NumPy ray casting of "numpy").
+
+    With index="rtree" it returns instead an RTree bulk loaded with STR
+    packing, with the same match/match_many interface (capacity is then the
+    number of children per node, and clip does not apply).
     """
-    capacity = 5
-    quadtree = Quadtree(chi_bbox, capacity)
+    assert index in ("quadtree", "rtree")
+    if index == "rtree":
+        return RTree.bulk_load(
+            [div.id for div in division], [div.polygon for div in division], capacity
+        )
+
+    quadtree = Quadtree(
+        chi_bbox, capacity, clip=clip, max_depth=max_depth, backend=backend
+    )
 
     for div in division:
         quadtree.add_polygon(div.id, div.polygon)
@@ -154,7 +261,135 @@ def gen_quadtree(division: list[Puma | Neighborhood], chi_bbox: BBox):
     return quadtree
 
 
-def assign_division(quadtree: Quadtree, location: Crime | School) -> str:
+def read_quadtree_config(
+    layer: str, path: pathlib.Path = QUADTREE_CONFIG_PATH
+) -> dict:
+    """
+    Returns the capacity and max_depth saved by the quadtree tuner
+    (andes_indus.quadtree_tuning) for a layer, or the defaults.
+    """
+    config = {"capacity": 5, "max_depth": MAX_DEPTH}
+    if path.exists():
+        with open(path) as f:
+            tuned = json.load(f).get(layer, {})
+        config.update(
+            {key: int(value) for key, value in tuned.items() if key in config}
+        )
+    return config
+
+
+def load_quadtree(
+    path: pathlib.Path,
+    pumas_year: int | None = None,
+    capacity: int | None = None,
+    clip: bool = False,
+    max_depth: int | None = None,
+    backend: str = "shapely",
+) -> FrozenQuadtree:
+    """
+    Loads the quadtree of a Puma (if pumas_year is given) or Neighborhood
+    shapefile from a cache file next to the shapefile.
+
+    The cache is keyed by the content of the .shp/.dbf files, capacity,
+    clip and max_depth; it is rebuilt if it is missing or stale.
+
+    Inputs:
+        - path: path from a shapefile
+        - pumas_year: year from the correspondent shapefile, None for
+          neighborhoods
+        - capacity: capacity of the quadtree nodes
+        - clip: store polygons clipped to the leaves (see gen_quadtree)
+        - max_depth: maximum depth of the quadtree
+        - backend: point-in-polygon engine of match_many (see gen_quadtree),
+          not part of the cache key
+
+    If capacity or max_depth are None, the tuned values of the layer are
+    used (see read_quadtree_config).
+    """
+    path = pathlib.Path(path)
+    layer = f"pumas{pumas_year}" if pumas_year else "neighborhoods"
+    config = read_quadtree_config(layer)
+    capacity = config["capacity"] if capacity is None else capacity
+    max_depth = config["max_depth"] if max_depth is None else max_depth
+    cache_path = path.with_name(f"{path.name}_{layer}.qtree.npz")
+    key = cache_key(layer, shapefile_hash(path), capacity, clip, max_depth)
+
+    if cache_path.exists():
+        try:
+            return FrozenQuadtree.load(cache_path, key, backend)
+        except (QuadtreeError, OSError, ValueError, KeyError):
+            pass  # stale or unreadable: rebuild it
+
+    division = load_division(path, pumas_year)
+    quadtree = gen_quadtree(
+        division,
+        gen_chi_bbox(division),
+        capacity,
+        clip,
+        max_depth=max_depth,
+        backend=backend,
+    )
+    quadtree = quadtree.freeze()
+    quadtree.save(cache_path, key)
+    return quadtree
+
+
+def load_multi_layer_index(
+    layers: dict[str, tuple[pathlib.Path, int | None]] = DIVISION_LAYERS,
+    capacity: int | None = None,
+    clip: bool = False,
+    max_depth: int | None = None,
+    cache_path: pathlib.Path = MULTI_LAYER_CACHE_PATH,
+) -> MultiLayerIndex:
+    """
+    Loads a MultiLayerIndex over several Puma and Neighborhood shapefiles,
+    from a cache file rebuilt when it is missing or stale (as load_quadtree).
+
+    Inputs:
+        - layers: layer name -> (path from a shapefile, pumas_year), with
+          pumas_year None for neighborhoods
+        - capacity, clip, max_depth: see load_quadtree. If capacity or
+          max_depth are None, the tuned values of the "multi_layer" layer
+          are used.
+        - cache_path: cache file of the index
+    """
+    config = read_quadtree_config("multi_layer")
+    capacity = config["capacity"] if capacity is None else capacity
+    max_depth = config["max_depth"] if max_depth is None else max_depth
+    cache_path = pathlib.Path(cache_path)
+    key = cache_key(
+        "multi_layer",
+        *[
+            (layer, shapefile_hash(path), pumas_year)
+            for layer, (path, pumas_year) in layers.items()
+        ],
+        capacity,
+        clip,
+        max_depth,
+    )
+
+    if cache_path.exists():
+        try:
+            return MultiLayerIndex(FrozenQuadtree.load(cache_path, key))
+        except (QuadtreeError, OSError, ValueError, KeyError):
+            pass  # stale or unreadable: rebuild it
+
+    index = MultiLayerIndex.from_layers(
+        {
+            layer: load_division(path, pumas_year)
+            for layer, (path, pumas_year) in layers.items()
+        },
+        capacity,
+        clip,
+        max_depth,
+    )
+    index.quadtree.save(cache_path, key)
+    return index
+
+
+def assign_division(
+    quadtree: Quadtree | FrozenQuadtree | RTree, location: Crime | School
+) -> str:
     '''
     Helper function to assign a Puma or Neighborhood to a specified Crime or 
     School object.
@@ -162,66 +397,256 @@ def assign_division(quadtree: Quadtree, location: Crime | School) -> str:
     if (location.longitude == "") or (location.latitude == ""):
         return None
     else:
-        loc_point = Point(float(location.longitude), float(location.latitude))
-        match_lst = quadtree.match(loc_point)
+        match_lst = quadtree.match_xy(
+            float(location.longitude), float(location.latitude), first=True
+        )
         if len(match_lst) == 0:
             return None
         return match_lst[0]
 
 
+def assign_division_to_list(
+    data_lst: list[Crime | School],
+    quadtree_chi: Quadtree | FrozenQuadtree | RTree,
+    morton: bool = False,
+) -> list[str | None]:
+    """
+    Helper function that runs assign_division over a list of Crime or School
+    objects and returns the Puma or Neighborhood of each one, in the order
+    of data_lst.
+
+    With morton=True the points are queried sorted by Morton code over
+    their bbox, so consecutive queries fall in the same leaves of the tree.
+    """
+    if not morton:
+        return [assign_division(quadtree_chi, point) for point in data_lst]
+
+    xs = pd.to_numeric(
+        [point.longitude for point in data_lst], errors="coerce"
+    ).astype(np.float64)
+    ys = pd.to_numeric(
+        [point.latitude for point in data_lst], errors="coerce"
+    ).astype(np.float64)
+    located = ~(np.isnan(xs) | np.isnan(ys))
+    if not located.any():
+        return [None] * len(data_lst)
+    bbox = BBox(
+        xs[located].min(), ys[located].min(), xs[located].max(), ys[located].max()
+    )
+
+    divisions = [None] * len(data_lst)
+    for i in morton_order(xs, ys, bbox).tolist():
+        divisions[i] = assign_division(quadtree_chi, data_lst[i])
+    return divisions
+
+
+def coordinate_columns(
+    data: pd.DataFrame | RecordTable | list[Crime | School],
+    lon: str = "longitude",
+    lat: str = "latitude",
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Longitude and latitude columns of a table (or list) of Crime or School
+    records as float64 arrays, NaN where a coordinate is missing or not a
+    number (e.g. "").
+    """
+    if isinstance(data, RecordTable):
+        data = data.to_frame()
+    data = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    if len(data) == 0:
+        return np.empty(0), np.empty(0)
+    xs = pd.to_numeric(data[lon], errors="coerce").to_numpy(np.float64)
+    ys = pd.to_numeric(data[lat], errors="coerce").to_numpy(np.float64)
+    return xs, ys
+
+
+def assign_division_ids(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    quadtree_chi: Quadtree | FrozenQuadtree | RTree,
+    morton: bool = False,
+) -> np.ndarray:
+    """
+    Vectorized assign_division: the Puma or Neighborhood of every point, with
+    one match_many over the coordinate arrays.
+
+    Inputs:
+        - xs, ys: longitude and latitude of each point (NaN if missing)
+        - quadtree_chi: index of the Pumas or Neighborhoods, or a
+          CoordinateCache of it to match each distinct point once
+        - morton: query the points sorted by Morton code (see
+          assign_division_to_list); the result is the same
+
+    Returns:
+        An object array with the id of the division of each point, in the
+        order of xs, None where there is no match
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    located = ~(np.isnan(xs) | np.isnan(ys))
+    if morton and located.any():
+        bbox = BBox(
+            xs[located].min(), ys[located].min(), xs[located].max(), ys[located].max()
+        )
+        order = morton_order(xs, ys, bbox)
+        codes = np.empty(len(xs), dtype=np.int64)
+        codes[order] = quadtree_chi.match_many(xs[order], ys[order])
+    else:
+        codes = quadtree_chi.match_many(xs, ys)
+
+    ids = np.empty(len(quadtree_chi.ids) + 1, dtype=object)
+    ids[:-1] = quadtree_chi.ids
+    ids[-1] = None
+    # -1 picks the trailing None
+    return ids[codes]
+
+
 def assign_puma_to_list(
-    data_lst: list[Crime | School], quadtree_chi: Quadtree
+    data_lst: list[Crime | School],
+    quadtree_chi: Quadtree | FrozenQuadtree | RTree,
+    morton: bool = False,
 ) -> list[Crime | School]:
     '''
     Helper function to assign a Puma to a list of Crime or School objects
     '''
-    new_data_lst = []
-    for point in data_lst:
-        new_puma = assign_division(quadtree_chi, point)
-        if new_puma is None:
-            continue
-        else:
-            if type(point) == Crime:
-                new_data_lst.append(
-                    Crime(*point[:-2], puma=new_puma, neighborhood=point[-1])
-                )
-            elif type(point) == School:
-                new_data_lst.append(
-                    School(*point[:-2], puma=new_puma, neighborhood=point[-1])
-                )
-    return new_data_lst
+    divisions = assign_division_ids(*coordinate_columns(data_lst), quadtree_chi, morton)
+    return [
+        point._replace(puma=new_puma)
+        for point, new_puma in zip(data_lst, divisions)
+        if new_puma is not None
+    ]
 
 
 def assign_neighborhood_to_list(
-    data_lst: list[Crime | School], quadtree_chi: Quadtree
+    data_lst: list[Crime | School],
+    quadtree_chi: Quadtree | FrozenQuadtree | RTree,
+    morton: bool = False,
 ) -> list[Crime | School]:
     '''
     Helper function to assign a Neigborhood to a list of Crime or School objects
     '''
-    new_data_lst = []
-    for point in data_lst:
-        new_neighborhood = assign_division(quadtree_chi, point)
-        if new_neighborhood is None:
-            continue
-        else:
-            if type(point) == Crime:
-                new_data_lst.append(Crime(*point[:-1], neighborhood=new_neighborhood))
-            elif type(point) == School:
-                new_data_lst.append(School(*point[:-1], neighborhood=new_neighborhood))
-    return new_data_lst
+    divisions = assign_division_ids(*coordinate_columns(data_lst), quadtree_chi, morton)
+    return [
+        point._replace(neighborhood=new_neighborhood)
+        for point, new_neighborhood in zip(data_lst, divisions)
+        if new_neighborhood is not None
+    ]
 
 
 def assign_puma_neighborhood(
-    data_lst: list[Crime | School], quadtree_chi: Quadtree, group: str
+    data_lst: pd.DataFrame | list[Crime | School],
+    quadtree_chi: Quadtree | FrozenQuadtree | RTree | list[Puma | Neighborhood],
+    group: str,
+    morton: bool = False,
+    workers: int = 1,
+    dedup: bool = False,
+    backend: str | None = None,
+    worker_backend: str | None = None,
 ) -> pd.DataFrame:
     '''
     Final function that creates a pd.DataFrame at Crime or School level with the 
-    information of the correspondent Puma or Neighborhood.
+    information of the correspondent Puma or Neighborhood. The group column is
+    set at once from assign_division_ids and the rows without a match are
+    dropped; the others keep the order of data_lst.
+
+    With workers > 1 the points are matched in that many processes (see
+    ParallelMatcher), and with dedup each distinct location is matched once
+    (see CoordinateCache), with the same result. worker_backend is the
+    backend of the contains tests in those processes (the one of
+    quadtree_chi by default): "numpy" shares the polygons between them
+    instead of building them in each one.
+
+    With backend, the polygons of quadtree_chi are matched by that backend
+    of spatial_join.JOIN_BACKENDS instead (e.g. "sjoin" for geopandas), and
+    quadtree_chi can also be the list of Puma or Neighborhood objects.
     '''
     assert group in ("puma", "neighborhood")
-    if group == "puma":
-        new_data_lst = assign_puma_to_list(data_lst, quadtree_chi)
+    if backend is not None:
+        if workers > 1:
+            raise ValueError("a backend cannot be matched with workers > 1")
+        # spatial_join imports this module
+        from .spatial_join import BackendIndex
+
+        if isinstance(quadtree_chi, list):
+            quadtree_chi = BackendIndex(quadtree_chi, backend)
+        else:
+            quadtree_chi = BackendIndex.from_index(quadtree_chi, backend)
+    # shallow copy: the column is never added to a DataFrame given as input
+    data = pd.DataFrame(data_lst).copy(deep=False)
+    if len(data) == 0:
+        return data
+    xs, ys = coordinate_columns(data)
+    if workers > 1:
+        with ParallelMatcher(
+            quadtree_chi, workers, backend=worker_backend
+        ) as matcher:
+            if dedup:
+                matcher = CoordinateCache(matcher)
+            data[group] = assign_division_ids(xs, ys, matcher, morton)
+    else:
+        if dedup:
+            quadtree_chi = CoordinateCache(quadtree_chi)
+        data[group] = assign_division_ids(xs, ys, quadtree_chi, morton)
+    return data[data[group].notna()].reset_index(drop=True)
+
+
+def assign_divisions(
+    data_lst: pd.DataFrame | RecordTable | list[Crime | School],
+    index: MultiLayerIndex,
+    cache: CoordinateCache | None = None,
+) -> pd.DataFrame:
+    """
+    Creates a pd.DataFrame at Crime or School level with one column per layer
+    of the index (e.g. pumas2020, pumas2010, neighborhoods) holding the id of
+    the correspondent Puma or Neighborhood, None when there is no match.
+
+    Every layer is assigned in a single pass over the points, and rows are
+    kept in the order of data_lst (including the ones without a match). With
+    a CoordinateCache of the index, records sharing a location (e.g. crimes
+    of the same block) are matched once.
+    """
+    if isinstance(data_lst, RecordTable):
+        data = data_lst.to_frame()
     else:
-        new_data_lst = assign_neighborhood_to_list(data_lst, quadtree_chi)
+        data = pd.DataFrame(data_lst).copy(deep=False)
+    for layer, ids in index.assign(*coordinate_columns(data), cache).items():
+        data[layer] = ids
+    return data
+
+
+def count_crimes_near_schools(
+    crime_lst: list[Crime], school_lst: list[School], radius: float = 500.0
+) -> pd.DataFrame:
+    """
+    Creates a pd.DataFrame with, for every School and year, the number of
+    Crimes of that same year within radius meters of the school.
 
-    return pd.DataFrame(new_data_lst)
+    A KDTree is built over the crimes of each year, so each school is a
+    radius count instead of a scan over every crime.
+    """
+    crimes_by_year = {}
+    for crime in crime_lst:
+        crimes_by_year.setdefault(int(crime.year), []).append(
+            (float(crime.longitude), float(crime.latitude))
+        )
+
+    schools_by_year = {}
+    for school in school_lst:
+        if (school.longitude == "") or (school.latitude == ""):
+            continue
+        schools_by_year.setdefault(int(school.year), []).append(school)
+
+    rows = []
+    for year, schools in schools_by_year.items():
+        coords = np.array(crimes_by_year.get(year, []), dtype=np.float64)
+        coords = coords.reshape(-1, 2)
+        kdtree = KDTree.from_lonlat(coords[:, 0], coords[:, 1])
+        xs, ys = project_lonlat(
+            [float(school.longitude) for school in schools],
+            [float(school.latitude) for school in schools],
+        )
+        counts = kdtree.count_within_radius_many(xs, ys, radius)
+        for school, count in zip(schools, counts):
+            rows.append((school.id, year, int(count)))
+
+    return pd.DataFrame(rows, columns=["id", "year", "crimes_within_radius"])
@@ -0,0 +1,172 @@
+import numpy as np
+
+from .quadtree import MAX_DEPTH, BBox, FrozenQuadtree, Quadtree, QuadtreeError
+
+# Separator between the layer and the polygon id in the ids of the tree
+LAYER_SEP = "/"
+
+
+class MultiLayerIndex:
+    """
+    Single quadtree over the polygons of several boundary layers, that finds
+    the polygon of every layer holding a point in one traversal.
+
+    The tree ids are "layer/id", and the polygons of each layer are inserted
+    one layer after the other, so:
+
+        - layers: layer names, in insertion order
+        - layer_ids: layer name -> ids of its polygons, in insertion order
+        - code_layer: int64 array with the layer (position in layers) of
+          each code of the tree
+        - code_local: int64 array with the position of each code within
+          the ids of its layer
+
+    Within a layer the first polygon (in insertion order) holding a point
+    wins, as in Quadtree.match_many.
+    """
+
+    def __init__(self, quadtree: FrozenQuadtree):
+        self.quadtree = quadtree
+        self.layers = []
+        self.layer_ids = {}
+        code_layer, code_local = [], []
+        for tree_id in quadtree.ids:
+            layer, sep, pid = tree_id.partition(LAYER_SEP)
+            if not sep:
+                raise QuadtreeError(f"id {tree_id!r} has no layer")
+            if layer not in self.layer_ids:
+                self.layers.append(layer)
+                self.layer_ids[layer] = []
+            code_layer.append(self.layers.index(layer))
+            code_local.append(len(self.layer_ids[layer]))
+            self.layer_ids[layer].append(pid)
+        self.code_layer = np.array(code_layer, dtype=np.int64)
+        self.code_local = np.array(code_local, dtype=np.int64)
+
+    @classmethod
+    def from_layers(
+        cls,
+        layers: dict[str, list],
+        capacity: int = 5,
+        clip: bool = False,
+        max_depth: int = MAX_DEPTH,
+    ) -> "MultiLayerIndex":
+        """
+        Build the index from layer name -> list of Puma or Neighborhood
+        objects. The tree covers the bounding box of all the layers.
+        """
+        return cls(cls.build_quadtree(layers, capacity, clip, max_depth).freeze())
+
+    @staticmethod
+    def build_quadtree(
+        layers: dict[str, list],
+        capacity: int = 5,
+        clip: bool = False,
+        max_depth: int = MAX_DEPTH,
+    ) -> Quadtree:
+        """
+        Unfrozen quadtree of from_layers, with the "layer/id" ids.
+        """
+        bounds = np.array(
+            [div.polygon.bounds for division in layers.values() for div in division]
+        )
+        bbox = BBox(*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0))
+        quadtree = Quadtree(bbox, capacity, clip=clip, max_depth=max_depth)
+        for layer, division in layers.items():
+            if LAYER_SEP in layer:
+                raise QuadtreeError(f"layer name {layer!r} contains {LAYER_SEP!r}")
+            for div in division:
+                quadtree.add_polygon(f"{layer}{LAYER_SEP}{div.id}", div.polygon)
+        return quadtree
+
+    def __repr__(self) -> str:
+        return f"MultiLayerIndex(layers={self.layers}, {self.quadtree!r})"
+
+    def match_xy(self, x: float, y: float) -> dict[str, str | None]:
+        """
+        Id of the polygon of each layer holding the point (None if there is
+        none).
+        """
+        return {
+            layer: None if code < 0 else self.layer_ids[layer][code]
+            for layer, code in zip(self.layers, self.match_many([x], [y])[0])
+        }
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Batched query over every layer at once.
+
+        Points are located on the leaves of the tree level by level and
+        grouped by leaf; each candidate polygon of a leaf is only tested on
+        the points that have no match yet in its own layer.
+
+        Returns:
+            An int64 array (n_points, n_layers) with the position of the
+            matching polygon within the ids of each layer, -1 for no match.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise QuadtreeError("xs and ys must be 1-D arrays of the same length")
+
+        tree = self.quadtree
+        result = np.full((len(xs), len(self.layers)), -1, dtype=np.int64)
+        leaves = tree.locate_leaves(xs, ys)
+
+        # Group the points by leaf
+        located = np.flatnonzero(leaves >= 0)
+        located = located[np.argsort(leaves[located])]
+        counts = np.bincount(leaves[located], minlength=len(tree.bounds))
+        ends = np.cumsum(counts)
+
+        for leaf in np.flatnonzero(counts):
+            points = located[ends[leaf] - counts[leaf] : ends[leaf]]
+            pending = [points] * len(self.layers)
+            remaining = len(self.layers)
+            for i in range(tree.leaf_start[leaf], tree.leaf_end[leaf]):
+                code = tree.leaf_polygons[i]
+                layer = self.code_layer[code]
+                layer_pending = pending[layer]
+                if len(layer_pending) == 0:
+                    continue
+                if tree.leaf_full[i]:
+                    hits = np.ones(len(layer_pending), dtype=bool)
+                else:
+                    hits = tree.leaf_contains(i, xs[layer_pending], ys[layer_pending])
+                result[layer_pending[hits], layer] = self.code_local[code]
+                pending[layer] = layer_pending[~hits]
+                if len(pending[layer]) == 0:
+                    remaining -= 1
+                    if remaining == 0:
+                        break
+        return result
+
+    def assign(
+        self, xs: np.ndarray, ys: np.ndarray, cache=None
+    ) -> dict[str, np.ndarray]:
+        """
+        Same as match_many, with ids instead of positions.
+
+        Inputs:
+            - xs, ys: coordinates of the points
+            - cache: CoordinateCache of this index, to match each distinct
+              point once (and reuse the matches of earlier calls)
+
+        Returns:
+            dict: layer name -> object array with the id of the matching
+            polygon of each point, None for no match
+        """
+        if cache is None:
+            codes = self.match_many(xs, ys)
+        elif cache.matcher is self:
+            codes = cache.match_many(xs, ys)
+        else:
+            raise QuadtreeError("the coordinate cache is not of this index")
+        assigned = {}
+        for column, layer in enumerate(self.layers):
+            ids = np.empty(len(self.layer_ids[layer]) + 1, dtype=object)
+            ids[:-1] = self.layer_ids[layer]
+            ids[-1] = None
+            # -1 picks the trailing None
+            assigned[layer] = ids[codes[:, column]]
+        return assigned
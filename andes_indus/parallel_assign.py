@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+from typing import Self
+
+import numpy as np
+
+from .quadtree import FrozenQuadtree, Quadtree, QuadtreeError
+from .shared_index import SharedIndexHandle, SharedQuadtree
+
+# Points sent to a worker at once
+CHUNK_SIZE = 65536
+
+# Index of each worker process, attached once by init_worker
+_worker_index = None
+
+
+def init_worker(handle: SharedIndexHandle) -> None:
+    """
+    Attach the worker to the shared index (once per process).
+    """
+    global _worker_index
+    _worker_index = SharedQuadtree.attach(handle)
+
+
+def match_chunk(chunk: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    match_many over a chunk of points, in a worker.
+    """
+    return _worker_index.match_many(*chunk)
+
+
+class ParallelMatcher:
+    """
+    Runs match_many of a quadtree in a pool of worker processes.
+
+    The tree is copied once into a SharedQuadtree and every worker attaches
+    to it when it starts, so only the chunks of points and the results go
+    through the pool. The workers test the points with the exact
+    geometries and the backend of the tree, and chunks are put back in the
+    order of the points: the result is the same as quadtree.match_many,
+    points on a boundary included.
+
+    With the "shapely" backend (the one of load_quadtree) every worker
+    builds its own copy of the geometries; backend="numpy" shares them
+    instead, so memory stays flat as workers are added, but points lying
+    exactly on a boundary can get another answer than the serial path (see
+    SharedQuadtree).
+
+        - ids: ids of the polygons, as in the quadtree (so a ParallelMatcher
+          can be used instead of the quadtree, e.g. by assign_division_ids)
+        - workers: number of worker processes
+        - chunk_size: points per task
+        - backend: engine of the contains tests in the workers (see
+          quadtree.BACKENDS), the one of the quadtree by default
+
+    Use it as a context manager (or call close) to stop the workers and
+    release the shared index.
+    """
+
+    def __init__(
+        self,
+        quadtree: Quadtree | FrozenQuadtree,
+        workers: int | None = None,
+        chunk_size: int = CHUNK_SIZE,
+        context: str | None = None,
+        backend: str | None = None,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        if isinstance(quadtree, Quadtree):
+            quadtree = quadtree.freeze()
+        if not isinstance(quadtree, FrozenQuadtree):
+            raise QuadtreeError("ParallelMatcher needs a Quadtree or FrozenQuadtree")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.ids = quadtree.ids
+        self.codes = quadtree.codes
+        if isinstance(quadtree, SharedQuadtree) and backend in (
+            None,
+            quadtree.backend,
+        ):
+            self.shared, self.owner = quadtree, False
+        else:
+            self.shared = SharedQuadtree.share(quadtree, backend=backend)
+            self.owner = True
+        self.backend = self.shared.backend
+        self.pool = multiprocessing.get_context(context).Pool(
+            self.workers, initializer=init_worker, initargs=(self.shared.handle,)
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"ParallelMatcher(workers={self.workers}, "
+            f"chunk_size={self.chunk_size}, backend={self.backend!r})"
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Same as FrozenQuadtree.match_many, with the chunks of points matched
+        in the workers.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise QuadtreeError("xs and ys must be 1-D arrays of the same length")
+        if len(xs) == 0:
+            return np.full(0, -1, dtype=np.int64)
+
+        starts = range(0, len(xs), self.chunk_size)
+        chunks = [
+            (xs[start : start + self.chunk_size], ys[start : start + self.chunk_size])
+            for start in starts
+        ]
+        # imap keeps the order of the chunks
+        return np.concatenate(list(self.pool.imap(match_chunk, chunks)))
+
+    def close(self) -> None:
+        """
+        Stop the workers, and release the shared index if it was created
+        here.
+        """
+        self.pool.close()
+        self.pool.join()
+        if self.owner:
+            self.shared.close()
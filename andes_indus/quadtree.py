@@ -1,5 +1,17 @@
+from functools import cached_property, partial
+from itertools import pairwise
 from typing import NamedTuple
-from shapely.geometry import Polygon, box, Point
+from shapely.geometry import Polygon, MultiPolygon, box, Point
+from shapely import contains_xy, prepare, from_wkb, to_wkb, union
+import shapely
+import numpy as np
+from .ray_casting import RingPolygon
+from .approximations import (
+    PolygonApproximation,
+    APPROX_RESOLUTION,
+    OUTSIDE,
+    INSIDE,
+)
 
 
 class QuadtreeError(Exception):
@@ -15,12 +27,327 @@ class BBox(NamedTuple):
     max_y: float
 
 
+def pack_wkb(geoms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Serialize geometries as WKB in a single uint8 buffer.
+
+    Returns:
+        The buffer, and an int64 array with the n + 1 offsets of each geometry
+    """
+    wkb = [bytes(b) for b in to_wkb(geoms)]
+    offsets = np.cumsum([0] + [len(b) for b in wkb], dtype=np.int64)
+    return np.frombuffer(b"".join(wkb), dtype=np.uint8), offsets
+
+
+def unpack_wkb(buffer: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Inverse of pack_wkb. The geometries are returned prepared.
+    """
+    wkb = buffer.tobytes()
+    geoms = from_wkb(
+        np.array(
+            [wkb[start:end] for start, end in pairwise(offsets)],
+            dtype=object,
+        )
+    )
+    prepare(geoms)
+    return geoms
+
+
+def pack_leaf_geoms(
+    leaf_geoms: np.ndarray, leaf_polygons: np.ndarray, polygons: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Serialize the leaf geometries of a FrozenQuadtree, each distinct one
+    once. Leaves share the same object for the same part of a multipart
+    polygon, and most entries are the whole polygon: those are not written
+    at all.
+
+    Returns:
+        The WKB buffer and offsets (see pack_wkb) of the distinct leaf
+        geometries, and an int32 array aligned with leaf_polygons with the
+        position of the geometry of each entry among them (-1 for the
+        whole polygon)
+    """
+    refs = np.full(len(leaf_polygons), -1, dtype=np.int32)
+    distinct, positions = [], {}
+    for i, (geom, code) in enumerate(zip(leaf_geoms, leaf_polygons)):
+        if geom is polygons[code]:
+            continue
+        ref = positions.get(id(geom))
+        if ref is None:
+            ref = positions[id(geom)] = len(distinct)
+            distinct.append(geom)
+        refs[i] = ref
+    buffer, offsets = pack_wkb(np.array(distinct, dtype=object))
+    return buffer, offsets, refs
+
+
+def unpack_leaf_geoms(
+    buffer: np.ndarray,
+    offsets: np.ndarray,
+    refs: np.ndarray,
+    leaf_polygons: np.ndarray,
+    polygons: np.ndarray,
+) -> np.ndarray:
+    """
+    Inverse of pack_leaf_geoms: entries that refer to the same geometry
+    get the same (prepared) object.
+    """
+    leaf_geoms = polygons[leaf_polygons]
+    apart = refs >= 0
+    leaf_geoms[apart] = unpack_wkb(buffer, offsets)[refs[apart]]
+    return leaf_geoms
+
+
+class QueryCounters:
+    """
+    Counters of the work done by the queries of a tree, see
+    CountersMixin.enable_counters.
+
+        - queries: number of points queried
+        - nodes_visited: nodes entered by the queries (a point entering
+          3 nodes counts 3)
+        - bbox_tests: bounding box (or midpoint) comparisons
+        - contains_tests: exact point-in-polygon tests
+        - inner_hits, outer_rejects: (point, polygon) pairs resolved by the
+          inner or outer approximation of the polygon, without an exact
+          test (see ApproximationMixin.approximate)
+        - exact_queries: queries that needed at least one exact test
+        - leaf_occupancy: polygons on the leaf reached -> number of queries
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.queries = 0
+        self.nodes_visited = 0
+        self.bbox_tests = 0
+        self.contains_tests = 0
+        self.inner_hits = 0
+        self.outer_rejects = 0
+        self.exact_queries = 0
+        self.leaf_occupancy = {}
+
+    def add_leaf(self, occupancy: int, queries: int = 1) -> None:
+        self.leaf_occupancy[occupancy] = self.leaf_occupancy.get(occupancy, 0) + queries
+
+    def report(self) -> dict:
+        """
+        The counters, and their averages per query.
+        """
+        queries = max(self.queries, 1)
+        return {
+            "queries": self.queries,
+            "nodes_visited": self.nodes_visited,
+            "bbox_tests": self.bbox_tests,
+            "contains_tests": self.contains_tests,
+            "inner_hits": self.inner_hits,
+            "outer_rejects": self.outer_rejects,
+            "exact_queries": self.exact_queries,
+            "nodes_per_query": self.nodes_visited / queries,
+            "bbox_tests_per_query": self.bbox_tests / queries,
+            "contains_tests_per_query": self.contains_tests / queries,
+            "exact_fraction": self.exact_queries / queries,
+            "leaf_occupancy": dict(sorted(self.leaf_occupancy.items())),
+        }
+
+
+class QueryHooksMixin:
+    """
+    Optional hooks of the scalar path of Quadtree and FrozenQuadtree.
+
+    The scalar path of both trees is a single walk (_descend_xy) with two
+    optional hooks: the QueryCounters to update (CountersMixin), and the
+    approximations to go through before each exact test
+    (ApproximationMixin). Enabling either shadows match_xy on the instance
+    with the walk bound to them, so the plain match_xy passes no hooks.
+    """
+
+    counters = None
+    approximations = None
+
+    def _select_match_xy(self) -> None:
+        """
+        Shadow match_xy with the walk bound to the enabled hooks.
+        """
+        self.__dict__.pop("match_xy", None)
+        if self.counters is not None or self.approximations is not None:
+            self.match_xy = partial(
+                self._descend_xy,
+                counters=self.counters,
+                approximations=self.approximations,
+            )
+
+
+class CountersMixin(QueryHooksMixin):
+    """
+    Opt-in query counters for Quadtree and FrozenQuadtree. The scalar path
+    updates them through its hook (see QueryHooksMixin); the batched paths
+    check counters once per node or leaf group, never per point.
+    """
+
+    def enable_counters(self) -> QueryCounters:
+        """
+        Start counting the work done by the queries on this tree.
+
+        Returns:
+            The QueryCounters, also available as self.counters
+        """
+        if getattr(self, "depth", 0) != 0:
+            raise QuadtreeError("counters can only be enabled on the root node")
+        self.counters = QueryCounters()
+        self._select_match_xy()
+        return self.counters
+
+    def disable_counters(self) -> None:
+        """
+        Stop counting, restoring the plain match_xy.
+        """
+        self.counters = None
+        self._select_match_xy()
+
+
+class ApproximationMixin(QueryHooksMixin):
+    """
+    Opt-in polygon approximations for the scalar path of Quadtree and
+    FrozenQuadtree: approximate resolves most points with the inner/outer
+    approximation of each polygon (see QueryHooksMixin).
+    """
+
+    def approximate(self, resolution: int = APPROX_RESOLUTION) -> None:
+        """
+        Build the PolygonApproximation of every polygon of the tree. From
+        then on, match_xy accepts the points in the inner approximation of
+        a polygon and rejects the ones out of its outer approximation right
+        away: only the points near its boundary run the exact contains
+        test. The results do not change.
+
+        match_many does not use them: one vectorized contains test per leaf
+        polygon is already cheaper per point than classifying every point
+        on the grid of each polygon first.
+
+        Inputs:
+            - resolution: cells along the longest side of each polygon
+        """
+        if getattr(self, "depth", 0) != 0:
+            raise QuadtreeError("approximations can only be built on the root node")
+        self.approximations = [
+            PolygonApproximation(geom, resolution) for geom in self.geoms
+        ]
+        self._select_match_xy()
+
+    def drop_approximations(self) -> None:
+        """
+        Go back to an exact contains test for every candidate polygon.
+        """
+        self.approximations = None
+        self._select_match_xy()
+
+
+class PolygonQueryMixin:
+    """
+    Polygon queries for the indexes that can list the candidate polygons
+    of a bounding box (candidates): Quadtree, FrozenQuadtree and
+    LookupGrid.
+    """
+
+    def query_polygon(self, geom: Polygon | MultiPolygon) -> list[str]:
+        """
+        Ids of the polygons of the tree that intersect a geometry (touching
+        counts), in insertion order. Only the polygons stored on the leaves
+        that overlap the bbox of the geometry are tested.
+        """
+        codes = self.candidates(geom.bounds)
+        hits = shapely.intersects(np.asarray(self.geoms, dtype=object)[codes], geom)
+        return [self.ids[code] for code in codes[hits]]
+
+    def overlap_areas(
+        self, geoms: list[Polygon | MultiPolygon]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched query_polygon that returns the area of every overlap.
+
+        The candidate pairs of all the geometries are collected first, and
+        their intersections computed in a single vectorized call. Areas are
+        in the units of the coordinates (square degrees for longitude and
+        latitude, good enough for shares within a city).
+
+        Returns:
+            Three arrays, one entry per pair with a positive overlap area:
+            the position of the geometry in geoms (int64), the code of the
+            polygon of the tree (int64) and the area (float64), sorted by
+            geometry and code
+        """
+        geoms = np.asarray(geoms, dtype=object)
+        polygons = np.asarray(self.geoms, dtype=object)
+        candidates = [self.candidates(geom.bounds) for geom in geoms]
+        rows = np.repeat(np.arange(len(geoms)), [len(c) for c in candidates])
+        codes = np.concatenate(candidates).astype(np.int64) if candidates else rows
+
+        # Skip the pairs whose polygon bounds do not overlap
+        a, b = shapely.bounds(geoms[rows]), shapely.bounds(polygons[codes])
+        near = (
+            (a[:, 0] <= b[:, 2])
+            & (b[:, 0] <= a[:, 2])
+            & (a[:, 1] <= b[:, 3])
+            & (b[:, 1] <= a[:, 3])
+        )
+        rows, codes = rows[near], codes[near]
+        areas = shapely.area(shapely.intersection(geoms[rows], polygons[codes]))
+        overlap = areas > 0
+        return rows[overlap], codes[overlap], areas[overlap]
+
+
+def tree_stats(
+    n_nodes: int, n_polygons: int, leaf_depths: np.ndarray, leaf_sizes: np.ndarray
+) -> dict:
+    """
+    Summary of the shape of a tree.
+
+    Inputs:
+        - n_nodes: number of nodes
+        - n_polygons: number of distinct polygons
+        - leaf_depths, leaf_sizes: depth and number of polygons of each leaf
+
+    Returns:
+        dict with the node and leaf counts, the depth distribution and the
+        leaf occupancy distribution (as value -> number of leaves), and the
+        duplication factor: polygon entries over all leaves per polygon.
+    """
+    depths, depth_counts = np.unique(leaf_depths, return_counts=True)
+    sizes, size_counts = np.unique(leaf_sizes, return_counts=True)
+    entries = int(leaf_sizes.sum())
+    return {
+        "nodes": n_nodes,
+        "leaves": len(leaf_sizes),
+        "polygons": n_polygons,
+        "leaf_entries": entries,
+        "duplication_factor": entries / n_polygons if n_polygons else 0.0,
+        "max_depth": int(depths.max()) if len(depths) else 0,
+        "depth_histogram": dict(zip(depths.tolist(), depth_counts.tolist())),
+        "leaf_occupancy_histogram": dict(zip(sizes.tolist(), size_counts.tolist())),
+    }
+
+
+# Point-in-polygon engines of the batched leaf tests: shapely's
+# contains_xy, or the NumPy crossing-number kernel of ray_casting
+BACKENDS = ("shapely", "numpy")
+
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise QuadtreeError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    return backend
+
+
 # Maximum depth of a quadtree.
 # Do not subdivide nodes if depth exceeds this value.
 MAX_DEPTH = 8
 
 
-class Quadtree:
+class Quadtree(CountersMixin, ApproximationMixin, PolygonQueryMixin):
     """
     Class that represents a node in the quadtree.
 
@@ -29,14 +356,52 @@ class Quadtree:
         - capacity
         - depth (first node is depth=0, children would be depth=1, etc.)
         - either children OR polygons
+
+    Nodes are not subdivided beyond max_depth (MAX_DEPTH by default).
+
+    The root node also keeps the ids of every polygon added to the tree in
+    insertion order (ids), and the polygons themselves (geoms), so batched
+    queries can return integer positions.
+
+    Each part of a MultiPolygon is added under its own bbox, so a leaf only
+    stores (and tests) the parts of the polygon near it.
+
+    With clip=True, each leaf stores the polygons clipped to its own bbox,
+    and the ids of the polygons that cover the whole leaf are kept in full:
+    a query there matches them without any geometry test.
+
+    backend selects the point-in-polygon engine of the batched queries
+    (match_many): "shapely" or "numpy" (see ray_casting.RingPolygon). The
+    scalar path always uses shapely.
+
+    Query counters and polygon approximations can be enabled on the root
+    (see CountersMixin and ApproximationMixin), and stats reports the shape
+    of a built tree.
     """
 
-    def __init__(self, bbox: BBox, capacity: int, depth: int = 0):
+    def __init__(
+        self,
+        bbox: BBox,
+        capacity: int,
+        depth: int = 0,
+        clip: bool = False,
+        max_depth: int = MAX_DEPTH,
+        backend: str = "shapely",
+    ):
         self.bbox = bbox
         self.capacity = capacity
         self.depth = depth
+        self.clip = clip
+        self.max_depth = max_depth
+        self.backend = check_backend(backend)
+        self.rings = {}
         self.polygons = {}
+        self.full = set()
         self.children = []
+        self.node_box = None
+        self.ids = []
+        self.codes = {}
+        self.geoms = []
 
     def is_split(self) -> bool:
         """
@@ -71,10 +436,38 @@ class Quadtree:
 
         # Create child Quadtrees at the next depth
         self.children = [
-            Quadtree(bbox_nw, self.capacity, self.depth + 1),
-            Quadtree(bbox_ne, self.capacity, self.depth + 1),
-            Quadtree(bbox_se, self.capacity, self.depth + 1),
-            Quadtree(bbox_sw, self.capacity, self.depth + 1),
+            Quadtree(
+                bbox_nw,
+                self.capacity,
+                self.depth + 1,
+                self.clip,
+                self.max_depth,
+                self.backend,
+            ),
+            Quadtree(
+                bbox_ne,
+                self.capacity,
+                self.depth + 1,
+                self.clip,
+                self.max_depth,
+                self.backend,
+            ),
+            Quadtree(
+                bbox_se,
+                self.capacity,
+                self.depth + 1,
+                self.clip,
+                self.max_depth,
+                self.backend,
+            ),
+            Quadtree(
+                bbox_sw,
+                self.capacity,
+                self.depth + 1,
+                self.clip,
+                self.max_depth,
+                self.backend,
+            ),
         ]
 
     def __repr__(self) -> str:
@@ -88,98 +481,1146 @@ class Quadtree:
         else:
             return f"Quadtree(polygons={len(self.polygons)})"
 
-    def add_polygon(self, id: str, polygon: Polygon) -> bool:
-        # 1) Check if polygon intersects the bounding box of this node
-        node_box = box(
-            self.bbox.min_x, self.bbox.min_y, self.bbox.max_x, self.bbox.max_y
-        )
+    def intersects(self, polygon: Polygon) -> bool:
+        """
+        Check if a polygon intersects the bounding box of this node.
+
+        The polygon bounds are compared first as plain floats, and the
+        shapely box of the node is only built once, when it is first needed.
+        """
+        min_x, min_y, max_x, max_y = polygon.bounds
+        if (
+            min_x > self.bbox.max_x
+            or max_x < self.bbox.min_x
+            or min_y > self.bbox.max_y
+            or max_y < self.bbox.min_y
+        ):
+            return False
+        if self.node_box is None:
+            self.node_box = box(*self.bbox)
+        return polygon.intersects(self.node_box)
+
+    def add_polygon(self, id: str, polygon: Polygon | MultiPolygon) -> bool:
+        # Prepared geometries make every later contains test faster
+        prepare(polygon)
+        added = self._add_polygon(id, polygon)
+        if added and self.depth == 0 and id not in self.codes:
+            self.codes[id] = len(self.ids)
+            self.ids.append(id)
+            self.geoms.append(polygon)
+        return added
+
+    def _add_polygon(self, id: str, polygon: Polygon | MultiPolygon) -> bool:
+        # 0) Each part of a multipart polygon is indexed under its own bbox
+        if polygon.geom_type == "MultiPolygon":
+            added = False
+            for part in polygon.geoms:
+                prepare(part)
+                if self._add_polygon(id, part):
+                    added = True
+            return added
 
-        if not polygon.intersects(node_box):
+        # 1) Check if polygon intersects the bounding box of this node
+        if not self.intersects(polygon):
             return False
 
         # 2) If this node is already split, pass polygon to the children
         if self.is_split():
             added = False
             for child in self.children:
-                child_box = box(
-                    child.bbox.min_x,
-                    child.bbox.min_y,
-                    child.bbox.max_x,
-                    child.bbox.max_y,
-                )
-                if polygon.intersects(child_box):
-                    child.add_polygon(id, polygon)
+                if child.intersects(polygon) and child._add_polygon(id, polygon):
                     added = True
             return added
 
         # 3) If not split: check capacity
-        if len(self.polygons) >= self.capacity and self.depth < MAX_DEPTH:
+        if (
+            id not in self.polygons
+            and len(self.polygons) >= self.capacity
+            and self.depth < self.max_depth
+        ):
             # subdivide
             self.subdivide()
 
             # move existing polygons to children
             old_polygons = self.polygons
             self.polygons = {}  # Clear them from this node
+            self.full = set()
 
             for pid, poly in old_polygons.items():
                 for child in self.children:
-                    child_box = box(
-                        child.bbox.min_x,
-                        child.bbox.min_y,
-                        child.bbox.max_x,
-                        child.bbox.max_y,
-                    )
-                    if poly.intersects(child_box):
-                        child.add_polygon(pid, poly)
+                    if child.intersects(poly):
+                        child._add_polygon(pid, poly)
 
             # Now add the new polygon similarly
             added = False
             for child in self.children:
-                child_box = box(
-                    child.bbox.min_x,
-                    child.bbox.min_y,
-                    child.bbox.max_x,
-                    child.bbox.max_y,
-                )
-                if polygon.intersects(child_box):
-                    child.add_polygon(id, polygon)
+                if child.intersects(polygon) and child._add_polygon(id, polygon):
                     added = True
             return added
         else:
-            # either capacity not exceeded, or we're at MAX_DEPTH
-            self.polygons[id] = polygon
+            # either capacity not exceeded, or we're at max_depth
+            if self.clip:
+                return self._add_fragment(id, polygon)
+            self._store(id, polygon)
             return True
 
-    def match(self, point: Point) -> list[str]:
+    def _store(self, id: str, polygon: Polygon) -> None:
+        """
+        Store a polygon on this leaf. If another part of the same multipart
+        polygon is already there, the leaf keeps the union of both parts.
+        """
+        if id in self.full:
+            return
+        if id in self.polygons:
+            polygon = union(self.polygons[id], polygon)
+            prepare(polygon)
+        self.polygons[id] = polygon
+
+    def _add_fragment(self, id: str, polygon: Polygon) -> bool:
+        """
+        Store on this leaf the part of the polygon inside its bbox.
+
+        A point strictly inside the bbox is inside the polygon if and only if
+        it is inside that fragment, so contains tests only pay for the
+        vertices of the boundary near this leaf.
+        """
+        if self.node_box is None:
+            self.node_box = box(*self.bbox)
+        if polygon.covers(self.node_box):
+            self.polygons[id] = self.node_box
+            self.full.add(id)
+            return True
+
+        fragment = polygon.intersection(self.node_box)
+        if fragment.area == 0:
+            # only touches the bbox: no point inside it can match
+            return False
+        prepare(fragment)
+        self._store(id, fragment)
+        return True
+
+    def candidates(self, bounds: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Codes of the polygons stored on the leaves whose bbox overlaps
+        bounds (min_x, min_y, max_x, max_y, edges included).
+
+        Returns:
+            A sorted int64 array without repeated codes
+        """
+        if self.depth != 0:
+            raise QuadtreeError("candidates can only be queried on the root node")
+        min_x, min_y, max_x, max_y = bounds
+        found = set()
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            if (
+                node.bbox.min_x > max_x
+                or node.bbox.max_x < min_x
+                or node.bbox.min_y > max_y
+                or node.bbox.max_y < min_y
+            ):
+                continue
+            if node.children:
+                nodes.extend(node.children)
+            else:
+                found.update(node.polygons)
+        return np.array(sorted(self.codes[pid] for pid in found), dtype=np.int64)
+
+    def match(self, point: Point, first: bool = False) -> list[str]:
         """
         This method takes a point and finds the id of all polygons
         that it falls within that are within this node or its children.
+
+        If first is True, it returns as soon as one polygon matches.
         """
+        return self.match_xy(point.x, point.y, first)
 
+    def match_xy(self, x: float, y: float, first: bool = False) -> list[str]:
+        """
+        Scalar query path of match for a single x (longitude) and y (latitude)
+        coordinate. It does not build any shapely object: node bounds are
+        compared as plain floats and leaf polygons are prepared geometries.
+        """
+        return self._descend_xy(x, y, first)
+
+    def _descend_xy(
+        self,
+        x: float,
+        y: float,
+        first: bool = False,
+        counters: QueryCounters | None = None,
+        approximations: list | None = None,
+    ) -> list[str]:
+        """
+        Walk of match_xy, with the optional hooks (see QueryHooksMixin):
+        counters to update, and the approximations to go through before the
+        exact test of each polygon.
+        """
+        if counters is not None:
+            counters.queries += 1
+            counters.nodes_visited += 1
+            counters.bbox_tests += 1
         results = []
-        # 1) check bounding-box containment
-        node_box = box(
-            self.bbox.min_x, self.bbox.min_y, self.bbox.max_x, self.bbox.max_y
-        )
-        if not node_box.contains(point):
+        # 1) check bounding-box containment (points on the edge are outside)
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x < x < max_x and min_y < y < max_y):
             return results
 
-        # 2) If split, recurse to children.
+        # 2) If split, walk down to the only child that contains the point.
+        node = self
+        while node.children:
+            for child in node.children:
+                if counters is not None:
+                    counters.bbox_tests += 1
+                min_x, min_y, max_x, max_y = child.bbox
+                if min_x < x < max_x and min_y < y < max_y:
+                    node = child
+                    if counters is not None:
+                        counters.nodes_visited += 1
+                    break
+            else:
+                return results
+
+        # 3) Unsplitted node: check all polygons it holds
+        if counters is not None:
+            counters.add_leaf(len(node.polygons))
+        full = node.full
+        exact = False
+        for pid, poly in node.polygons.items():
+            if pid not in full:
+                state = None
+                if approximations is not None:
+                    state = approximations[self.codes[pid]].classify_xy(x, y)
+                if state == OUTSIDE:
+                    if counters is not None:
+                        counters.outer_rejects += 1
+                    continue
+                if state == INSIDE:
+                    if counters is not None:
+                        counters.inner_hits += 1
+                else:
+                    exact = True
+                    if counters is not None:
+                        counters.contains_tests += 1
+                    if not contains_xy(poly, x, y):
+                        continue
+            results.append(pid)
+            if first:
+                break
+
+        if counters is not None:
+            counters.exact_queries += exact
+        return results
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Batched version of match for arrays of x (longitude) and y (latitude)
+        coordinates.
+
+        Whole batches of points are sent down the tree with vectorized bbox
+        masks, and each leaf tests its polygons with shapely's contains_xy
+        (or RingPolygon.contains_xy with the "numpy" backend).
+
+        Returns:
+            An int64 array with, for every point, the position in self.ids of
+            the first polygon that match would return, or -1 if none.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise QuadtreeError("xs and ys must be 1-D arrays of the same length")
+
+        result = np.full(len(xs), -1, dtype=np.int64)
+        if self.counters is not None:
+            self.counters.queries += len(xs)
+        self._match_many(
+            xs, ys, np.arange(len(xs)), result, self.codes, self.counters
+        )
+        return result
+
+    def _match_many(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        idx: np.ndarray,
+        result: np.ndarray,
+        codes: dict,
+        counters: QueryCounters | None = None,
+    ) -> None:
+        # 1) keep the points strictly inside this node's bounding box
+        # (same rule as box.contains in match)
+        inside = (
+            (xs > self.bbox.min_x)
+            & (xs < self.bbox.max_x)
+            & (ys > self.bbox.min_y)
+            & (ys < self.bbox.max_y)
+        )
+        if not inside.all():
+            xs, ys, idx = xs[inside], ys[inside], idx[inside]
+        if counters is not None:
+            counters.bbox_tests += len(inside)
+            counters.nodes_visited += len(idx)
+        if len(idx) == 0:
+            return
+
+        # 2) If split, pass the batch to the children.
         if self.is_split():
             for child in self.children:
-                # Double-check child's bbox
-                child_box = box(
-                    child.bbox.min_x,
-                    child.bbox.min_y,
-                    child.bbox.max_x,
-                    child.bbox.max_y,
+                child._match_many(xs, ys, idx, result, codes, counters)
+            return
+
+        # 3) Leaf: the first polygon (in insertion order) containing a point
+        # wins, so only test the points that are still unmatched.
+        if counters is not None:
+            counters.add_leaf(len(self.polygons), len(idx))
+            tested = np.zeros(len(idx), dtype=bool)
+        pending = np.arange(len(idx))
+        for pid, poly in self.polygons.items():
+            if pid in self.full:
+                result[idx[pending]] = codes[pid]
+                break
+            if self.backend == "numpy":
+                test = self.ring_polygon(pid).contains_xy
+            else:
+                test = partial(contains_xy, poly)
+            hits = test(xs[pending], ys[pending])
+            if counters is not None:
+                counters.contains_tests += len(pending)
+                tested[pending] = True
+            result[idx[pending[hits]]] = codes[pid]
+            pending = pending[~hits]
+            if len(pending) == 0:
+                break
+        if counters is not None:
+            counters.exact_queries += int(tested.sum())
+
+    def ring_polygon(self, id: str) -> RingPolygon:
+        """
+        RingPolygon of a polygon stored on this leaf, built on first use
+        and rebuilt if the stored polygon changed.
+        """
+        poly = self.polygons[id]
+        cached = self.rings.get(id)
+        if cached is None or cached[0] is not poly:
+            cached = (poly, RingPolygon.from_geometry(poly))
+            self.rings[id] = cached
+        return cached[1]
+
+    def freeze(self) -> "FrozenQuadtree":
+        """
+        Compile a finished tree into its array-backed FrozenQuadtree form.
+        """
+        if self.depth != 0:
+            raise QuadtreeError("only the root node of a quadtree can be frozen")
+        return FrozenQuadtree.from_quadtree(self)
+
+    def stats(self) -> dict:
+        """
+        Node count, depth distribution, leaf occupancy and polygon
+        duplication factor of the tree rooted at this node (see tree_stats).
+        """
+        n_nodes, leaf_depths, leaf_sizes = 0, [], []
+        polygon_ids = set()
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            n_nodes += 1
+            if node.children:
+                nodes.extend(node.children)
+            else:
+                leaf_depths.append(node.depth)
+                leaf_sizes.append(len(node.polygons))
+                polygon_ids.update(node.polygons)
+        return tree_stats(
+            n_nodes,
+            len(polygon_ids),
+            np.array(leaf_depths, dtype=np.int64),
+            np.array(leaf_sizes, dtype=np.int64),
+        )
+
+
+class FrozenQuadtree(CountersMixin, ApproximationMixin, PolygonQueryMixin):
+    """
+    Read-only, array-backed form of a finished Quadtree.
+
+    Nodes are stored in breadth-first order, so the 4 children of a node are
+    contiguous and follow the NW, NE, SE, SW order used by Quadtree.subdivide.
+
+        - bounds: float64 array (n_nodes, 4) with min_x, min_y, max_x, max_y
+        - first_child: int32 array with the index of the NW child, -1 for leaves
+        - leaf_start, leaf_end: int32 arrays delimiting the slice of
+          leaf_polygons that belongs to each leaf
+        - leaf_polygons: int32 array of polygon codes (positions in ids)
+        - leaf_geoms: object array, aligned with leaf_polygons, with the
+          geometry tested on each leaf (the polygon, the parts of a
+          multipart polygon near the leaf, or its clipped fragment)
+        - leaf_full: bool array, aligned with leaf_polygons, True when the
+          polygon covers the whole leaf (clipped trees only)
+        - polygons: object array with the shapely polygon of each code
+        - mid_x, mid_y: float64 arrays with the midpoints of each node
+
+    backend selects the engine of match_many as on Quadtree; with "numpy"
+    the RingPolygon of each leaf geometry is built on first use.
+
+    The scalar path (match, match_xy) walks the midpoints through
+    memoryviews and scans the entries of the leaf from plain Python tuples,
+    built on the first scalar query.
+
+    Query counters, approximations and stats work as on Quadtree; the
+    approximations of a Quadtree are kept by freeze.
+    """
+
+    def __init__(
+        self,
+        bounds: np.ndarray,
+        first_child: np.ndarray,
+        leaf_start: np.ndarray,
+        leaf_end: np.ndarray,
+        leaf_polygons: np.ndarray,
+        ids: list[str],
+        polygons: np.ndarray,
+        leaf_geoms: np.ndarray | None = None,
+        leaf_full: np.ndarray | None = None,
+        backend: str = "shapely",
+    ):
+        self.bounds = bounds
+        self.first_child = first_child
+        self.leaf_start = leaf_start
+        self.leaf_end = leaf_end
+        self.leaf_polygons = leaf_polygons
+        self.ids = ids
+        self.codes = {pid: code for code, pid in enumerate(ids)}
+        self.polygons = polygons
+        # Without clipping or multipart polygons, leaves test (references
+        # to) the whole polygons
+        self.clipped = leaf_geoms is not None
+        if leaf_geoms is None:
+            leaf_geoms = polygons[leaf_polygons]
+        if leaf_full is None:
+            leaf_full = np.zeros(len(leaf_polygons), dtype=bool)
+        self.leaf_geoms = leaf_geoms
+        self.leaf_full = leaf_full
+        self.backend = check_backend(backend)
+        self.leaf_rings = [None] * len(leaf_polygons)
+        # Midpoints of every node, computed as in Quadtree.subdivide
+        self.mid_x = (bounds[:, 0] + bounds[:, 2]) / 2.0
+        self.mid_y = (bounds[:, 1] + bounds[:, 3]) / 2.0
+        # Zero-copy views used by the scalar query path
+        self._root_bounds = tuple(bounds[0].tolist())
+        self._first_child = memoryview(first_child)
+        self._mid_x = memoryview(self.mid_x)
+        self._mid_y = memoryview(self.mid_y)
+
+    @classmethod
+    def from_quadtree(cls, quadtree: Quadtree) -> "FrozenQuadtree":
+        polygons = np.empty(len(quadtree.ids), dtype=object)
+        polygons[:] = quadtree.geoms
+        bounds, first_child, leaf_start, leaf_end = [], [], [], []
+        leaf_polygons, leaf_geoms, leaf_full = [], [], []
+
+        nodes = [quadtree]
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            bounds.append(node.bbox)
+            leaf_start.append(len(leaf_polygons))
+            if node.is_split():
+                first_child.append(len(nodes))
+                nodes.extend(node.children)
+            else:
+                first_child.append(-1)
+                for pid, poly in node.polygons.items():
+                    leaf_polygons.append(quadtree.codes[pid])
+                    leaf_geoms.append(poly)
+                    leaf_full.append(pid in node.full)
+            leaf_end.append(len(leaf_polygons))
+            i += 1
+
+        # Leaf geometries are only kept apart when they differ from the
+        # whole polygons: clipped fragments or parts of multipart polygons
+        whole = not quadtree.clip and all(
+            geom is quadtree.geoms[code]
+            for geom, code in zip(leaf_geoms, leaf_polygons)
+        )
+        frozen = cls(
+            np.array(bounds, dtype=np.float64),
+            np.array(first_child, dtype=np.int32),
+            np.array(leaf_start, dtype=np.int32),
+            np.array(leaf_end, dtype=np.int32),
+            np.array(leaf_polygons, dtype=np.int32),
+            list(quadtree.ids),
+            polygons,
+            None if whole else np.array(leaf_geoms, dtype=object),
+            None if whole else np.array(leaf_full, dtype=bool),
+            quadtree.backend,
+        )
+        if quadtree.approximations is not None:
+            frozen.approximations = quadtree.approximations
+            frozen._select_match_xy()
+        return frozen
+
+    def save(self, path, key: str = "") -> None:
+        """
+        Write the index to a .npz file: the node arrays, the polygon ids and
+        the polygons as WKB in a single byte buffer with their offsets (and
+        the leaf geometries that are not the whole polygons the same way,
+        each distinct one once, see pack_leaf_geoms).
+
+        Inputs:
+            - path: output file
+            - key: cache key stored with the index, checked by load
+        """
+        arrays = {}
+        arrays["wkb"], arrays["wkb_offsets"] = pack_wkb(self.polygons)
+        if self.clipped:
+            (
+                arrays["leaf_wkb"],
+                arrays["leaf_wkb_offsets"],
+                arrays["leaf_geom_refs"],
+            ) = pack_leaf_geoms(self.leaf_geoms, self.leaf_polygons, self.polygons)
+            arrays["leaf_full"] = self.leaf_full
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                key=np.array(key),
+                bounds=self.bounds,
+                first_child=self.first_child,
+                leaf_start=self.leaf_start,
+                leaf_end=self.leaf_end,
+                leaf_polygons=self.leaf_polygons,
+                ids=np.array(self.ids, dtype=str),
+                **arrays,
+            )
+
+    @classmethod
+    def load(
+        cls, path, key: str | None = None, backend: str = "shapely"
+    ) -> "FrozenQuadtree":
+        """
+        Read an index written by save, without rebuilding the tree.
+
+        Inputs:
+            - path: .npz file
+            - key: if given, expected cache key. A QuadtreeError is raised
+              when the stored key is different (stale index).
+            - backend: engine of match_many (see BACKENDS)
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if key is not None and str(data["key"]) != key:
+                raise QuadtreeError(f"stale index in {path}")
+            polygons = unpack_wkb(data["wkb"], data["wkb_offsets"])
+            leaf_geoms, leaf_full = None, None
+            if "leaf_wkb" in data:
+                leaf_geoms = unpack_leaf_geoms(
+                    data["leaf_wkb"],
+                    data["leaf_wkb_offsets"],
+                    data["leaf_geom_refs"],
+                    data["leaf_polygons"],
+                    polygons,
                 )
-                if child_box.contains(point):
-                    results.extend(child.match(point))
-        else:
-            # Unsplitted node: check all polygons it holds
-            for pid, poly in self.polygons.items():
-                if poly.contains(point):
-                    results.append(pid)
+                leaf_full = data["leaf_full"]
+            return cls(
+                data["bounds"],
+                data["first_child"],
+                data["leaf_start"],
+                data["leaf_end"],
+                data["leaf_polygons"],
+                data["ids"].tolist(),
+                polygons,
+                leaf_geoms,
+                leaf_full,
+                backend,
+            )
+
+    def __repr__(self) -> str:
+        return f"FrozenQuadtree(nodes={len(self.bounds)}, polygons={len(self.ids)})"
+
+    @property
+    def bbox(self) -> BBox:
+        """
+        Bounding box of the root node.
+        """
+        return BBox(*self._root_bounds)
+
+    @property
+    def geoms(self) -> np.ndarray:
+        """
+        Whole polygon of each code, same as Quadtree.geoms.
+        """
+        return self.polygons
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the node arrays (polygons are not included).
+        """
+        return sum(
+            arr.nbytes
+            for arr in (
+                self.bounds,
+                self.first_child,
+                self.leaf_start,
+                self.leaf_end,
+                self.leaf_polygons,
+                self.leaf_full,
+                self.mid_x,
+                self.mid_y,
+            )
+        )
+
+    def match(self, point: Point, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match, over the node arrays.
+        """
+        return self.match_xy(point.x, point.y, first)
+
+    def match_xy(self, x: float, y: float, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match_xy, over the node arrays.
+        """
+        return self._descend_xy(x, y, first)
+
+    def _descend_xy(
+        self,
+        x: float,
+        y: float,
+        first: bool = False,
+        counters: QueryCounters | None = None,
+        approximations: list | None = None,
+    ) -> list[str]:
+        """
+        Same as Quadtree._descend_xy. Each midpoint comparison counts as a
+        bbox test.
+        """
+        if counters is not None:
+            counters.queries += 1
+            counters.nodes_visited += 1
+            counters.bbox_tests += 1
+        results = []
+        # Python floats compare much faster than numpy scalars
+        x, y = float(x), float(y)
+        min_x, min_y, max_x, max_y = self._root_bounds
+        if not (min_x < x < max_x and min_y < y < max_y):
+            return results
+
+        # Walk down the tree: the child holding the point is found from the
+        # midpoints of the node, points on a midpoint belong to no child.
+        # Memoryviews give plain Python scalars without any copy of the arrays.
+        first_child, mid_x, mid_y = self._first_child, self._mid_x, self._mid_y
+        node = 0
+        child = first_child[0]
+        while child >= 0:
+            if counters is not None:
+                counters.bbox_tests += 1
+            mx = mid_x[node]
+            my = mid_y[node]
+            if x == mx or y == my:
+                return results
+            if y > my:
+                node = child if x < mx else child + 1
+            else:
+                node = child + 2 if x > mx else child + 3
+            if counters is not None:
+                counters.nodes_visited += 1
+            child = first_child[node]
+
+        entries = self._leaf_entries[node]
+        if counters is not None:
+            counters.add_leaf(len(entries))
+        exact = False
+        for code, geom, full in entries:
+            if not full:
+                state = None
+                if approximations is not None:
+                    state = approximations[code].classify_xy(x, y)
+                if state == OUTSIDE:
+                    if counters is not None:
+                        counters.outer_rejects += 1
+                    continue
+                if state == INSIDE:
+                    if counters is not None:
+                        counters.inner_hits += 1
+                else:
+                    exact = True
+                    if counters is not None:
+                        counters.contains_tests += 1
+                    if not contains_xy(geom, x, y):
+                        continue
+            results.append(self.ids[code])
+            if first:
+                break
+
+        if counters is not None:
+            counters.exact_queries += exact
+        return results
+
+    @cached_property
+    def _leaf_entries(self) -> list[tuple]:
+        """
+        (code, geometry, full) of the entries of each node (empty for the
+        split ones), as plain Python tuples: the scalar path scans them
+        without indexing any array.
+        """
+        entries = list(
+            zip(
+                self.leaf_polygons.tolist(),
+                list(self.leaf_geoms),
+                self.leaf_full.tolist(),
+            )
+        )
+        return [
+            tuple(entries[start:end])
+            for start, end in zip(self.leaf_start.tolist(), self.leaf_end.tolist())
+        ]
+
+    def node_depths(self) -> np.ndarray:
+        """
+        int64 array with the depth of each node (the root is depth 0).
+        """
+        depths = np.zeros(len(self.bounds), dtype=np.int64)
+        # Breadth-first order: every parent comes before its children
+        for node in np.flatnonzero(self.first_child >= 0):
+            child = self.first_child[node]
+            depths[child : child + 4] = depths[node] + 1
+        return depths
+
+    def stats(self) -> dict:
+        """
+        Same as Quadtree.stats, from the node arrays.
+        """
+        leaves = np.flatnonzero(self.first_child < 0)
+        return tree_stats(
+            len(self.bounds),
+            len(np.unique(self.leaf_polygons)),
+            self.node_depths()[leaves],
+            (self.leaf_end[leaves] - self.leaf_start[leaves]).astype(np.int64),
+        )
+
+    def candidates(self, bounds: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Same as Quadtree.candidates, walking the node arrays one level at a
+        time.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        nodes = np.zeros(1, dtype=np.int64)
+        leaves = []
+        while len(nodes):
+            node_bounds = self.bounds[nodes]
+            nodes = nodes[
+                (node_bounds[:, 0] <= max_x)
+                & (node_bounds[:, 2] >= min_x)
+                & (node_bounds[:, 1] <= max_y)
+                & (node_bounds[:, 3] >= min_y)
+            ]
+            child = self.first_child[nodes]
+            leaves.extend(nodes[child < 0].tolist())
+            nodes = (child[child >= 0][:, None] + np.arange(4)).ravel()
+        if not leaves:
+            return np.empty(0, dtype=np.int64)
+        codes = np.concatenate(
+            [
+                self.leaf_polygons[self.leaf_start[leaf] : self.leaf_end[leaf]]
+                for leaf in leaves
+            ]
+        )
+        return np.unique(codes).astype(np.int64)
+
+    def leaf_contains(self, i: int, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Vectorized contains test of the leaf geometry i (a position in
+        leaf_polygons) with the selected backend.
+        """
+        if self.backend == "numpy":
+            rings = self.leaf_rings[i]
+            if rings is None:
+                rings = self.leaf_rings[i] = RingPolygon.from_geometry(
+                    self.leaf_geoms[i]
+                )
+            return rings.contains_xy(xs, ys)
+        return contains_xy(self.leaf_geoms[i], xs, ys)
+
+    def locate_leaves(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Vectorized traversal of the tree.
+
+        Returns:
+            An int64 array with the leaf node holding each point, or -1 for
+            points outside the tree (or on the edge of a node).
+        """
+        min_x, min_y, max_x, max_y = self._root_bounds
+        inside = (xs > min_x) & (xs < max_x) & (ys > min_y) & (ys < max_y)
+        leaves = np.where(inside, 0, -1)
+        active = np.flatnonzero(inside)
+        node = np.zeros(len(active), dtype=np.int64)
+
+        # One level per iteration, for all the points that are not on a leaf
+        while len(active):
+            child = self.first_child[node]
+            split = child >= 0
+            if not split.all():
+                active, node, child = active[split], node[split], child[split]
+                if len(active) == 0:
+                    break
+
+            x, y = xs[active], ys[active]
+            mx, my = self.mid_x[node], self.mid_y[node]
+            east = x > mx
+            south = y < my
+            # NW=0, NE=1, SE=2, SW=3
+            node = child + 2 * south + (east ^ south)
+
+            on_edge = (x == mx) | (y == my)
+            if on_edge.any():
+                leaves[active[on_edge]] = -1
+                active, node = active[~on_edge], node[~on_edge]
+            leaves[active] = node
+
+        return leaves
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Same as Quadtree.match_many, with the traversal done level by level
+        over the node arrays and the contains tests grouped by leaf.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise QuadtreeError("xs and ys must be 1-D arrays of the same length")
+
+        result = np.full(len(xs), -1, dtype=np.int64)
+        leaves = self.locate_leaves(xs, ys)
+
+        # Group the points by leaf
+        located = np.flatnonzero(leaves >= 0)
+        located = located[np.argsort(leaves[located])]
+        counts = np.bincount(leaves[located], minlength=len(self.bounds))
+        ends = np.cumsum(counts)
+
+        counters = self.counters
+        if counters is not None:
+            # Points on an edge are counted as stopping at the root
+            depths = self.node_depths()[leaves[located]]
+            counters.queries += len(xs)
+            counters.nodes_visited += len(xs) + int(depths.sum())
+            counters.bbox_tests += len(xs) + int(depths.sum())
+
+        if counters is not None:
+            tested = np.zeros(len(xs), dtype=bool)
+        for leaf in np.flatnonzero(counts):
+            pending = located[ends[leaf] - counts[leaf] : ends[leaf]]
+            if counters is not None:
+                counters.add_leaf(
+                    int(self.leaf_end[leaf] - self.leaf_start[leaf]), len(pending)
+                )
+            for i in range(self.leaf_start[leaf], self.leaf_end[leaf]):
+                code = self.leaf_polygons[i]
+                if self.leaf_full[i]:
+                    result[pending] = code
+                    break
+                hits = self.leaf_contains(i, xs[pending], ys[pending])
+                if counters is not None:
+                    counters.contains_tests += len(pending)
+                    tested[pending] = True
+                result[pending[hits]] = code
+                pending = pending[~hits]
+                if len(pending) == 0:
+                    break
+        if counters is not None:
+            counters.exact_queries += int(tested.sum())
+        return result
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """
+    Insert a 0 bit between each of the lower 32 bits of uint64 values.
+    """
+    values = values & 0xFFFFFFFF
+    values = (values | (values << 16)) & 0x0000FFFF0000FFFF
+    values = (values | (values << 8)) & 0x00FF00FF00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F0F0F0F0F
+    values = (values | (values << 2)) & 0x3333333333333333
+    values = (values | (values << 1)) & 0x5555555555555555
+    return values
+
+
+def morton_codes(
+    xs: np.ndarray, ys: np.ndarray, bbox: BBox, bits: int = 16
+) -> np.ndarray:
+    """
+    Morton (Z-order) code of each point: the bits of its cell column and
+    row on a 2**bits x 2**bits grid over bbox, interleaved. Points close in
+    the code are close in space. Points outside bbox (or missing) are
+    clamped to its border cells.
+
+    Returns:
+        A uint64 array with one code per point
+    """
+    if not 1 <= bits <= 32:
+        raise QuadtreeError("bits must be between 1 and 32")
+    cells = 2**bits
+    min_x, min_y, max_x, max_y = bbox
+    xs = np.nan_to_num(np.asarray(xs, dtype=np.float64), nan=min_x)
+    ys = np.nan_to_num(np.asarray(ys, dtype=np.float64), nan=min_y)
+    cols = np.clip((xs - min_x) / ((max_x - min_x) or 1.0) * cells, 0, cells - 1)
+    rows = np.clip((ys - min_y) / ((max_y - min_y) or 1.0) * cells, 0, cells - 1)
+    return spread_bits(cols.astype(np.uint64)) | (
+        spread_bits(rows.astype(np.uint64)) << np.uint64(1)
+    )
+
+
+def morton_order(xs: np.ndarray, ys: np.ndarray, bbox: BBox) -> np.ndarray:
+    """
+    Permutation that sorts the points by Morton code over bbox, so that
+    consecutive points fall in the same quadtree leaves. result[order] =
+    values restores the original order of values computed on the sorted
+    points.
+    """
+    return np.argsort(morton_codes(xs, ys, bbox), kind="stable")
+
+
+def str_order(bounds: np.ndarray, capacity: int) -> np.ndarray:
+    """
+    Sort-Tile-Recursive order of a set of bounding boxes.
+
+    The boxes are sorted by the x of their center and cut into vertical
+    slices of about sqrt(n / capacity) nodes each; every slice is then
+    sorted by the y of the center. Consecutive runs of capacity boxes in the
+    returned order make the nodes of the next level.
+
+    Returns:
+        An int64 array with the permutation of the boxes.
+    """
+    n = len(bounds)
+    center_x = (bounds[:, 0] + bounds[:, 2]) / 2.0
+    center_y = (bounds[:, 1] + bounds[:, 3]) / 2.0
+    n_slices = int(np.ceil(np.sqrt(np.ceil(n / capacity))))
+    per_slice = n_slices * capacity
+
+    by_x = np.argsort(center_x, kind="stable")
+    order = [
+        chunk[np.argsort(center_y[chunk], kind="stable")]
+        for chunk in (
+            by_x[start : start + per_slice] for start in range(0, n, per_slice)
+        )
+    ]
+    return np.concatenate(order) if order else by_x
+
+
+class RTree:
+    """
+    Static R-tree bulk loaded with Sort-Tile-Recursive packing, with the same
+    query interface as Quadtree (match, match_xy, match_many).
+
+    All the polygons are known when the tree is built, so every node but the
+    last of each level is full and all the leaves are at the same depth.
+    The tree is stored level by level, from the root to the leaves:
+
+        - levels: list of (bounds, child_start, child_end) arrays, where the
+          children of a node are a contiguous range of the next level (of
+          the entries, for the last level)
+        - entry_bounds: bounds of each polygon
+
+    Bounds are float64 arrays (4, n) with rows min_x, min_y, max_x, max_y, so
+    batched queries gather each coordinate from a contiguous row.
+        - entry_codes: int64 array with the code (position in ids) of each
+          entry
+
+    Unlike Quadtree, points on the midlines of the nodes are not left out,
+    since the nodes are the bounding boxes of their polygons.
+    """
+
+    def __init__(self, capacity: int = 8):
+        if capacity < 2:
+            raise QuadtreeError("an R-tree node must hold at least 2 children")
+        self.capacity = capacity
+        self.ids = []
+        self.codes = {}
+        self.geoms = np.empty(0, dtype=object)
+        self.levels = []
+        self.entry_bounds = np.empty((4, 0), dtype=np.float64)
+        self.entry_codes = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def bulk_load(
+        cls, ids: list[str], polygons: list[Polygon], capacity: int = 8
+    ) -> "RTree":
+        """
+        Build the tree for all the polygons at once.
 
+        Inputs:
+            - ids: id of each polygon
+            - polygons: polygons to index
+            - capacity: maximum number of children of a node
+        """
+        rtree = cls(capacity)
+        for pid in ids:
+            if pid not in rtree.codes:
+                rtree.codes[pid] = len(rtree.ids)
+                rtree.ids.append(pid)
+        geoms = np.empty(len(rtree.ids), dtype=object)
+        for pid, polygon in zip(ids, polygons):
+            if geoms[rtree.codes[pid]] is None:
+                geoms[rtree.codes[pid]] = polygon
+        prepare(geoms)
+        rtree.geoms = geoms
+        if len(geoms) == 0:
+            return rtree
+
+        bounds = np.array([geom.bounds for geom in geoms], dtype=np.float64)
+        order, child_start, child_end, node_bounds = rtree._pack(bounds)
+        rtree.entry_codes = order
+        rtree.entry_bounds = np.ascontiguousarray(bounds[order].T)
+        levels = [(node_bounds, child_start, child_end)]
+
+        # Pack each level into the one above it, until there is a single root
+        while len(levels[0][0]) > 1:
+            bounds, starts, ends = levels[0]
+            order, child_start, child_end, node_bounds = rtree._pack(bounds)
+            levels[0] = (bounds[order], starts[order], ends[order])
+            levels.insert(0, (node_bounds, child_start, child_end))
+
+        rtree.levels = [
+            (np.ascontiguousarray(bounds.T), starts, ends)
+            for bounds, starts, ends in levels
+        ]
+        rtree._levels = [
+            (memoryview(bounds), memoryview(starts), memoryview(ends))
+            for bounds, starts, ends in rtree.levels
+        ]
+        return rtree
+
+    def _pack(self, bounds: np.ndarray):
+        """
+        Group the boxes of one level into nodes of the level above.
+
+        Returns:
+            The STR order of the boxes, the child ranges of the new nodes
+            (over the reordered boxes) and the bounds of the new nodes.
+        """
+        order = str_order(bounds, self.capacity)
+        ordered = bounds[order]
+        child_start = np.arange(0, len(bounds), self.capacity, dtype=np.int64)
+        child_end = np.minimum(child_start + self.capacity, len(bounds))
+        node_bounds = np.column_stack(
+            [
+                np.minimum.reduceat(ordered[:, 0], child_start),
+                np.minimum.reduceat(ordered[:, 1], child_start),
+                np.maximum.reduceat(ordered[:, 2], child_start),
+                np.maximum.reduceat(ordered[:, 3], child_start),
+            ]
+        )
+        return order, child_start, child_end, node_bounds
+
+    def __repr__(self) -> str:
+        return f"RTree(depth={len(self.levels)}, polygons={len(self.ids)})"
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the node arrays (polygons are not included).
+        """
+        return (
+            self.entry_bounds.nbytes
+            + self.entry_codes.nbytes
+            + sum(arr.nbytes for level in self.levels for arr in level)
+        )
+
+    def match(self, point: Point, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match.
+        """
+        return self.match_xy(point.x, point.y, first)
+
+    def match_xy(self, x: float, y: float, first: bool = False) -> list[str]:
+        """
+        Same as Quadtree.match_xy: ids of the polygons that contain the
+        point, in insertion order.
+        """
+        if not self.levels:
+            return []
+
+        # Walk down the tree, one level at a time, keeping the nodes whose
+        # bounding box contains the point
+        nodes = [0]
+        for bounds, starts, ends in self._levels:
+            children = []
+            for node in nodes:
+                if (
+                    bounds[0, node] <= x <= bounds[2, node]
+                    and bounds[1, node] <= y <= bounds[3, node]
+                ):
+                    children.extend(range(starts[node], ends[node]))
+            nodes = children
+
+        entry_bounds, entry_codes = self.entry_bounds, self.entry_codes
+        candidates = sorted(
+            entry_codes[entry]
+            for entry in nodes
+            if entry_bounds[0, entry] <= x <= entry_bounds[2, entry]
+            and entry_bounds[1, entry] <= y <= entry_bounds[3, entry]
+        )
+
+        results = []
+        for code in candidates:
+            if contains_xy(self.geoms[code], x, y):
+                results.append(self.ids[code])
+                if first:
+                    break
         return results
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Same as Quadtree.match_many. Every level is processed at once for all
+        the (point, node) pairs whose bounding boxes still overlap.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.shape != ys.shape or xs.ndim != 1:
+            raise QuadtreeError("xs and ys must be 1-D arrays of the same length")
+
+        result = np.full(len(xs), -1, dtype=np.int64)
+        if not self.levels:
+            return result
+
+        points = np.arange(len(xs))
+        nodes = np.zeros(len(xs), dtype=np.int64)
+        for bounds, starts, ends in self.levels:
+            points, nodes = self._filter_pairs(xs, ys, points, nodes, bounds)
+            # expand each (point, node) pair into its (point, child) pairs
+            counts = ends[nodes] - starts[nodes]
+            offsets = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            points = np.repeat(points, counts)
+            nodes = np.repeat(starts[nodes], counts) + offsets
+        points, entries = self._filter_pairs(xs, ys, points, nodes, self.entry_bounds)
+
+        # Test each polygon once against its candidate points, in insertion
+        # order, skipping the points already matched by a previous polygon
+        codes = self.entry_codes[entries]
+        order = np.argsort(codes, kind="stable")
+        points, codes = points[order], codes[order]
+        unique_codes, starts = np.unique(codes, return_index=True)
+        ends = np.append(starts[1:], len(codes))
+        for code, start, end in zip(unique_codes, starts, ends):
+            candidates = points[start:end]
+            candidates = candidates[result[candidates] < 0]
+            hits = contains_xy(self.geoms[code], xs[candidates], ys[candidates])
+            result[candidates[hits]] = code
+        return result
+
+    @staticmethod
+    def _filter_pairs(xs, ys, points, nodes, bounds):
+        """
+        Keep the (point, node) pairs where the node's box contains the point.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        x, y = xs[points], ys[points]
+        keep = (
+            (x >= min_x[nodes])
+            & (x <= max_x[nodes])
+            & (y >= min_y[nodes])
+            & (y <= max_y[nodes])
+        )
+        return points[keep], nodes[keep]
@@ -0,0 +1,221 @@
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from .merge_shp import (
+    DIVISION_LAYERS as LAYERS,
+)
+from .merge_shp import (
+    QUADTREE_CONFIG_PATH,
+    Neighborhood,
+    Puma,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_division,
+)
+from .multi_layer import MultiLayerIndex
+
+# The MultiLayerIndex over all the LAYERS is tuned as one more target (read
+# by merge_shp.load_multi_layer_index)
+MULTI_LAYER = "multi_layer"
+TARGETS = (*LAYERS, MULTI_LAYER)
+
+CAPACITIES = (1, 2, 3, 5, 8, 12, 20)
+MAX_DEPTHS = (4, 6, 8, 10, 12)
+
+
+class TuningResult(NamedTuple):
+    capacity: int
+    max_depth: int
+    build_seconds: float
+    memory_bytes: int
+    nodes: int
+    avg_leaf_candidates: float
+    points_per_second: float
+
+
+def load_layer(
+    layer: str,
+) -> list[Puma | Neighborhood] | dict[str, list[Puma | Neighborhood]]:
+    """
+    Load the Pumas or Neighborhoods of one of the TARGETS: a list for one of
+    the LAYERS, and layer name -> list for MULTI_LAYER.
+    """
+    if layer == MULTI_LAYER:
+        return {name: load_division(*LAYERS[name]) for name in LAYERS}
+    return load_division(*LAYERS[layer])
+
+
+def all_divisions(
+    division: list[Puma | Neighborhood] | dict[str, list[Puma | Neighborhood]],
+) -> list[Puma | Neighborhood]:
+    """
+    Pumas and Neighborhoods of a target, as one list.
+    """
+    if isinstance(division, dict):
+        return [div for layer in division.values() for div in layer]
+    return division
+
+
+def evaluate_config(
+    division: list[Puma | Neighborhood] | dict[str, list[Puma | Neighborhood]],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    capacity: int,
+    max_depth: int,
+) -> TuningResult:
+    """
+    Build a quadtree with the given capacity and max_depth and measure it.
+
+    Inputs:
+        - division: polygons of the layer, or layer name -> polygons for a
+          MultiLayerIndex
+        - xs, ys: sample of query points
+        - capacity, max_depth: configuration of the quadtree
+
+    Returns:
+        A TuningResult with the build time, the peak Python memory of the
+        build (traced on a separate build), the number of nodes, the average
+        number of polygons held by the leaf of each query point and the
+        batched query throughput of the frozen tree (the one load_quadtree
+        returns).
+    """
+
+    def build():
+        if isinstance(division, dict):
+            return MultiLayerIndex.build_quadtree(
+                division, capacity, max_depth=max_depth
+            )
+        chi_bbox = gen_chi_bbox(division)
+        return gen_quadtree(division, chi_bbox, capacity, max_depth=max_depth)
+
+    # tracemalloc slows down every allocation: the memory is measured on
+    # one build and the time on another one
+    tracemalloc.start()
+    build()
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    quadtree = build()
+    build_seconds = time.perf_counter() - start
+
+    frozen = quadtree.freeze()
+    matcher = MultiLayerIndex(frozen) if isinstance(division, dict) else frozen
+    leaves = frozen.locate_leaves(xs, ys)
+    leaves = leaves[leaves >= 0]
+    candidates = frozen.leaf_end[leaves] - frozen.leaf_start[leaves]
+
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        matcher.match_many(xs, ys)
+        best = min(best, time.perf_counter() - start)
+
+    return TuningResult(
+        capacity=capacity,
+        max_depth=max_depth,
+        build_seconds=build_seconds,
+        memory_bytes=memory,
+        nodes=len(frozen.bounds),
+        avg_leaf_candidates=float(candidates.mean()) if len(candidates) else 0.0,
+        points_per_second=len(xs) / best,
+    )
+
+
+def tune_layer(
+    division: list[Puma | Neighborhood] | dict[str, list[Puma | Neighborhood]],
+    xs: np.ndarray | None = None,
+    ys: np.ndarray | None = None,
+    capacities: tuple[int] = CAPACITIES,
+    max_depths: tuple[int] = MAX_DEPTHS,
+    n_points: int = 50000,
+) -> list[TuningResult]:
+    """
+    Evaluate every capacity/max_depth pair for a layer (or for the
+    MultiLayerIndex over several layers).
+
+    If no query points are given, n_points random points over the bbox of
+    the layer are used.
+
+    Returns:
+        The results sorted from best to worst: highest throughput first,
+        ties broken by lower memory.
+    """
+    if xs is None or ys is None:
+        chi_bbox = gen_chi_bbox(all_divisions(division))
+        rng = np.random.default_rng(30122)
+        xs = rng.uniform(chi_bbox.min_x, chi_bbox.max_x, n_points)
+        ys = rng.uniform(chi_bbox.min_y, chi_bbox.max_y, n_points)
+
+    results = [
+        evaluate_config(division, xs, ys, capacity, max_depth)
+        for capacity in capacities
+        for max_depth in max_depths
+    ]
+    return sorted(results, key=lambda r: (-r.points_per_second, r.memory_bytes))
+
+
+def save_best_config(
+    best: dict[str, TuningResult], path: Path = QUADTREE_CONFIG_PATH
+) -> None:
+    """
+    Write the best capacity/max_depth of each layer to a JSON file, read by
+    merge_shp.load_quadtree. Layers already in the file are kept.
+    """
+    config = {}
+    if path.exists():
+        with open(path) as f:
+            config = json.load(f)
+    for layer, result in best.items():
+        config[layer] = {"capacity": result.capacity, "max_depth": result.max_depth}
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Tune the capacity and max_depth of the quadtree of each layer "
+            "and of the multi-layer index."
+        )
+    )
+    parser.add_argument(
+        "--layers", nargs="+", choices=list(TARGETS), default=list(TARGETS)
+    )
+    parser.add_argument("-n", type=int, default=50000, help="number of query points")
+    parser.add_argument(
+        "--persist",
+        help=f"Save the best configuration of each layer in {QUADTREE_CONFIG_PATH}",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    best = {}
+    for layer in args.layers:
+        results = tune_layer(load_layer(layer), n_points=args.n)
+        best[layer] = results[0]
+        print(f"== {layer}")
+        print(
+            "capacity max_depth  build(ms)  memory(KiB)  nodes  "
+            "leaf candidates  points/s"
+        )
+        for r in results:
+            print(
+                f"{r.capacity:8d} {r.max_depth:9d} {r.build_seconds * 1e3:10.1f} "
+                f"{r.memory_bytes / 1024:12.1f} {r.nodes:6d} "
+                f"{r.avg_leaf_candidates:16.2f} {r.points_per_second:9,.0f}"
+            )
+        print(f"best: capacity={results[0].capacity} max_depth={results[0].max_depth}")
+
+    if args.persist:
+        save_best_config(best)
+        print(f"Saved to {QUADTREE_CONFIG_PATH}")
+
+
+if __name__ == "__main__":
+    main()
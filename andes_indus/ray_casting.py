@@ -0,0 +1,179 @@
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+# Average number of edges per horizontal band of a RingPolygon
+EDGES_PER_BAND = 4
+
+# Maximum number of (point, edge) pairs tested at once
+MAX_PAIRS = 1 << 20
+
+
+def flatten_rings(geom: Polygon | MultiPolygon) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Flat coordinate arrays of every ring (exteriors and holes) of the
+    polygonal parts of a geometry. Parts that are not polygons (e.g. lines
+    in the GeometryCollection of a clipped fragment) are dropped.
+
+    Returns:
+        A float64 array (n_vertices, 2) with the closed rings one after the
+        other, and an int64 array with the n_rings + 1 offsets of each ring.
+    """
+    parts = shapely.get_parts(geom)
+    parts = parts[shapely.get_type_id(parts) == 3]
+    rings = shapely.get_rings(parts)
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum(shapely.get_num_coordinates(rings), out=offsets[1:])
+    return shapely.get_coordinates(rings), offsets
+
+
+class RingPolygon:
+    """
+    Polygon stored as the edges of its rings, tested with the crossing
+    number (even-odd) rule: a point is inside if a ray cast from it towards
+    +x crosses the rings an odd number of times. Holes and the parts of a
+    MultiPolygon need no special handling.
+
+    Edges are bucketed in n_bands horizontal bands over the bbox, so each
+    point is only tested against the edges of its band:
+
+        - x0, y0: float64 arrays with the first vertex of each edge
+        - slope: float64 array with dx/dy of each edge (0 for horizontal
+          edges, which are never crossed)
+        - y1: float64 array with the y of the last vertex of each edge
+        - band_start, band_edges: CSR arrays, the edges of band b are
+          band_edges[band_start[b] : band_start[b + 1]]
+
+    Points on the boundary are not guaranteed to give the same answer as
+    shapely (contains_xy is False there).
+    """
+
+    def __init__(self, coords: np.ndarray, ring_offsets: np.ndarray):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        # An edge goes from each vertex to the next one of the same ring
+        starts = np.ones(len(coords), dtype=bool)
+        starts[ring_offsets[1:] - 1] = False
+        first = np.flatnonzero(starts)
+        self.x0, self.y0 = coords[first, 0], coords[first, 1]
+        x1, self.y1 = coords[first + 1, 0], coords[first + 1, 1]
+        dy = self.y1 - self.y0
+        self.slope = np.divide(x1 - self.x0, dy, out=np.zeros(len(dy)), where=dy != 0)
+
+        if len(coords):
+            self.bounds = (*coords.min(axis=0).tolist(), *coords.max(axis=0).tolist())
+        else:
+            self.bounds = (np.inf, np.inf, -np.inf, -np.inf)
+        self.n_bands = max(1, len(self.x0) // EDGES_PER_BAND)
+        low = self._bands(np.minimum(self.y0, self.y1))
+        high = self._bands(np.maximum(self.y0, self.y1))
+        # Every edge is listed in each band its y-range overlaps
+        spans = high - low + 1
+        edges = np.repeat(np.arange(len(self.x0)), spans)
+        bands = np.repeat(low, spans) + (
+            np.arange(len(edges)) - np.repeat(np.cumsum(spans) - spans, spans)
+        )
+        order = np.argsort(bands, kind="stable")
+        self.band_edges = edges[order]
+        self.band_start = np.zeros(self.n_bands + 1, dtype=np.int64)
+        np.cumsum(np.bincount(bands, minlength=self.n_bands), out=self.band_start[1:])
+
+    @classmethod
+    def from_geometry(cls, geom: Polygon | MultiPolygon) -> "RingPolygon":
+        return cls(*flatten_rings(geom))
+
+    @classmethod
+    def from_arrays(
+        cls,
+        x0: np.ndarray,
+        y0: np.ndarray,
+        y1: np.ndarray,
+        slope: np.ndarray,
+        bounds: tuple[float, float, float, float],
+        band_start: np.ndarray,
+        band_edges: np.ndarray,
+    ) -> "RingPolygon":
+        """
+        RingPolygon over arrays computed by another one (e.g. views of a
+        shared memory block), without copying them.
+        """
+        rings = cls.__new__(cls)
+        rings.x0, rings.y0, rings.y1, rings.slope = x0, y0, y1, slope
+        rings.bounds = tuple(bounds)
+        rings.band_start, rings.band_edges = band_start, band_edges
+        rings.n_bands = len(band_start) - 1
+        return rings
+
+    def __repr__(self) -> str:
+        return f"RingPolygon(edges={len(self.x0)}, bands={self.n_bands})"
+
+    def _bands(self, ys: np.ndarray) -> np.ndarray:
+        """
+        Band of each y coordinate, clipped to the valid range.
+        """
+        min_y, max_y = self.bounds[1], self.bounds[3]
+        height = (max_y - min_y) / self.n_bands or 1.0
+        bands = np.floor((ys - min_y) / height).astype(np.int64)
+        return np.clip(bands, 0, self.n_bands - 1)
+
+    def contains_xy(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Vectorized point-in-polygon test.
+
+        Every point inside the bbox is paired with the edges of its band
+        and the crossings are counted per point; the pairs are processed in
+        chunks of at most MAX_PAIRS.
+
+        Returns:
+            A bool array, True for the points inside the polygon
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        result = np.zeros(len(xs), dtype=bool)
+        min_x, min_y, max_x, max_y = self.bounds
+        points = np.flatnonzero(
+            (xs > min_x) & (xs < max_x) & (ys > min_y) & (ys < max_y)
+        )
+        if len(points) == 0:
+            return result
+
+        bands = self._bands(ys[points])
+        starts = self.band_start[bands]
+        counts = self.band_start[bands + 1] - starts
+        ends = np.cumsum(counts)
+
+        chunk_start = 0
+        while chunk_start < len(points):
+            # Largest run of points whose pairs fit in MAX_PAIRS (at least one)
+            offset = ends[chunk_start] - counts[chunk_start]
+            chunk_end = max(
+                chunk_start + 1,
+                int(np.searchsorted(ends, offset + MAX_PAIRS, side="right")),
+            )
+            chunk = slice(chunk_start, chunk_end)
+            pair_counts = counts[chunk]
+            n_pairs = int(pair_counts.sum())
+            if n_pairs:
+                pair_point = np.repeat(np.arange(chunk_end - chunk_start), pair_counts)
+                pair_edge = self.band_edges[
+                    np.repeat(starts[chunk] - (ends[chunk] - pair_counts), pair_counts)
+                    + np.arange(offset, offset + n_pairs)
+                ]
+                px = xs[points[chunk]][pair_point]
+                py = ys[points[chunk]][pair_point]
+                y0 = self.y0[pair_edge]
+                crosses = (y0 > py) != (self.y1[pair_edge] > py)
+                crosses &= px < self.x0[pair_edge] + (py - y0) * self.slope[pair_edge]
+                parity = np.bincount(
+                    pair_point[crosses], minlength=chunk_end - chunk_start
+                )
+                result[points[chunk]] = parity & 1 == 1
+            chunk_start = chunk_end
+        return result
+
+
+def contains_xy(geom: RingPolygon, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Same signature as shapely.contains_xy, for a RingPolygon.
+    """
+    return geom.contains_xy(xs, ys)
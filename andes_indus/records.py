@@ -0,0 +1,157 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class RecordTable:
+    """
+    Columnar (struct-of-arrays) table of Crime or School records: one typed
+    array per field instead of one tuple per record.
+
+        - columns: field name -> column, with the type given by the schema
+          of the records (see as_column)
+
+    Slices (table[start:stop]) and by_year on a table sorted by year are
+    views of the columns, and to_frame builds a pd.DataFrame over the same
+    arrays without copying them.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray | pd.Categorical]):
+        if len({len(column) for column in columns.values()}) > 1:
+            raise ValueError("every column must have the same length")
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, schema: dict[str, str]) -> "RecordTable":
+        """
+        Table with the columns of schema (field name -> type) taken from a
+        pd.DataFrame. Fields missing in data are all null.
+        """
+        columns = {}
+        for field, dtype in schema.items():
+            if field in data.columns:
+                values = data[field]
+            else:
+                values = pd.Series(None, index=data.index, dtype=object)
+            columns[field] = as_column(values, dtype)
+        return cls(columns)
+
+    @classmethod
+    def from_records(
+        cls, records: list[NamedTuple], schema: dict[str, str]
+    ) -> "RecordTable":
+        """
+        Table from a list of Crime or School objects.
+        """
+        return cls.from_frame(pd.DataFrame(records, columns=list(schema)), schema)
+
+    @classmethod
+    def concat(cls, tables: list["RecordTable"]) -> "RecordTable":
+        """
+        The rows of several tables with the same fields, one after the other.
+        """
+        columns = {}
+        for field, column in tables[0].columns.items():
+            parts = [table.columns[field] for table in tables]
+            if isinstance(column, pd.Categorical):
+                columns[field] = pd.api.types.union_categoricals(parts)
+            else:
+                columns[field] = np.concatenate(parts)
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def __repr__(self) -> str:
+        return f"RecordTable(rows={len(self)}, fields={list(self.columns)})"
+
+    def __getitem__(
+        self, key: str | slice
+    ) -> "np.ndarray | pd.Categorical | RecordTable":
+        """
+        A column by name, or the table of a slice of rows (a view).
+        """
+        if isinstance(key, str):
+            return self.columns[key]
+        return RecordTable(
+            {field: column[key] for field, column in self.columns.items()}
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory of the columns, including the strings of object columns.
+        """
+        return int(self.to_frame().memory_usage(deep=True, index=False).sum())
+
+    def take(self, positions: np.ndarray) -> "RecordTable":
+        """
+        Table with the rows at positions (a copy).
+        """
+        return RecordTable(
+            {field: column[positions] for field, column in self.columns.items()}
+        )
+
+    def with_column(self, field: str, values) -> "RecordTable":
+        """
+        Same table (sharing the other columns) with field set to values.
+        """
+        if len(values) != len(self):
+            raise ValueError("values must have one entry per row")
+        return RecordTable({**self.columns, field: values})
+
+    def sort_by_year(self) -> "RecordTable":
+        """
+        Table with the rows sorted by year, keeping the order of the rows of
+        each year.
+        """
+        year = self.columns["year"]
+        if np.all(year[:-1] <= year[1:]):
+            return self
+        return self.take(np.argsort(year, kind="stable"))
+
+    def by_year(self, year: int) -> "RecordTable":
+        """
+        The rows of a year: a view if the table is sorted by year (see
+        sort_by_year), a copy otherwise.
+        """
+        years = self.columns["year"]
+        if np.all(years[:-1] <= years[1:]):
+            start, stop = np.searchsorted(years, [year, year + 1])
+            return self[start:stop]
+        return self.take(np.flatnonzero(years == year))
+
+    def split_years(self) -> dict[int, "RecordTable"]:
+        """
+        Table of each year, views of the table sorted by year.
+        """
+        table = self.sort_by_year()
+        return {
+            int(year): table.by_year(year) for year in np.unique(table.columns["year"])
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        pd.DataFrame over the columns of the table, without copying them.
+        """
+        return pd.DataFrame(self.columns, copy=False)
+
+
+def as_column(values: pd.Series, dtype: str) -> np.ndarray | pd.Categorical:
+    """
+    Column of a RecordTable from the values of a field:
+
+        - "float64": numbers, NaN for missing or non numeric values (e.g. "")
+        - "int16", "int32", ...: integers, no missing values
+        - "category": pd.Categorical, for fields with few distinct values
+          (crime types, division ids); missing values are null
+        - "object": the values unchanged
+    """
+    if dtype == "category":
+        return pd.Categorical(values.to_numpy(dtype=object))
+    if dtype == "object":
+        return values.to_numpy(dtype=object)
+    if dtype == "float64":
+        return pd.to_numeric(values, errors="coerce").to_numpy(np.float64)
+    return pd.to_numeric(values).to_numpy(dtype)
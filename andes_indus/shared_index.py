@@ -0,0 +1,332 @@
+import functools
+import os
+from multiprocessing import shared_memory
+from typing import NamedTuple, Self
+
+import numpy as np
+from shapely import contains_xy
+
+from .coordinate_cache import index_hash
+from .quadtree import (
+    FrozenQuadtree,
+    QuadtreeError,
+    check_backend,
+    pack_leaf_geoms,
+    pack_wkb,
+    unpack_leaf_geoms,
+    unpack_wkb,
+)
+from .ray_casting import RingPolygon
+
+# Byte alignment of every array in the shared memory block
+ALIGNMENT = 64
+
+# Shared indexes of each process: (pid, block name) -> SharedQuadtree. The
+# pid keeps a forked child from reusing the tree of its parent.
+_attached = {}
+
+
+class SharedIndexHandle(NamedTuple):
+    """
+    Everything a process needs to attach to a shared index: the name of
+    the shared memory block, where each array is in it (key, offset, dtype,
+    shape), the polygon ids, the backend of the contains tests and the
+    index_hash of the tree that was shared.
+    """
+
+    name: str
+    layout: tuple
+    ids: tuple
+    backend: str
+    content_hash: str
+
+
+def pack_rings(rings: list[RingPolygon]) -> dict[str, np.ndarray]:
+    """
+    Concatenate the arrays of several RingPolygons, with the offsets of
+    each one (see SharedQuadtree).
+    """
+
+    def offsets(lengths):
+        out = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=out[1:])
+        return out
+
+    return {
+        "edge_offsets": offsets([len(r.x0) for r in rings]),
+        "x0": np.concatenate([r.x0 for r in rings]),
+        "y0": np.concatenate([r.y0 for r in rings]),
+        "y1": np.concatenate([r.y1 for r in rings]),
+        "slope": np.concatenate([r.slope for r in rings]),
+        "ring_bounds": np.array([r.bounds for r in rings], dtype=np.float64),
+        "band_offsets": offsets([len(r.band_start) for r in rings]),
+        "band_start": np.concatenate([r.band_start for r in rings]),
+        "band_edge_offsets": offsets([len(r.band_edges) for r in rings]),
+        "band_edges": np.concatenate([r.band_edges for r in rings]),
+    }
+
+
+class SharedQuadtree(FrozenQuadtree):
+    """
+    FrozenQuadtree whose arrays live in a multiprocessing.shared_memory
+    block, so several processes can query one copy of the index.
+
+    The block holds:
+
+        - the node and leaf arrays of the FrozenQuadtree (and the
+          midpoints of the nodes)
+        - the polygons (and the leaf geometries that are not whole
+          polygons, each distinct one once) as WKB, as in
+          FrozenQuadtree.save, so they are the exact float64 geometries of
+          the tree
+        - with the "numpy" backend, the edges and bands of the RingPolygon
+          of every polygon, one after the other with their offsets (see
+          pack_rings)
+
+    share creates the block from a FrozenQuadtree; other processes call
+    attach with its handle (or just unpickle the tree, which only sends
+    the handle). All the arrays are read-only views of the block.
+
+    Point-in-polygon tests use the backend of the shared tree (the one of
+    the tree it was shared from, unless share is given another one), so
+    the results are the same as its match_many. The backend decides what a
+    process attaching to the block allocates:
+
+        - "numpy": the RingPolygons are read from the block, and a process
+          only allocates a few Python objects per polygon, so memory stays
+          flat as workers are added
+        - "shapely" (the backend of load_quadtree): the shapely geometries
+          cannot live in shared memory, so each process builds its own from
+          the WKB on its first query. The node arrays are still shared,
+          but every worker holds a private copy of the polygons.
+
+    Share with backend="numpy" when memory matters more than the points
+    lying exactly on a boundary, where the two engines can disagree (see
+    ray_casting.RingPolygon). The process that called share owns the block
+    and must unlink it when it is done (or use the tree as a context
+    manager).
+    """
+
+    def __init__(
+        self,
+        handle: SharedIndexHandle,
+        shm: shared_memory.SharedMemory,
+        owner: bool = False,
+    ):
+        self.handle = handle
+        self.shm = shm
+        self.owner = owner
+        arrays = {}
+        for key, offset, dtype, shape in handle.layout:
+            arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            arr.flags.writeable = False
+            arrays[key] = arr
+
+        self.bounds = arrays["bounds"]
+        self.first_child = arrays["first_child"]
+        self.leaf_start = arrays["leaf_start"]
+        self.leaf_end = arrays["leaf_end"]
+        self.leaf_polygons = arrays["leaf_polygons"]
+        self.leaf_full = arrays["leaf_full"]
+        self.mid_x = arrays["mid_x"]
+        self.mid_y = arrays["mid_y"]
+        self.ids = list(handle.ids)
+        self.codes = {pid: code for code, pid in enumerate(self.ids)}
+        self.clipped = "leaf_wkb" in arrays
+        self.backend = handle.backend
+        self.content_hash = handle.content_hash
+        self.arrays = arrays
+
+        self.rings = None
+        if self.backend == "numpy":
+            edges, bands = arrays["edge_offsets"], arrays["band_offsets"]
+            band_edges = arrays["band_edge_offsets"]
+            self.rings = [
+                RingPolygon.from_arrays(
+                    arrays["x0"][edges[code] : edges[code + 1]],
+                    arrays["y0"][edges[code] : edges[code + 1]],
+                    arrays["y1"][edges[code] : edges[code + 1]],
+                    arrays["slope"][edges[code] : edges[code + 1]],
+                    arrays["ring_bounds"][code].tolist(),
+                    arrays["band_start"][bands[code] : bands[code + 1]],
+                    arrays["band_edges"][band_edges[code] : band_edges[code + 1]],
+                )
+                for code in range(len(self.ids))
+            ]
+
+        self._root_bounds = tuple(self.bounds[0].tolist())
+        self._first_child = memoryview(self.first_child)
+        self._mid_x = memoryview(self.mid_x)
+        self._mid_y = memoryview(self.mid_y)
+
+    @classmethod
+    def share(
+        cls,
+        quadtree: FrozenQuadtree,
+        name: str | None = None,
+        backend: str | None = None,
+    ) -> Self:
+        """
+        Copy a FrozenQuadtree into a new shared memory block.
+
+        Inputs:
+            - quadtree: the index to share
+            - name: name of the block, a random one by default
+            - backend: engine of the contains tests (see BACKENDS), the one
+              of quadtree by default
+
+        Returns:
+            The SharedQuadtree owning the block
+        """
+        backend = check_backend(quadtree.backend if backend is None else backend)
+        arrays = {
+            "bounds": quadtree.bounds,
+            "first_child": quadtree.first_child,
+            "leaf_start": quadtree.leaf_start,
+            "leaf_end": quadtree.leaf_end,
+            "leaf_polygons": quadtree.leaf_polygons,
+            "leaf_full": quadtree.leaf_full,
+            "mid_x": quadtree.mid_x,
+            "mid_y": quadtree.mid_y,
+        }
+        arrays["wkb"], arrays["wkb_offsets"] = pack_wkb(quadtree.polygons)
+        if quadtree.clipped:
+            (
+                arrays["leaf_wkb"],
+                arrays["leaf_wkb_offsets"],
+                arrays["leaf_geom_refs"],
+            ) = pack_leaf_geoms(
+                quadtree.leaf_geoms, quadtree.leaf_polygons, quadtree.polygons
+            )
+        if backend == "numpy":
+            arrays.update(
+                pack_rings([RingPolygon.from_geometry(geom) for geom in quadtree.geoms])
+            )
+
+        layout, size = [], 0
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            layout.append((key, size, arr.dtype.str, arr.shape))
+            size += -(-arr.nbytes // ALIGNMENT) * ALIGNMENT
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        for key, offset, dtype, shape in layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            view[...] = arrays[key]
+        del view
+        handle = SharedIndexHandle(
+            shm.name,
+            tuple(layout),
+            tuple(quadtree.ids),
+            backend,
+            index_hash(quadtree),
+        )
+        shared = _attached[os.getpid(), shm.name] = cls(handle, shm, owner=True)
+        return shared
+
+    @classmethod
+    def attach(cls, handle: SharedIndexHandle) -> Self:
+        """
+        Attach to a block created by share, read-only and without copying
+        it. A process attaches to each block only once.
+        """
+        key = (os.getpid(), handle.name)
+        shared = _attached.get(key)
+        if shared is None:
+            # the owner unlinks the block, not the processes attaching to it
+            shm = shared_memory.SharedMemory(name=handle.name, track=False)
+            shared = _attached[key] = cls(handle, shm)
+        return shared
+
+    def __reduce__(self):
+        # Pickling (e.g. to send the tree to a worker) only sends the handle
+        return (SharedQuadtree.attach, (self.handle,))
+
+    def __repr__(self) -> str:
+        return (
+            f"SharedQuadtree(name={self.handle.name!r}, nodes={len(self.bounds)}, "
+            f"polygons={len(self.ids)})"
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the shared memory block.
+        """
+        return self.shm.size
+
+    @functools.cached_property
+    def polygons(self) -> np.ndarray:
+        """
+        Shapely polygons, built (prepared) from the WKB of the block on
+        first use.
+        """
+        return unpack_wkb(self.arrays["wkb"], self.arrays["wkb_offsets"])
+
+    @functools.cached_property
+    def leaf_geoms(self) -> np.ndarray:
+        """
+        Shapely geometry of each leaf entry, built on first use. Entries
+        holding a whole polygon refer to the object in polygons.
+        """
+        if self.clipped:
+            return unpack_leaf_geoms(
+                self.arrays["leaf_wkb"],
+                self.arrays["leaf_wkb_offsets"],
+                self.arrays["leaf_geom_refs"],
+                self.leaf_polygons,
+                self.polygons,
+            )
+        return self.polygons[self.leaf_polygons]
+
+    def leaf_contains(self, i: int, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """
+        Contains test of the geometry of leaf entry i with the backend of
+        the tree: the shapely leaf geometry, or the shared RingPolygon of
+        the polygon (within a leaf, the whole polygon gives the same
+        answers as the clipped fragment or the nearby parts).
+        """
+        if self.backend == "numpy":
+            return self.rings[self.leaf_polygons[i]].contains_xy(xs, ys)
+        return contains_xy(self.leaf_geoms[i], xs, ys)
+
+    def match_xy(self, x: float, y: float, first: bool = False) -> list[str]:
+        """
+        Same as FrozenQuadtree.match_xy. With the "numpy" backend the tests
+        go through the RingPolygons, as in match_many (use match_many for
+        many points).
+        """
+        if self.backend != "numpy":
+            return FrozenQuadtree.match_xy(self, x, y, first)
+        xs, ys = np.array([x], dtype=np.float64), np.array([y], dtype=np.float64)
+        leaf = self.locate_leaves(xs, ys)[0]
+        results = []
+        if leaf < 0:
+            return results
+        for i in range(self.leaf_start[leaf], self.leaf_end[leaf]):
+            if self.leaf_full[i] or self.leaf_contains(i, xs, ys)[0]:
+                results.append(self.ids[self.leaf_polygons[i]])
+                if first:
+                    break
+        return results
+
+    def save(self, path, key: str = "") -> None:
+        raise QuadtreeError("save the FrozenQuadtree that was shared instead")
+
+    def close(self) -> None:
+        """
+        Detach this process from the block (and unlink it, on the owner).
+        The tree cannot be queried afterwards.
+        """
+        shm, owner = self.shm, self.owner
+        _attached.pop((os.getpid(), self.handle.name), None)
+        # Drop every view of the block before closing it
+        self.__dict__.clear()
+        shm.close()
+        if owner:
+            shm.unlink()
@@ -0,0 +1,332 @@
+import argparse
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, Polygon
+
+from .crime_utils import Crime, load_crime_data
+from .geometry_store import GeometryStore
+from .lookup_grid import LookupGrid
+from .merge_shp import (
+    DIVISION_LAYERS,
+    Neighborhood,
+    Puma,
+    School,
+    assign_puma_neighborhood,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_division,
+    load_schools,
+)
+from .quadtree import BBox
+
+# name -> builder. A builder takes the list of Puma or Neighborhood objects
+# and returns a matcher: a function of arrays of x (longitude) and y
+# (latitude) coordinates that returns an int64 array with, for every point,
+# the position in the list of the first division holding it, -1 if none.
+JOIN_BACKENDS = {}
+
+
+def join_backend(name: str) -> Callable:
+    """
+    Decorator that registers a builder in JOIN_BACKENDS under name.
+    """
+
+    def register(builder: Callable) -> Callable:
+        JOIN_BACKENDS[name] = builder
+        return builder
+
+    return register
+
+
+def check_join_backend(backend: str) -> str:
+    if backend not in JOIN_BACKENDS:
+        raise ValueError(
+            f"unknown backend {backend!r}, expected one of {list(JOIN_BACKENDS)}"
+        )
+    return backend
+
+
+def positions_of(ids: list[str], division: list[Puma | Neighborhood]) -> np.ndarray:
+    """
+    Helper function that maps the codes of an index (positions in ids) to
+    positions in division. The extra last entry maps -1 to -1.
+    """
+    position = {div.id: i for i, div in reversed(list(enumerate(division)))}
+    return np.array([position[pid] for pid in ids] + [-1], dtype=np.int64)
+
+
+def index_matcher(index, division: list[Puma | Neighborhood]) -> Callable:
+    """
+    Matcher of any index with a match_many method and the ids attribute.
+    """
+    positions = positions_of(index.ids, division)
+    return lambda xs, ys: positions[index.match_many(xs, ys)]
+
+
+@join_backend("quadtree")
+def build_quadtree(division: list[Puma | Neighborhood]) -> Callable:
+    return index_matcher(
+        gen_quadtree(division, gen_chi_bbox(division)).freeze(), division
+    )
+
+
+@join_backend("quadtree_numpy")
+def build_quadtree_numpy(division: list[Puma | Neighborhood]) -> Callable:
+    quadtree = gen_quadtree(division, gen_chi_bbox(division), backend="numpy")
+    return index_matcher(quadtree.freeze(), division)
+
+
+@join_backend("rtree")
+def build_rtree(division: list[Puma | Neighborhood]) -> Callable:
+    return index_matcher(
+        gen_quadtree(division, gen_chi_bbox(division), index="rtree"), division
+    )
+
+
+@join_backend("grid")
+def build_grid(division: list[Puma | Neighborhood]) -> Callable:
+    quadtree = gen_quadtree(division, gen_chi_bbox(division))
+    return index_matcher(LookupGrid.from_index(quadtree), division)
+
+
+@join_backend("geometry_store")
+def build_geometry_store(division: list[Puma | Neighborhood]) -> Callable:
+    """
+    No index: the ray-casting kernel of every polygon of a GeometryStore,
+    each tested only on the points without a match yet.
+    """
+    store = GeometryStore.from_division(division)
+    rings = [store.ring_polygon(code) for code in range(len(store))]
+
+    def match(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        result = np.full(len(xs), -1, dtype=np.int64)
+        pending = np.arange(len(xs))
+        for position, ring in enumerate(rings):
+            hits = ring.contains_xy(xs[pending], ys[pending])
+            result[pending[hits]] = position
+            pending = pending[~hits]
+        return result
+
+    return match
+
+
+def build_sindex(frame: gpd.GeoDataFrame):
+    """
+    Builds the spatial index (shapely's STRtree) of a GeoDataFrame, which
+    geopandas otherwise builds lazily within the first sjoin. The build is
+    then timed with the index and not with the query.
+    """
+    return frame.sindex
+
+
+@join_backend("sjoin")
+def build_sjoin(division: list[Puma | Neighborhood]) -> Callable:
+    """
+    geopandas sjoin (predicate "within", backed by shapely's STRtree). When
+    a point falls within several divisions, the first one in the list wins.
+    """
+    divisions = gpd.GeoDataFrame(
+        {"position": np.arange(len(division))},
+        geometry=[div.polygon for div in division],
+    )
+    build_sindex(divisions)
+
+    def match(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(xs, ys))
+        joined = gpd.sjoin(points, divisions, how="inner", predicate="within")
+        first = joined.groupby(level=0)["position"].min()
+        result = np.full(len(xs), -1, dtype=np.int64)
+        result[first.index.to_numpy()] = first.to_numpy()
+        return result
+
+    return match
+
+
+def spatial_join(
+    division: list[Puma | Neighborhood],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    backend: str = "quadtree",
+) -> np.ndarray:
+    """
+    Assign a division to each point with one of the JOIN_BACKENDS.
+
+    Returns:
+        An object array with the id of the division holding each point,
+        None if there is none.
+    """
+    positions = JOIN_BACKENDS[check_join_backend(backend)](division)(
+        np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    )
+    ids = np.empty(len(division) + 1, dtype=object)
+    ids[:-1] = [div.id for div in division]
+    ids[-1] = None
+    return ids[positions]
+
+
+class IndexPolygon(NamedTuple):
+    """
+    Polygon of an index, with the fields of Puma and Neighborhood that the
+    builders use.
+    """
+
+    id: str
+    polygon: Polygon | MultiPolygon
+
+
+class BackendIndex:
+    """
+    One of the JOIN_BACKENDS over a list of divisions, with the ids and the
+    match_many of an index (codes are positions in ids), so it can take the
+    place of a quadtree in merge_shp.assign_division_ids.
+    """
+
+    def __init__(self, division: list[Puma | Neighborhood], backend: str):
+        self.backend = check_join_backend(backend)
+        self.ids = [div.id for div in division]
+        self.matcher = JOIN_BACKENDS[backend](division)
+
+    @classmethod
+    def from_index(cls, index, backend: str) -> "BackendIndex":
+        """
+        Same polygons as an index with the ids and geoms attributes
+        (Quadtree, FrozenQuadtree, RTree), in the same order.
+        """
+        return cls(
+            [IndexPolygon(pid, geom) for pid, geom in zip(index.ids, index.geoms)],
+            backend,
+        )
+
+    def __repr__(self) -> str:
+        return f"BackendIndex(backend={self.backend!r}, polygons={len(self.ids)})"
+
+    def match_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.matcher(
+            np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        )
+
+
+def join_puma_neighborhood(
+    data_lst: list[Crime | School],
+    division: list[Puma | Neighborhood],
+    group: str,
+    backend: str = "quadtree",
+) -> pd.DataFrame:
+    """
+    Same as merge_shp.assign_puma_neighborhood with backend, from the list
+    of Puma or Neighborhood objects.
+    """
+    return assign_puma_neighborhood(data_lst, division, group, backend=backend)
+
+
+class BackendResult(NamedTuple):
+    backend: str
+    build_seconds: float
+    points_per_second: float
+    mismatches: int
+
+
+def compare_backends(
+    division: list[Puma | Neighborhood],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    backends: list[str] | None = None,
+    repeat: int = 3,
+) -> list[BackendResult]:
+    """
+    Run every backend on the same points.
+
+    The first backend is the reference: mismatches is the number of points
+    whose division differs from it.
+
+    Returns:
+        A BackendResult per backend, sorted from the fastest to the slowest.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    backends = list(JOIN_BACKENDS) if backends is None else backends
+    reference = None
+    results = []
+    for backend in backends:
+        start = time.perf_counter()
+        match = JOIN_BACKENDS[backend](division)
+        build = time.perf_counter() - start
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            positions = match(xs, ys)
+            best = min(best, time.perf_counter() - start)
+        if reference is None:
+            reference = positions
+        results.append(
+            BackendResult(
+                backend=backend,
+                build_seconds=build,
+                points_per_second=len(xs) / best,
+                mismatches=int(np.count_nonzero(positions != reference)),
+            )
+        )
+    return sorted(results, key=lambda r: -r.points_per_second)
+
+
+def load_sample(
+    sample: str, bbox: BBox, n: int, seed: int = 30122
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Coordinates of the points of the harness: "schools" (from
+    data/merged_school_data.csv), "crimes" (the crimes by Puma of
+    crime_utils.load_crime_data) or n "random" points over the bbox.
+    Real samples are repeated up to n points.
+    """
+    if sample == "random":
+        rng = np.random.default_rng(seed)
+        return rng.uniform(bbox.min_x, bbox.max_x, n), rng.uniform(
+            bbox.min_y, bbox.max_y, n
+        )
+    if sample == "schools":
+        located = [
+            school
+            for school in load_schools(Path("data/merged_school_data.csv"))
+            if school.longitude != "" and school.latitude != ""
+        ]
+        xs = np.array([float(school.longitude) for school in located])
+        ys = np.array([float(school.latitude) for school in located])
+    else:
+        crimes = load_crime_data()[0][["longitude", "latitude"]].dropna()
+        xs, ys = crimes["longitude"].to_numpy(), crimes["latitude"].to_numpy()
+    return np.resize(xs, n), np.resize(ys, n)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parity and throughput of the spatial join backends."
+    )
+    parser.add_argument(
+        "--sample", choices=["random", "schools", "crimes"], default="random"
+    )
+    parser.add_argument("--layers", nargs="+", choices=list(DIVISION_LAYERS))
+    parser.add_argument("--backends", nargs="+", choices=list(JOIN_BACKENDS))
+    parser.add_argument("-n", type=int, default=100000, help="number of points")
+    args = parser.parse_args()
+
+    for layer in args.layers or DIVISION_LAYERS:
+        division = load_division(*DIVISION_LAYERS[layer])
+        xs, ys = load_sample(args.sample, gen_chi_bbox(division), args.n)
+        print(f"== {layer} ({args.sample}, n={len(xs)})")
+        for r in compare_backends(division, xs, ys, args.backends):
+            print(
+                f"{r.backend:<15} build: {r.build_seconds * 1e3:8.1f} ms   "
+                f"{r.points_per_second:12,.0f} points/s   "
+                f"mismatches: {r.mismatches}"
+            )
+
+
+if __name__ == "__main__":
+    main()
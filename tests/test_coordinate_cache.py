@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from andes_indus.coordinate_cache import (
+    CoordinateCache,
+    DedupReport,
+    as_points,
+    unique_points,
+)
+from andes_indus.merge_shp import (
+    assign_division_ids,
+    assign_divisions,
+    assign_puma_neighborhood,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_multi_layer_index,
+    load_pumas_shp,
+)
+
+index = load_multi_layer_index()
+pumas2020 = load_pumas_shp(Path("data/shapefiles/pumas/pumas2022"), 2020)
+quadtree_chi = gen_quadtree(pumas2020, gen_chi_bbox(pumas2020)).freeze()
+
+# 3000 points on 200 blocks, and 50 points without coordinates
+rng = np.random.default_rng(30122)
+block_xs = rng.uniform(-87.94, -87.52, 200)
+block_ys = rng.uniform(41.64, 42.02, 200)
+blocks = rng.integers(0, 200, 3000)
+xs = np.concatenate([block_xs[blocks], np.full(50, np.nan)])
+ys = np.concatenate([block_ys[blocks], np.full(50, np.nan)])
+
+
+def test_unique_points():
+    points = as_points(xs[:3000], ys[:3000])
+    uniques, inverse = unique_points(points)
+    expected_uniques, expected_inverse = np.unique(points, return_inverse=True)
+    assert np.array_equal(uniques, expected_uniques)
+    assert np.array_equal(inverse, expected_inverse)
+    assert np.array_equal(uniques[inverse], points)
+
+
+def test_match_many():
+    for matcher in (index, quadtree_chi):
+        cache = CoordinateCache(matcher)
+        assert np.array_equal(cache.match_many(xs, ys), matcher.match_many(xs, ys))
+        n_unique = len(np.unique(blocks))
+        assert cache.last_report == DedupReport(3050, 3000, n_unique, 0, n_unique)
+        assert cache.last_report.queries_saved == 3000 - n_unique
+
+        # The second call only queries the new blocks
+        more_xs = np.concatenate([xs[:100], [-87.63]])
+        more_ys = np.concatenate([ys[:100], [41.88]])
+        assert np.array_equal(cache.match_many(more_xs, more_ys),
+                              matcher.match_many(more_xs, more_ys))
+        assert cache.last_report.queried == 1
+        assert cache.report.points == 3050 + 101
+        assert np.all(np.diff(cache.points.real) >= 0)
+
+
+def test_max_points():
+    # Each page of 1000 points has more blocks than max_points: the cache
+    # only keeps the blocks of the last page
+    cache = CoordinateCache(index, max_points=150)
+    for start in range(0, 3000, 1000):
+        page_xs, page_ys = xs[start:start + 1000], ys[start:start + 1000]
+        assert np.array_equal(cache.match_many(page_xs, page_ys),
+                              index.match_many(page_xs, page_ys))
+        assert len(cache.points) == cache.last_report.unique
+        assert np.all(np.diff(cache.points.real) >= 0)
+
+    # Below the limit the cache keeps growing
+    cache = CoordinateCache(index, max_points=200)
+    cache.match_many(xs[:1000], ys[:1000])
+    cache.match_many(xs[:10], ys[:10])
+    assert cache.last_report.queried == 0
+    assert len(cache.points) == len(np.unique(blocks[:1000]))
+
+
+def test_assign_divisions():
+    data = pd.DataFrame({"longitude": xs, "latitude": ys})
+    cache = CoordinateCache(index)
+    assert assign_divisions(data, index, cache).equals(assign_divisions(data, index))
+    assert assign_puma_neighborhood(data, quadtree_chi, "puma", dedup=True).equals(
+        assign_puma_neighborhood(data, quadtree_chi, "puma"))
+    assert (assign_division_ids(xs, ys, CoordinateCache(quadtree_chi)).tolist()
+            == assign_division_ids(xs, ys, quadtree_chi).tolist())
+
+
+def test_persistent_cache(tmp_path):
+    path = tmp_path / "multi_layer.coords.npz"
+    cache = CoordinateCache(index, path)
+    expected = cache.match_many(xs, ys)
+    cache.save()
+
+    # Next run: every block comes from the file
+    cache = CoordinateCache(index, path)
+    assert np.array_equal(cache.match_many(xs, ys), expected)
+    assert cache.last_report.queried == 0
+    assert cache.last_report.cached == cache.last_report.unique
+
+    # Another index does not use it
+    cache = CoordinateCache(quadtree_chi, path)
+    assert len(cache.points) == 0
+    assert np.array_equal(cache.match_many(xs, ys), quadtree_chi.match_many(xs, ys))
@@ -0,0 +1,109 @@
+import numpy as np
+
+from andes_indus.coordinate_cache import CoordinateCache
+from andes_indus.crime_stream import (
+    STREAM_CACHE_POINTS,
+    count_crime_pages,
+    stream_cache,
+    stream_crime_data,
+)
+from andes_indus.crime_utils import crime_table, iter_crime_pages
+from andes_indus.join_data import group_crime_data_by, with_division
+from andes_indus.merge_shp import assign_divisions, load_multi_layer_index
+from andes_indus.records import RecordTable
+
+rng = np.random.default_rng(30122)
+api_sample = [
+    {
+        "case_number": f"JC{i:06d}",
+        "latitude": str(rng.uniform(41.64, 42.02)),
+        "longitude": str(rng.uniform(-87.94, -87.52)),
+        "block": "067XX S KEDZIE AVE",
+        "date": f"{[2023, 2013, 2018][i % 3]}-04-12T08:30:00.000",
+        "primary_type": ["HOMICIDE", "ROBBERY", "ASSAULT", "THEFT"][i % 4],
+        "description": ["AGGRAVATED - HANDGUN", "SIMPLE", "ARMED"][i % 5 % 3],
+    }
+    for i in range(2000)
+]
+index = load_multi_layer_index()
+
+
+class PagedClient:
+    '''
+    Serves api_sample as the Socrata client, one page per request
+    '''
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, data_set, year, limit, offset, order):
+        self.requests += 1
+        records = [r for r in api_sample if r["date"].startswith(str(year))]
+        return records[offset:offset + limit]
+
+
+def batch_tables(records, puma_layer):
+    crimes = assign_divisions(crime_table(records), index)
+    return (
+        group_crime_data_by(with_division(crimes, "puma", crimes[puma_layer]),
+                            "puma"),
+        group_crime_data_by(with_division(crimes, "neighborhood",
+                                          crimes["neighborhoods"]), "neighborhood"),
+    )
+
+
+def test_iter_crime_pages():
+    client = PagedClient()
+    pages = list(iter_crime_pages(client, "ijzp-q8t2", [2013, 2023], 100))
+    assert max(len(page) for page in pages) == 100
+    assert sum(len(page) for page in pages) == 1334
+    # 667 records of each year: 7 pages, the last one shorter
+    assert client.requests == 14
+
+
+def test_count_crime_pages():
+    pages = [api_sample[start:start + 128] for start in range(0, 2000, 128)]
+    counts = count_crime_pages(pages, index, "pumas2020")
+    assert counts.n_crimes == 2000
+    by_puma, by_neighborhood = batch_tables(api_sample, "pumas2020")
+    assert counts.to_frame("puma").equals(by_puma)
+    assert counts.to_frame("neighborhood").equals(by_neighborhood)
+
+
+def test_stream_crime_data():
+    by_puma, by_neighborhood = stream_crime_data(index, PagedClient(), 150)
+    # As gen_final_data: Pumas 2020 in 2023, Pumas 2010 before
+    records_23 = [r for r in api_sample if r["date"].startswith("2023")]
+    records_1318 = [r for r in api_sample if not r["date"].startswith("2023")]
+    crimes = assign_divisions(
+        RecordTable.concat([crime_table(records_23), crime_table(records_1318)]),
+        index,
+    )
+    is_23 = np.arange(len(crimes)) < len(records_23)
+    puma = crimes["pumas2020"].where(is_23, crimes["pumas2010"])
+    assert by_puma.equals(group_crime_data_by(with_division(crimes, "puma", puma),
+                                              "puma"))
+    assert by_neighborhood.equals(batch_tables(api_sample, "pumas2020")[1])
+
+    # Same tables when the cache is full after every page
+    cache = CoordinateCache(index, max_points=100)
+    assert by_puma.equals(stream_crime_data(index, PagedClient(), 150, cache)[0])
+    assert len(cache.points) <= 150
+
+
+def test_stream_persistent_cache(tmp_path):
+    # The cache of gen_final_data is kept in a file and still capped
+    path = tmp_path / "coordinates.npz"
+    cache = stream_cache(index, path)
+    assert cache.path == path and cache.max_points == STREAM_CACHE_POINTS
+
+    expected = stream_crime_data(index, PagedClient(), 150)
+    cache = CoordinateCache(index, path, max_points=100)
+    assert stream_crime_data(index, PagedClient(), 150, cache)[0].equals(expected[0])
+    assert len(cache.points) <= 150
+    cache.save()
+
+    # Reloaded for the next run, and capped again
+    cache = CoordinateCache(index, path, max_points=100)
+    assert 0 < len(cache.points) <= 150
+    assert stream_crime_data(index, PagedClient(), 150, cache)[1].equals(expected[1])
+    assert len(cache.points) <= 150
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from andes_indus.crosswalk import CrosswalkError, OverlapMatrix, load_overlap_matrix
+from andes_indus.merge_shp import DIVISION_LAYERS, load_division
+
+pumas2010 = load_division(*DIVISION_LAYERS["pumas2010"])
+pumas2020 = load_division(*DIVISION_LAYERS["pumas2020"])
+
+
+def test_overlap_matrix():
+    matrix = OverlapMatrix.from_divisions(pumas2010, pumas2020)
+    dense = np.array([[old.polygon.intersection(new.polygon).area
+                       for new in pumas2020] for old in pumas2010])
+    rebuilt = np.zeros_like(dense)
+    rebuilt[matrix.rows, matrix.indices] = matrix.areas
+    assert np.allclose(rebuilt, dense)
+    assert len(matrix.areas) == np.count_nonzero(dense)
+
+    table = matrix.to_frame()
+    assert table["source"].tolist()[0] == pumas2010[0].id
+    assert table.groupby("source")["source_share"].sum().between(0.99, 1.01).all()
+    assert matrix.transpose().transpose().to_frame().equals(table)
+
+
+def test_interpolate():
+    matrix = OverlapMatrix.from_divisions(pumas2010, pumas2020)
+    population = pd.Series(1000.0, index=matrix.source_ids)
+    moved = matrix.interpolate(population)
+    assert list(moved.index) == matrix.target_ids
+    # Counts are preserved, up to the slivers outside the other layer
+    assert moved.sum() == pytest.approx(population.sum(), rel=0.01)
+    rates = matrix.interpolate(np.full(len(pumas2010), 0.25), extensive=False)
+    assert np.allclose(rates, 0.25)
+
+    # A missing source value does not spill into the targets
+    population.iloc[0] = np.nan
+    assert matrix.interpolate(population).sum() < moved.sum()
+
+
+def test_load_overlap_matrix(tmp_path):
+    matrix = load_overlap_matrix("pumas2010", "pumas2020", cache_dir=tmp_path)
+    assert (tmp_path / "pumas2010_pumas2020.xwalk.npz").exists()
+    cached = load_overlap_matrix("pumas2010", "pumas2020", cache_dir=tmp_path)
+    assert cached.to_frame().equals(matrix.to_frame())
+    with pytest.raises(CrosswalkError):
+        OverlapMatrix.load(tmp_path / "pumas2010_pumas2020.xwalk.npz", "stale")
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box, shape
+
+from andes_indus.geometry_store import GEOMETRY_CODE, GeometryStore, load_geometry_store
+from andes_indus.merge_shp import load_neighborhood_shp, load_pumas_shp
+from andes_indus.ray_casting import RingPolygon
+
+path_pumas = Path("data/shapefiles/pumas/pumas2022")
+path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
+path_data_pumas = Path("data/shapefiles/data_pumas.shp")
+
+pumas = load_pumas_shp(path_pumas, 2020)
+neighborhoods = load_neighborhood_shp(path_neighborhoods)
+
+
+def test_round_trip():
+    for division in (pumas, neighborhoods):
+        store = GeometryStore.from_division(division)
+        assert store.ids == [div.id for div in division]
+        assert store.coords.dtype == np.float32
+        for code, geom in enumerate(store.to_shapely()):
+            polygon = division[code].polygon
+            assert geom.geom_type == polygon.geom_type
+            assert geom.equals_exact(polygon, 1e-6)
+            assert store.geometry(code).equals_exact(geom, 0)
+            assert shape(store.to_geojson(code)).equals_exact(geom, 0)
+
+    holed = box(0, 0, 3, 3).difference(box(1, 1, 2, 2))
+    multi = MultiPolygon([box(5, 5, 6, 6), box(7, 7, 8, 8)])
+    store = GeometryStore.from_geometries([holed, multi], ["holed", "multi"])
+    assert np.diff(store.geom_offsets).tolist() == [1, 2]
+    assert isinstance(store.geometry(0), Polygon)
+    assert len(store.geometry(0).interiors) == 1
+    assert store.geometry(1).equals(multi)
+    assert store.__geo_interface__["features"][1]["id"] == "multi"
+
+
+def test_ring_polygon():
+    store = GeometryStore.from_division(neighborhoods)
+    rng = np.random.default_rng(30122)
+    min_x, min_y, max_x, max_y = shapely.total_bounds(store.to_shapely())
+    xs = rng.uniform(min_x, max_x, 5000)
+    ys = rng.uniform(min_y, max_y, 5000)
+    for code, div in enumerate(neighborhoods):
+        expected = RingPolygon.from_geometry(div.polygon).contains_xy(xs, ys)
+        assert np.array_equal(store.ring_polygon(code).contains_xy(xs, ys),
+                              expected)
+
+
+def test_load_geometry_store(tmp_path):
+    store = GeometryStore.from_division(pumas)
+    store.save(tmp_path / "pumas.npz", "key")
+    loaded = GeometryStore.load(tmp_path / "pumas.npz", "key")
+    assert loaded.ids == store.ids
+    assert np.array_equal(loaded.coords, store.coords)
+    assert np.array_equal(loaded.origin, store.origin)
+
+    gdf = gpd.read_file(path_data_pumas)
+    store, records = load_geometry_store(path_data_pumas)
+    assert len(store) < len(records) == len(gdf)
+    pd.testing.assert_frame_equal(records.drop(columns=GEOMETRY_CODE),
+                                  pd.DataFrame(gdf.drop(columns="geometry")))
+    # second call reads the cache, records included
+    cached, records = load_geometry_store(path_data_pumas)
+    assert np.array_equal(cached.coords, store.coords)
+    pd.testing.assert_frame_equal(records.drop(columns=GEOMETRY_CODE),
+                                  pd.DataFrame(gdf.drop(columns="geometry")))
+
+    rebuilt = cached.to_geodataframe(records[records["year"] == 2023])
+    assert rebuilt.crs == gdf.crs
+    expected = gdf[gdf["year"] == 2023].geometry
+    assert all(a.equals_exact(b, 1e-6)
+               for a, b in zip(rebuilt.geometry, expected))
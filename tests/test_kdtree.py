@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from andes_indus.crime_utils import Crime
+from andes_indus.kdtree import KDTree, KDTreeError, project_lonlat
+from andes_indus.merge_shp import School, count_crimes_near_schools
+
+rng = np.random.default_rng(30122)
+lons = rng.uniform(-87.90, -87.55, 5000)
+lats = rng.uniform(41.65, 42.02, 5000)
+xs, ys = project_lonlat(lons, lats)
+kdtree = KDTree(xs, ys, leaf_size=16)
+
+query_xs, query_ys = project_lonlat(
+    rng.uniform(-87.90, -87.55, 50), rng.uniform(41.65, 42.02, 50)
+)
+
+
+def test_project_lonlat():
+    # One degree of latitude is about 111 km
+    _, y = project_lonlat([-87.6, -87.6], [41.0, 42.0])
+    assert y[1] - y[0] == pytest.approx(111_195, rel=1e-3)
+
+
+def test_within_radius():
+    for x, y in zip(query_xs, query_ys):
+        dist = np.hypot(xs - x, ys - y)
+        expected = np.flatnonzero(dist <= 800)
+        assert np.array_equal(kdtree.within_radius(x, y, 800), expected)
+        assert kdtree.count_within_radius(x, y, 800) == len(expected)
+
+    counts = kdtree.count_within_radius_many(query_xs, query_ys, 800)
+    found = kdtree.within_radius_many(query_xs, query_ys, 800)
+    assert list(counts) == [len(points) for points in found]
+    for points, x, y in zip(found, query_xs, query_ys):
+        assert np.array_equal(points, kdtree.within_radius(x, y, 800))
+
+    # Radius covering every point, and an empty tree
+    counts = kdtree.count_within_radius_many(query_xs, query_ys, 1e6)
+    assert list(counts) == [5000] * 50
+    empty = KDTree(np.empty(0), np.empty(0))
+    assert list(empty.count_within_radius_many(query_xs, query_ys, 800)) == [0] * 50
+    assert all(len(points) == 0
+               for points in empty.within_radius_many(query_xs, query_ys, 800))
+
+
+def test_nearest():
+    dists, points = kdtree.nearest_many(query_xs, query_ys, 5)
+    for row, (x, y) in enumerate(zip(query_xs, query_ys)):
+        dist = np.hypot(xs - x, ys - y)
+        assert np.allclose(dists[row], np.sort(dist)[:5])
+        assert np.allclose(dist[points[row]], dists[row])
+
+    # More neighbours than the points of a leaf: same as nearest
+    dists, points = kdtree.nearest_many(query_xs, query_ys, 40)
+    for row, (x, y) in enumerate(zip(query_xs, query_ys)):
+        row_dists, row_points = kdtree.nearest(x, y, 40)
+        assert np.allclose(dists[row], row_dists)
+        assert np.array_equal(points[row], row_points)
+
+    # Fewer points than k
+    small = KDTree(xs[:3], ys[:3])
+    dists, points = small.nearest_many(query_xs[:1], query_ys[:1], 5)
+    assert list(points[0, 3:]) == [-1, -1]
+
+    with pytest.raises(KDTreeError):
+        KDTree([0.0, np.nan], [0.0, 1.0])
+
+
+def test_count_crimes_near_schools():
+    crimes = [
+        Crime("A", 41.7900, -87.6000, "", 2023, "", "THEFT", "", None, None),
+        Crime("B", 41.7920, -87.6000, "", 2023, "", "THEFT", "", None, None),
+        Crime("C", 41.7900, -87.6000, "", 2018, "", "THEFT", "", None, None),
+        Crime("D", 41.9000, -87.6000, "", 2023, "", "THEFT", "", None, None),
+    ]
+    empty_school = School(*[""] * len(School._fields))
+    school = empty_school._replace(id="1", latitude="41.79", longitude="-87.60")
+    schools = [
+        school._replace(year="2023"),
+        school._replace(year="2013"),
+        empty_school._replace(id="2", year="2023"),
+    ]
+    counts = count_crimes_near_schools(crimes, schools, 500)
+    assert counts.values.tolist() == [["1", 2023, 2], ["1", 2013, 0]]
@@ -4,24 +4,28 @@ from andes_indus.merge_shp import (load_pumas_shp,
                                    load_neighborhood_shp, 
                                    load_schools,
                                    assign_puma_neighborhood,
-                                   gen_quadtree,
+                                   load_quadtree,
+                                   load_multi_layer_index,
+                                   assign_divisions,
                                    gen_chi_bbox,
+                                   gen_quadtree,
                                    School)
 from andes_indus.crime_utils import process_results
 from pathlib import Path
 import pandas as pd
+import numpy as np
 
 path_pumas2020 = Path("data/shapefiles/pumas/pumas2022")
 pumas2020 = load_pumas_shp(path_pumas2020,2020)
-quadtree_chi_pumas2020 = gen_quadtree(pumas2020, gen_chi_bbox(pumas2020))
+quadtree_chi_pumas2020 = load_quadtree(path_pumas2020, 2020)
 
 path_pumas2010 = Path("data/shapefiles/pumas2010/pumas2010")
 pumas2010 = load_pumas_shp(path_pumas2010,2010)
-quadtree_chi_pumas2010 = gen_quadtree(pumas2010, gen_chi_bbox(pumas2010))
+quadtree_chi_pumas2010 = load_quadtree(path_pumas2010, 2010)
 
 path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
 neighborhoods = load_neighborhood_shp(path_neighborhoods)
-quadtree_chi_neighborhoods = gen_quadtree(neighborhoods, gen_chi_bbox(neighborhoods))
+quadtree_chi_neighborhoods = load_quadtree(path_neighborhoods)
 
 path_schools = Path("data/merged_school_data.csv")
 schools = load_schools(path_schools)
@@ -109,7 +113,8 @@ def test_assign_pumas():
         assert item == correct_pumas[ix]
 
     shorted_list = [schools[ix] for ix in range(0,2500,500)]
-    schools_by_puma = assign_puma_neighborhood(shorted_list, quadtree_chi_pumas2020, 'puma')
+    schools_by_puma = assign_puma_neighborhood(shorted_list, quadtree_chi_pumas2020,
+                                               'puma')
     assigned_pumas = schools_by_puma.puma.unique()
     correct_pumas = ['03152', '03158', '03159', '03161', '03161']
     for ix, item in enumerate(assigned_pumas):
@@ -122,4 +127,35 @@ def test_assign_neighborhoods():
     for ix, item in enumerate(assigned_neighborhoods):
         assert item == correct_neighborhoods[ix]
 
-    
\ No newline at end of file
+    
+
+def test_assign_divisions():
+    index = load_multi_layer_index()
+    crimes = assign_divisions(crime_lists, index)
+    assert len(crimes) == len(crime_sample)
+    assert list(crimes.pumas2020) == list(pd.DataFrame(crime_sample).puma)
+    assert list(crimes.neighborhoods) == list(
+        pd.DataFrame(crime_sample).neighborhood
+    )
+
+    shorted_list = [schools[ix] for ix in range(0,2500,500)]
+    schools_by_division = assign_divisions(shorted_list, index)
+    schools_by_puma = assign_puma_neighborhood(shorted_list, quadtree_chi_pumas2020,
+                                               'puma')
+    assert list(schools_by_division.pumas2020.dropna()) == list(schools_by_puma.puma)
+
+
+def test_numpy_backend():
+    for quadtree, division in ((quadtree_chi_pumas2020, pumas2020),
+                               (quadtree_chi_pumas2010, pumas2010),
+                               (quadtree_chi_neighborhoods, neighborhoods)):
+        # A tree of its own, the shared ones are left untouched
+        quadtree_numpy = gen_quadtree(division, gen_chi_bbox(division),
+                                      backend="numpy").freeze()
+        for data_lst in (crime_lists, schools):
+            located = [point for point in data_lst
+                       if point.longitude != "" and point.latitude != ""]
+            xs = [float(point.longitude) for point in located]
+            ys = [float(point.latitude) for point in located]
+            assert np.array_equal(quadtree_numpy.match_many(xs, ys),
+                                  quadtree.match_many(xs, ys))
@@ -0,0 +1,634 @@
+import multiprocessing
+import pickle
+import shutil
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from shapely import contains_xy
+from shapely.geometry import Point, box
+
+from andes_indus.approximations import BOUNDARY, INSIDE, PolygonApproximation
+from andes_indus.coordinate_cache import index_hash
+from andes_indus.crime_utils import Crime
+from andes_indus.lookup_grid import AMBIGUOUS, OUTSIDE, LookupGrid
+from andes_indus.merge_shp import (
+    assign_division_ids,
+    assign_division_to_list,
+    assign_puma_neighborhood,
+    assign_puma_to_list,
+    coordinate_columns,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_neighborhood_shp,
+    load_pumas_shp,
+    load_quadtree,
+    read_quadtree_config,
+)
+from andes_indus.multi_layer import MultiLayerIndex
+from andes_indus.parallel_assign import ParallelMatcher
+from andes_indus.quadtree import (
+    BBox,
+    FrozenQuadtree,
+    QuadtreeError,
+    morton_codes,
+    morton_order,
+)
+from andes_indus.quadtree_tuning import MULTI_LAYER, save_best_config, tune_layer
+from andes_indus.ray_casting import RingPolygon
+from andes_indus.shared_index import SharedQuadtree
+
+path_pumas2020 = Path("data/shapefiles/pumas/pumas2022")
+pumas2020 = load_pumas_shp(path_pumas2020, 2020)
+chi_bbox_pumas2020 = gen_chi_bbox(pumas2020)
+quadtree_chi_pumas2020 = gen_quadtree(pumas2020, chi_bbox_pumas2020)
+
+path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
+neighborhoods = load_neighborhood_shp(path_neighborhoods)
+chi_bbox_neighborhoods = gen_chi_bbox(neighborhoods)
+quadtree_chi_neighborhoods = gen_quadtree(neighborhoods, chi_bbox_neighborhoods)
+
+
+def gen_random_points(bbox, n: int, seed: int = 30122):
+    '''
+    Helper function to generate random coordinates over (and slightly beyond)
+    a bounding box
+    '''
+    rng = np.random.default_rng(seed)
+    pad_x = (bbox.max_x - bbox.min_x) * 0.05
+    pad_y = (bbox.max_y - bbox.min_y) * 0.05
+    xs = rng.uniform(bbox.min_x - pad_x, bbox.max_x + pad_x, n)
+    ys = rng.uniform(bbox.min_y - pad_y, bbox.max_y + pad_y, n)
+    return xs, ys
+
+
+def scalar_codes(quadtree, xs, ys) -> np.ndarray:
+    '''
+    Helper function that runs the scalar match over each point
+    '''
+    codes = []
+    for x, y in zip(xs, ys):
+        match_lst = quadtree.match(Point(x, y))
+        codes.append(quadtree.codes[match_lst[0]] if match_lst else -1)
+    return np.array(codes)
+
+
+def gen_boundary_points(divisions, step: int = 7):
+    '''
+    Helper function that returns vertices of the polygons and the midpoints
+    of their edges (every step-th vertex), on or next to a boundary
+    '''
+    xs, ys = [], []
+    for div in divisions:
+        rings = shapely.get_exterior_ring(shapely.get_parts(div.polygon))
+        coords = shapely.get_coordinates(rings)[::step]
+        xs += [coords[:-1, 0], (coords[:-1, 0] + coords[1:, 0]) / 2]
+        ys += [coords[:-1, 1], (coords[:-1, 1] + coords[1:, 1]) / 2]
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+pumas_xs, pumas_ys = gen_random_points(chi_bbox_pumas2020, 3000)
+neigh_xs, neigh_ys = gen_random_points(chi_bbox_neighborhoods, 3000)
+pumas_expected = scalar_codes(quadtree_chi_pumas2020, pumas_xs, pumas_ys)
+neigh_expected = scalar_codes(quadtree_chi_neighborhoods, neigh_xs, neigh_ys)
+
+
+def test_quadtree_ids():
+    assert len(quadtree_chi_pumas2020.ids) == 18
+    assert len(quadtree_chi_neighborhoods.ids) == 77
+
+
+def test_match_many_parity():
+    matched = quadtree_chi_pumas2020.match_many(pumas_xs, pumas_ys)
+    assert np.array_equal(matched, pumas_expected)
+    assert (matched >= 0).any() and (matched == -1).any()
+
+    matched = quadtree_chi_neighborhoods.match_many(neigh_xs, neigh_ys)
+    assert np.array_equal(matched, neigh_expected)
+
+
+def test_match_many_edge_cases():
+    bbox = chi_bbox_pumas2020
+    # Points on the bounding box or missing coordinates never match
+    xs = np.array([bbox.min_x, np.nan, -87.702945412])
+    ys = np.array([bbox.min_y, 41.8, 41.770565416])
+    matched = quadtree_chi_pumas2020.match_many(xs, ys)
+    assert list(matched[:2]) == [-1, -1]
+    assert quadtree_chi_pumas2020.ids[matched[2]] == "03165"
+
+    assert len(quadtree_chi_pumas2020.match_many([], [])) == 0
+
+
+def test_match_first():
+    for x, y in zip(neigh_xs[:500], neigh_ys[:500]):
+        match_lst = quadtree_chi_neighborhoods.match(Point(x, y))
+        first_lst = quadtree_chi_neighborhoods.match_xy(x, y, first=True)
+        assert first_lst == match_lst[:1]
+
+
+def test_frozen_quadtree():
+    frozen = quadtree_chi_neighborhoods.freeze()
+    assert frozen.ids == quadtree_chi_neighborhoods.ids
+    assert np.array_equal(frozen.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+    for x, y in zip(neigh_xs[:500], neigh_ys[:500]):
+        assert frozen.match_xy(x, y) == quadtree_chi_neighborhoods.match_xy(x, y)
+
+    frozen = quadtree_chi_pumas2020.freeze()
+    assert np.array_equal(frozen.match_many(pumas_xs, pumas_ys), pumas_expected)
+    # Points on the midlines of the root are outside every child
+    mid_x, mid_y = frozen.mid_x[0], frozen.mid_y[0]
+    assert frozen.match_xy(mid_x, 41.8) == quadtree_chi_pumas2020.match_xy(mid_x, 41.8)
+    assert list(frozen.match_many([mid_x], [mid_y])) == [-1]
+
+
+def test_save_load_frozen(tmp_path):
+    frozen = quadtree_chi_pumas2020.freeze()
+    frozen.save(tmp_path / "pumas.npz", "key")
+    loaded = FrozenQuadtree.load(tmp_path / "pumas.npz", "key")
+    assert loaded.ids == frozen.ids
+    assert np.array_equal(loaded.match_many(pumas_xs, pumas_ys), pumas_expected)
+
+    with pytest.raises(QuadtreeError):
+        FrozenQuadtree.load(tmp_path / "pumas.npz", "other key")
+
+
+def test_load_quadtree_cache(tmp_path):
+    for suffix in (".shp", ".shx", ".dbf"):
+        shutil.copy(path_neighborhoods.with_suffix(suffix), tmp_path)
+    path = tmp_path / "chicomm"
+    cache_path = tmp_path / "chicomm_neighborhoods.qtree.npz"
+
+    quadtree = load_quadtree(path)
+    assert cache_path.exists()
+    assert np.array_equal(quadtree.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+    # Reloaded from the cache without rebuilding it
+    mtime = cache_path.stat().st_mtime_ns
+    quadtree = load_quadtree(path)
+    assert cache_path.stat().st_mtime_ns == mtime
+    assert np.array_equal(quadtree.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+    # A different capacity makes the cache stale
+    quadtree = load_quadtree(path, capacity=10)
+    assert cache_path.stat().st_mtime_ns != mtime
+    assert np.array_equal(quadtree.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+
+def test_clipped_quadtree(tmp_path):
+    quadtree = gen_quadtree(pumas2020, chi_bbox_pumas2020, clip=True)
+    assert np.array_equal(quadtree.match_many(pumas_xs, pumas_ys), pumas_expected)
+    for x, y in zip(pumas_xs[:500], pumas_ys[:500]):
+        assert quadtree.match_xy(x, y) == quadtree_chi_pumas2020.match_xy(x, y)
+
+    # A small capacity gives leaves fully covered by one community area
+    quadtree = gen_quadtree(neighborhoods, chi_bbox_neighborhoods, 1, clip=True)
+    frozen = quadtree.freeze()
+    assert frozen.leaf_full.any()
+    assert np.array_equal(frozen.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+    frozen.save(tmp_path / "neighborhoods.npz")
+    loaded = FrozenQuadtree.load(tmp_path / "neighborhoods.npz")
+    assert loaded.clipped
+    assert np.array_equal(loaded.match_many(neigh_xs, neigh_ys), neigh_expected)
+
+
+def test_rtree():
+    rtree = gen_quadtree(neighborhoods, chi_bbox_neighborhoods, index="rtree")
+    assert rtree.ids == quadtree_chi_neighborhoods.ids
+    assert np.array_equal(rtree.match_many(neigh_xs, neigh_ys), neigh_expected)
+    for x, y in zip(neigh_xs[:500], neigh_ys[:500]):
+        assert rtree.match_xy(x, y) == quadtree_chi_neighborhoods.match_xy(x, y)
+
+    # All the leaves at the same depth, every node but the last one full
+    rtree = gen_quadtree(pumas2020, chi_bbox_pumas2020, 4, index="rtree")
+    assert [len(level[1]) for level in rtree.levels] == [1, 2, 5]
+    assert np.array_equal(rtree.match_many(pumas_xs, pumas_ys), pumas_expected)
+
+
+def test_lookup_grid():
+    grid = LookupGrid.from_index(quadtree_chi_pumas2020, resolution=128)
+    assert OUTSIDE in grid.cell_codes and AMBIGUOUS in grid.cell_codes
+    assert (grid.cell_codes >= 0).mean() > 0.3
+    counters = grid.enable_counters()
+    assert np.array_equal(grid.match_many(pumas_xs, pumas_ys), pumas_expected)
+
+    report = counters.report()
+    assert report["queries"] == len(pumas_xs)
+    assert 0 < report["exact_fraction"] < 0.2
+    assert report["contains_tests"] >= report["exact_queries"]
+
+    frozen = quadtree_chi_neighborhoods.freeze()
+    grid = LookupGrid.from_index(frozen, resolution=64)
+    assert np.array_equal(grid.match_many(neigh_xs, neigh_ys), neigh_expected)
+    counters = grid.enable_counters()
+    grid.approximate()
+    for x, y in zip(neigh_xs[:500], neigh_ys[:500]):
+        assert grid.match_xy(x, y) == quadtree_chi_neighborhoods.match_xy(x, y)
+    assert counters.queries == 500
+    assert counters.inner_hits + counters.outer_rejects > 0
+
+
+def test_quadtree_tuning(tmp_path):
+    results = tune_layer(neighborhoods, neigh_xs, neigh_ys, (3, 5), (4, 8))
+    assert len(results) == 4
+    assert results[0].points_per_second >= results[-1].points_per_second
+
+    # Every configuration matches the same divisions
+    for result in results:
+        quadtree = gen_quadtree(
+            neighborhoods, chi_bbox_neighborhoods, result.capacity,
+            max_depth=result.max_depth
+        )
+        assert np.array_equal(quadtree.match_many(neigh_xs, neigh_ys),
+                              neigh_expected)
+
+    config_path = tmp_path / "quadtree_config.json"
+    assert read_quadtree_config("neighborhoods", config_path) == {
+        "capacity": 5, "max_depth": 8
+    }
+    save_best_config({"neighborhoods": results[0]}, config_path)
+    assert read_quadtree_config("neighborhoods", config_path) == {
+        "capacity": results[0].capacity, "max_depth": results[0].max_depth
+    }
+    assert read_quadtree_config("pumas2020", config_path) == {
+        "capacity": 5, "max_depth": 8
+    }
+
+    # The multi-layer index is tuned as one more target
+    layers = {"pumas2020": pumas2020, "neighborhoods": neighborhoods}
+    results = tune_layer(layers, neigh_xs, neigh_ys, (3, 5), (8,))
+    assert len(results) == 2
+    save_best_config({MULTI_LAYER: results[0]}, config_path)
+    assert read_quadtree_config(MULTI_LAYER, config_path) == {
+        "capacity": results[0].capacity, "max_depth": 8
+    }
+
+
+def test_multi_layer_index(tmp_path):
+    index = MultiLayerIndex.from_layers(
+        {"pumas2020": pumas2020, "neighborhoods": neighborhoods}
+    )
+    assert index.layers == ["pumas2020", "neighborhoods"]
+    assert index.layer_ids["neighborhoods"] == quadtree_chi_neighborhoods.ids
+
+    # Same matches as one quadtree per layer
+    xs = np.concatenate([pumas_xs, neigh_xs])
+    ys = np.concatenate([pumas_ys, neigh_ys])
+    codes = index.match_many(xs, ys)
+    assert np.array_equal(
+        codes[:, 0], quadtree_chi_pumas2020.match_many(xs, ys)
+    )
+    assert np.array_equal(
+        codes[:, 1], quadtree_chi_neighborhoods.match_many(xs, ys)
+    )
+
+    assigned = index.assign(xs, ys)
+    for code, pid in zip(codes[:, 1], assigned["neighborhoods"]):
+        assert pid == (None if code < 0 else quadtree_chi_neighborhoods.ids[code])
+    assert index.match_xy(xs[0], ys[0]) == {
+        "pumas2020": assigned["pumas2020"][0],
+        "neighborhoods": assigned["neighborhoods"][0],
+    }
+
+    # Saved and reloaded with the layers
+    index.quadtree.save(tmp_path / "multi_layer.qtree.npz")
+    index = MultiLayerIndex(FrozenQuadtree.load(tmp_path / "multi_layer.qtree.npz"))
+    assert index.layers == ["pumas2020", "neighborhoods"]
+    assert np.array_equal(index.match_many(xs, ys), codes)
+
+
+def test_query_counters():
+    frozen = quadtree_chi_pumas2020.freeze()
+    assert "match_xy" not in vars(frozen)
+
+    counters = frozen.enable_counters()
+    for x, y in zip(pumas_xs, pumas_ys):
+        frozen.match_xy(x, y, first=True)
+    scalar = counters.report()
+    assert scalar["queries"] == len(pumas_xs)
+    assert scalar["contains_tests"] > 0
+    assert sum(scalar["leaf_occupancy"].values()) <= len(pumas_xs)
+
+    # The batched path does the same work
+    counters.reset()
+    assert np.array_equal(frozen.match_many(pumas_xs, pumas_ys), pumas_expected)
+    assert counters.report() == scalar
+
+    frozen.disable_counters()
+    assert "match_xy" not in vars(frozen)
+    assert frozen.counters is None
+
+    counters = quadtree_chi_pumas2020.enable_counters()
+    codes = [
+        quadtree_chi_pumas2020.match_xy(x, y, first=True)
+        for x, y in zip(pumas_xs, pumas_ys)
+    ]
+    assert counters.contains_tests == scalar["contains_tests"]
+    assert counters.nodes_visited == scalar["nodes_visited"]
+    quadtree_chi_pumas2020.disable_counters()
+    assert codes == [quadtree_chi_pumas2020.match_xy(x, y, True)
+                     for x, y in zip(pumas_xs, pumas_ys)]
+
+
+def test_stats():
+    stats = quadtree_chi_neighborhoods.stats()
+    assert stats == quadtree_chi_neighborhoods.freeze().stats()
+    assert stats["polygons"] == len(neighborhoods)
+    assert stats["leaves"] == sum(stats["depth_histogram"].values())
+    assert stats["leaves"] == sum(stats["leaf_occupancy_histogram"].values())
+    assert stats["nodes"] == 1 + 4 * (stats["leaves"] - 1) // 3
+    assert stats["max_depth"] <= 8
+    assert stats["duplication_factor"] >= 1
+
+
+def test_multipart_polygons(tmp_path):
+    # Shapes with several parts are loaded as valid (Multi)Polygons
+    assert all(puma.polygon.is_valid for puma in pumas2020)
+    assert all(neigh.polygon.is_valid for neigh in neighborhoods)
+    assert any(puma.polygon.geom_type == "MultiPolygon" for puma in pumas2020)
+    assert any(len(neigh.polygon.interiors) for neigh in neighborhoods
+               if neigh.polygon.geom_type == "Polygon")
+
+    # Each part is stored on its own leaves, and matches are the same as a
+    # brute-force search over the whole polygons
+    frozen = quadtree_chi_pumas2020.freeze()
+    assert frozen.clipped
+    for division, quadtree, xs, ys, expected in (
+        (pumas2020, quadtree_chi_pumas2020, pumas_xs, pumas_ys, pumas_expected),
+        (neighborhoods, quadtree_chi_neighborhoods, neigh_xs, neigh_ys,
+         neigh_expected),
+    ):
+        brute = np.full(len(xs), -1)
+        for div in reversed(division):
+            brute[contains_xy(div.polygon, xs, ys)] = quadtree.codes[div.id]
+        assert np.array_equal(brute, expected)
+
+    # Only the parts are saved apart, each once, and not the leaf entries
+    # holding a whole polygon
+    frozen.save(tmp_path / "pumas.npz")
+    with np.load(tmp_path / "pumas.npz") as data:
+        refs = data["leaf_geom_refs"]
+        assert len(data["leaf_wkb_offsets"]) - 1 == len(np.unique(refs[refs >= 0]))
+        assert (refs < 0).sum() > len(refs) // 2
+        assert data["leaf_wkb"].nbytes < data["wkb"].nbytes
+    loaded = FrozenQuadtree.load(tmp_path / "pumas.npz")
+    assert np.array_equal(loaded.match_many(pumas_xs, pumas_ys), pumas_expected)
+    whole = loaded.leaf_geoms[refs < 0]
+    assert all(geom is loaded.polygons[code]
+               for geom, code in zip(whole, loaded.leaf_polygons[refs < 0]))
+
+
+def test_ray_casting():
+    # Polygons with holes and multiple parts, against shapely
+    for div in pumas2020 + neighborhoods:
+        rings = RingPolygon.from_geometry(div.polygon)
+        assert np.array_equal(rings.contains_xy(pumas_xs, pumas_ys),
+                              contains_xy(div.polygon, pumas_xs, pumas_ys))
+
+    square = RingPolygon(
+        [(0, 0), (0, 4), (4, 4), (4, 0), (0, 0), (1, 1), (3, 1), (3, 3), (1, 1)],
+        [0, 5, 9],
+    )
+    inside = square.contains_xy([0.5, 2.5, 2, 5, -1], [2, 1.5, 3.5, 2, 2])
+    assert inside.tolist() == [True, False, True, False, False]
+    assert not RingPolygon(np.empty((0, 2)), [0]).contains_xy([0], [0]).any()
+
+    for clip in (False, True):
+        quadtree = gen_quadtree(pumas2020, chi_bbox_pumas2020, clip=clip,
+                                backend="numpy")
+        assert np.array_equal(quadtree.match_many(pumas_xs, pumas_ys),
+                              pumas_expected)
+        frozen = quadtree.freeze()
+        assert frozen.backend == "numpy"
+        assert np.array_equal(frozen.match_many(pumas_xs, pumas_ys),
+                              pumas_expected)
+
+    with pytest.raises(QuadtreeError):
+        gen_quadtree(pumas2020, chi_bbox_pumas2020, backend="fortran")
+
+
+def test_morton_order():
+    bbox = BBox(0, 0, 1, 1)
+    codes = morton_codes([0.1, 0.9, 0.1, 0.9, np.nan, 5], [0.1, 0.1, 0.9, 0.9, 0, 5],
+                         bbox, bits=1)
+    assert codes.tolist() == [0, 1, 2, 3, 0, 3]
+
+    # Sorted by code over the bbox of the tree, the points of each leaf are
+    # consecutive
+    order = morton_order(neigh_xs, neigh_ys, chi_bbox_neighborhoods)
+    assert sorted(order.tolist()) == list(range(len(neigh_xs)))
+    leaves = quadtree_chi_neighborhoods.freeze().locate_leaves(
+        neigh_xs[order], neigh_ys[order])
+    leaves = leaves[leaves >= 0]
+    assert np.count_nonzero(np.diff(leaves)) + 1 == len(np.unique(leaves))
+
+    crimes = [Crime(str(i), y, x, "", 2023, "", "", "", None, None)
+              for i, (x, y) in enumerate(zip(neigh_xs, neigh_ys))]
+    crimes.append(Crime("missing", "", "", "", 2023, "", "", "", None, None))
+    divisions = assign_division_to_list(crimes, quadtree_chi_neighborhoods, True)
+    assert divisions == assign_division_to_list(crimes, quadtree_chi_neighborhoods)
+    assert divisions[-1] is None
+
+
+def test_assign_division_ids():
+    crimes = [Crime(str(i), y, x, "", 2023, "", "", "", None, "0001")
+              for i, (x, y) in enumerate(zip(neigh_xs, neigh_ys))]
+    crimes.append(Crime("missing", "", "", "", 2023, "", "", "", None, None))
+    expected = assign_division_to_list(crimes, quadtree_chi_pumas2020)
+    xs, ys = coordinate_columns(crimes)
+    assert np.isnan(xs[-1]) and np.isnan(ys[-1])
+    for quadtree in (quadtree_chi_pumas2020, quadtree_chi_pumas2020.freeze()):
+        for morton in (False, True):
+            ids = assign_division_ids(xs, ys, quadtree, morton)
+            assert ids.tolist() == expected
+
+    # Rows without a match are dropped, the other columns are kept
+    matched = [crime for crime, puma in zip(crimes, expected) if puma is not None]
+    by_puma = assign_puma_neighborhood(crimes, quadtree_chi_pumas2020, "puma")
+    assert list(by_puma.case_number) == [crime.case_number for crime in matched]
+    assert list(by_puma.puma) == [puma for puma in expected if puma is not None]
+    assert (by_puma.neighborhood == "0001").all()
+    assert [crime.puma for crime in assign_puma_to_list(
+        crimes, quadtree_chi_pumas2020)] == list(by_puma.puma)
+
+    # A DataFrame works too, and is not modified
+    data = pd.DataFrame(crimes)
+    assert assign_puma_neighborhood(data, quadtree_chi_pumas2020, "puma").equals(
+        by_puma)
+    assert list(data.puma) == [None] * len(crimes)
+
+
+def test_approximations():
+    # Inner rectangles are inside the polygon, the outer ones cover it
+    polygon = neighborhoods[0].polygon
+    approx = PolygonApproximation(polygon, 16)
+    assert all(polygon.covers(box(*rect)) for rect in approx.rectangles(INSIDE))
+    outer = [box(*rect) for state in (INSIDE, BOUNDARY)
+             for rect in approx.rectangles(state)]
+    assert sum(rect.area for rect in outer) >= polygon.area
+    # Points on the boundary always need the exact test
+    x, y = polygon.exterior.coords[0]
+    assert approx.classify_xy(x, y) == BOUNDARY
+
+    quadtree = gen_quadtree(pumas2020, chi_bbox_pumas2020)
+    with pytest.raises(QuadtreeError):
+        quadtree.children[0].approximate()
+    counters = quadtree.enable_counters()
+    for x, y in zip(pumas_xs, pumas_ys):
+        quadtree.match_xy(x, y, first=True)
+    exact = counters.report()
+    counters.reset()
+    quadtree.match_many(pumas_xs, pumas_ys)
+    batch = counters.report()
+
+    quadtree.approximate(32)
+    counters.reset()
+    for x, y, expected in zip(pumas_xs, pumas_ys, pumas_expected):
+        match = quadtree.match_xy(x, y, first=True)
+        assert (quadtree.codes[match[0]] if match else -1) == expected
+    report = counters.report()
+    assert report["exact_fraction"] < exact["exact_fraction"] / 2
+    assert report["inner_hits"] > 0 and report["outer_rejects"] > 0
+
+    # The batched path does not use them
+    counters.reset()
+    assert np.array_equal(quadtree.match_many(pumas_xs, pumas_ys), pumas_expected)
+    assert counters.report() == batch
+    quadtree.disable_counters()
+
+    # The approximations are kept by freeze, and the scalar path of the
+    # frozen tree does the same work
+    frozen = quadtree.freeze()
+    assert frozen.approximations is quadtree.approximations
+    assert np.array_equal(scalar_codes(frozen, pumas_xs, pumas_ys),
+                          pumas_expected)
+    counters = frozen.enable_counters()
+    for x, y in zip(pumas_xs, pumas_ys):
+        frozen.match_xy(x, y, first=True)
+    for key in ("contains_tests", "inner_hits", "outer_rejects", "exact_queries"):
+        assert counters.report()[key] == report[key]
+    frozen.disable_counters()
+    # Back to the approximations only
+    assert vars(frozen)["match_xy"].keywords == {
+        "counters": None, "approximations": frozen.approximations
+    }
+
+    frozen.backend = "numpy"
+    assert np.array_equal(frozen.match_many(pumas_xs, pumas_ys), pumas_expected)
+    frozen.drop_approximations()
+    assert "match_xy" not in vars(frozen)
+    assert np.array_equal(frozen.match_many(pumas_xs, pumas_ys), pumas_expected)
+
+
+def test_query_polygon():
+    frozen = quadtree_chi_neighborhoods.freeze()
+    polygon = pumas2020[0].polygon
+    expected = [neigh.id for neigh in neighborhoods
+                if neigh.polygon.intersects(polygon)]
+    assert quadtree_chi_neighborhoods.query_polygon(polygon) == expected
+    assert frozen.query_polygon(polygon) == expected
+    assert frozen.query_polygon(box(0, 0, 1, 1)) == []
+    grid = LookupGrid.from_index(frozen, resolution=64)
+    assert grid.query_polygon(polygon) == expected
+    assert grid.query_polygon(box(0, 0, 1, 1)) == []
+
+    rows, codes, areas = frozen.overlap_areas([puma.polygon for puma in pumas2020])
+    for tree in (quadtree_chi_neighborhoods, frozen):
+        for result, other in zip((rows, codes, areas), tree.overlap_areas(
+                [puma.polygon for puma in pumas2020])):
+            assert np.array_equal(result, other)
+    assert (areas > 0).all()
+    for row, code, area in zip(rows[:50], codes[:50], areas[:50]):
+        overlap = pumas2020[row].polygon.intersection(frozen.geoms[code])
+        assert overlap.area == pytest.approx(area)
+
+
+def test_shared_quadtree():
+    frozen = quadtree_chi_pumas2020.freeze()
+    with SharedQuadtree.share(frozen) as shared:
+        assert np.array_equal(shared.match_many(pumas_xs, pumas_ys),
+                              pumas_expected)
+        assert np.array_equal(scalar_codes(shared, pumas_xs[:300], pumas_ys[:300]),
+                              pumas_expected[:300])
+        # Pickling only sends the handle, and attaching twice reuses the tree
+        assert len(pickle.dumps(shared)) < shared.nbytes
+        assert pickle.loads(pickle.dumps(shared)) is shared
+        assert not shared.leaf_polygons.flags.writeable
+        # Same hash as the tree it was shared from (e.g. for a CoordinateCache)
+        assert shared.content_hash == index_hash(frozen)
+        assert index_hash(shared) == index_hash(frozen)
+        with pytest.raises(QuadtreeError):
+            shared.save("shared.qtree.npz")
+        # As in the saved file, only the parts are stored apart, each once
+        assert shared.arrays["leaf_wkb"].nbytes < shared.arrays["wkb"].nbytes
+        refs = shared.arrays["leaf_geom_refs"]
+        assert all(geom is shared.polygons[code]
+                   for geom, code in zip(shared.leaf_geoms[refs < 0],
+                                         shared.leaf_polygons[refs < 0]))
+
+        # A spawned worker attaches to the same block
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            matched = pool.apply(shared.match_many, (pumas_xs, pumas_ys))
+        assert np.array_equal(matched, pumas_expected)
+        name = shared.handle.name
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+    # The shared polygons are the exact geometries of the tree: same answers
+    # on the boundaries, with either backend
+    xs, ys = gen_boundary_points(pumas2020, step=3)
+    for backend in ("shapely", "numpy"):
+        frozen.backend = backend
+        with SharedQuadtree.share(frozen) as shared:
+            assert shared.backend == backend
+            assert np.array_equal(shared.match_many(xs, ys),
+                                  frozen.match_many(xs, ys))
+            assert shapely.equals_exact(shared.polygons, frozen.polygons).all()
+
+
+def test_parallel_matcher():
+    for context in ("fork", "spawn"):
+        with ParallelMatcher(quadtree_chi_neighborhoods, 2, chunk_size=700,
+                             context=context) as matcher:
+            assert np.array_equal(matcher.match_many(neigh_xs, neigh_ys),
+                                  neigh_expected)
+            assert len(matcher.match_many([], [])) == 0
+            assert matcher.ids == quadtree_chi_neighborhoods.ids
+
+    # Vertices and edges give the same answers as the serial path
+    frozen = quadtree_chi_neighborhoods.freeze()
+    xs, ys = gen_boundary_points(neighborhoods)
+    with ParallelMatcher(frozen, 2) as matcher:
+        assert np.array_equal(matcher.match_many(xs, ys), frozen.match_many(xs, ys))
+        assert matcher.shared.backend == frozen.backend == "shapely"
+    frozen.backend = "numpy"
+    with ParallelMatcher(frozen, 2) as matcher:
+        assert np.array_equal(matcher.match_many(xs, ys), frozen.match_many(xs, ys))
+    # A shared tree is used as is, unless another backend is asked for
+    with SharedQuadtree.share(frozen) as shared:
+        with ParallelMatcher(shared, 2) as matcher:
+            assert matcher.shared is shared
+        with ParallelMatcher(shared, 2, backend="shapely") as matcher:
+            assert matcher.shared is not shared
+            assert matcher.backend == "shapely"
+
+    crimes = [Crime(str(i), y, x, "", 2023, "", "", "", None, None)
+              for i, (x, y) in enumerate(zip(pumas_xs, pumas_ys))]
+    serial = assign_puma_neighborhood(crimes, quadtree_chi_pumas2020, "puma")
+    parallel = assign_puma_neighborhood(crimes, quadtree_chi_pumas2020, "puma",
+                                        workers=2)
+    assert parallel.equals(serial)
+    # The workers of assign_puma_neighborhood can share the numpy polygons
+    # instead (same answers off the boundaries)
+    shared_numpy = assign_puma_neighborhood(crimes, quadtree_chi_pumas2020,
+                                            "puma", workers=2,
+                                            worker_backend="numpy")
+    assert shared_numpy.equals(serial)
+    with ParallelMatcher(quadtree_chi_pumas2020, 2, backend="numpy") as matcher:
+        assert matcher.backend == matcher.shared.backend == "numpy"
+        assert "backend='numpy'" in repr(matcher)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from andes_indus.crime_utils import crime_table, process_results
+from andes_indus.join_data import group_crime_data_by
+from andes_indus.merge_shp import assign_divisions, load_multi_layer_index
+from andes_indus.records import RecordTable
+
+# Records as returned by the API: strings, and missing fields left out
+api_sample = [
+    {
+        "case_number": f"JC{i:06d}",
+        "latitude": str(41.75 + 0.01 * (i % 20)),
+        "longitude": str(-87.70 + 0.01 * (i % 15)),
+        "block": ["067XX S KEDZIE AVE", "038XX W DIVERSEY AVE"][i % 2],
+        "date": f"{[2023, 2013, 2018][i % 3]}-04-12T08:30:00.000",
+        "primary_type": ["HOMICIDE", "ROBBERY", "ASSAULT", "THEFT"][i % 4],
+        "description": ["AGGRAVATED - HANDGUN", "SIMPLE", "ARMED"][i % 3],
+    }
+    for i in range(300)
+]
+del api_sample[5]["latitude"], api_sample[7]["description"]
+
+crimes = process_results(api_sample, [], True)
+table = crime_table(api_sample)
+
+
+def test_crime_table():
+    assert len(table) == len(crimes) == 299
+    assert table["year"].dtype == np.int16
+    assert isinstance(table["primary_type"], pd.Categorical)
+    expected = pd.DataFrame(crimes).astype(object)
+    frame = table.to_frame()
+    assert frame.astype(object).where(frame.notna(), None).equals(expected)
+
+    # No copies: pandas columns and slices by year are views of the table
+    assert np.shares_memory(frame["latitude"].to_numpy(), table["latitude"])
+    by_year = table.sort_by_year()
+    assert by_year.sort_by_year() is by_year
+    years = by_year.split_years()
+    assert sorted(years) == [2013, 2018, 2023]
+    assert sum(len(part) for part in years.values()) == len(table)
+    assert np.shares_memory(years[2018]["longitude"], by_year["longitude"])
+    assert (years[2018]["year"] == 2018).all()
+    assert list(table.by_year(2023)["case_number"]) == \
+        [crime.case_number for crime in crimes if crime.year == 2023]
+
+
+def test_concat():
+    both = RecordTable.concat([table[:100], crime_table(api_sample[:50])])
+    # one of the first 50 records has no coordinates
+    assert len(both) == 149
+    assert list(both["primary_type"][100:]) == list(table["primary_type"][:49])
+    with pytest.raises(ValueError):
+        table.with_column("puma", np.empty(3))
+
+
+def test_assign_and_group_table():
+    index = load_multi_layer_index()
+    from_table = assign_divisions(table, index)
+    from_list = assign_divisions(crimes, index)
+    assert list(from_table["pumas2020"]) == list(from_list["pumas2020"])
+    grouped = group_crime_data_by(
+        from_table.assign(puma=from_table["pumas2020"]).dropna(subset="puma"), "puma"
+    )
+    expected = group_crime_data_by(
+        from_list.assign(puma=from_list["pumas2020"]).dropna(subset="puma"), "puma"
+    )
+    assert grouped.astype({"year": int}).equals(expected)
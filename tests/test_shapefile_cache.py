@@ -0,0 +1,57 @@
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from andes_indus.cache_utils import arrays_to_frame, frame_to_arrays
+from andes_indus.shapefile_cache import load_frame, load_shapefile, shapefile_cache_path
+
+path_pumas = Path("data/shapefiles/pumas/pumas2022")
+path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
+
+
+def test_frame_arrays():
+    frame = pd.DataFrame({"id": ["0001", None, "0003"],
+                          "count": np.array([1, 2, 3], dtype=np.int32),
+                          "rate": [0.5, np.nan, 1.0]})
+    restored = arrays_to_frame(frame_to_arrays(frame))
+    assert list(restored.columns) == ["id", "count", "rate"]
+    assert restored["id"].tolist()[::2] == ["0001", "0003"]
+    assert restored["id"].isna().tolist() == [False, True, False]
+    assert restored["count"].dtype == np.int32
+    assert np.array_equal(restored["rate"], frame["rate"], equal_nan=True)
+
+
+def test_load_shapefile(tmp_path):
+    for name in ("chicomm.shp", "chicomm.shx", "chicomm.dbf", "chicomm.prj"):
+        shutil.copy(path_neighborhoods.with_name(name), tmp_path / name)
+    expected = gpd.read_file(path_neighborhoods.with_suffix(".shp"))
+    frame = load_shapefile(tmp_path / "chicomm")
+    cache_path = tmp_path / "chicomm.wkb.npz"
+    assert cache_path.exists()
+    cached = load_shapefile(tmp_path / "chicomm")
+    for loaded in (frame, cached):
+        assert loaded.drop(columns="geometry").equals(
+            expected.drop(columns="geometry"))
+        assert loaded.crs == expected.crs
+        assert all(loaded.geometry.geom_equals(expected.geometry))
+
+    # A filter has its own cache file, and the unfiltered one is kept
+    where = ("DISTITLE", "Loop")
+    chicago = load_shapefile(tmp_path / "chicomm", where=where)
+    assert chicago["DISTITLE"].tolist() == ["Loop"]
+    assert shapefile_cache_path(tmp_path / "chicomm", where) == (
+        tmp_path / "chicomm.DISTITLE_Loop.wkb.npz")
+    assert len(load_frame(shapefile_cache_path(tmp_path / "chicomm", where))) == 1
+    assert len(load_frame(cache_path)) == len(expected)
+
+
+def test_load_chicago_pumas():
+    pumas = load_shapefile(path_pumas, where=("NAMELSAD20", "Chicago City"))
+    assert len(pumas) == 18
+    assert pumas["NAMELSAD20"].str.startswith("Chicago City").all()
+    every_puma = gpd.read_file(path_pumas.with_suffix(".shp"))
+    expected = every_puma[every_puma["PUMACE20"].isin(pumas["PUMACE20"])]
+    assert all(pumas.geometry.geom_equals(expected.geometry.reset_index(drop=True)))
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from andes_indus.crime_utils import Crime
+from andes_indus.merge_shp import (
+    assign_puma_neighborhood,
+    gen_chi_bbox,
+    gen_quadtree,
+    load_neighborhood_shp,
+)
+from andes_indus.spatial_join import (
+    JOIN_BACKENDS,
+    compare_backends,
+    join_puma_neighborhood,
+    spatial_join,
+)
+
+path_neighborhoods = Path("data/shapefiles/chicomm/chicomm")
+neighborhoods = load_neighborhood_shp(path_neighborhoods)
+chi_bbox = gen_chi_bbox(neighborhoods)
+quadtree_chi_neighborhoods = gen_quadtree(neighborhoods, chi_bbox)
+
+rng = np.random.default_rng(30122)
+xs = rng.uniform(chi_bbox.min_x, chi_bbox.max_x, 5000)
+ys = rng.uniform(chi_bbox.min_y, chi_bbox.max_y, 5000)
+
+
+def test_backends_parity():
+    assert {"quadtree", "sjoin"} <= set(JOIN_BACKENDS)
+    results = compare_backends(neighborhoods, xs, ys, repeat=1)
+    assert [r.backend for r in results if r.mismatches] == []
+    assert len(results) == len(JOIN_BACKENDS)
+
+
+def test_spatial_join():
+    codes = quadtree_chi_neighborhoods.match_many(xs, ys)
+    expected = [quadtree_chi_neighborhoods.ids[code] if code >= 0 else None
+                for code in codes]
+    for backend in JOIN_BACKENDS:
+        assert list(spatial_join(neighborhoods, xs, ys, backend)) == expected
+
+    with pytest.raises(ValueError):
+        spatial_join(neighborhoods, xs, ys, "postgis")
+
+
+def test_join_puma_neighborhood():
+    crimes = [
+        Crime(str(i), y, x, "", 2023, "", "", "", None, None)
+        for i, (x, y) in enumerate(zip(xs[:500], ys[:500]))
+    ]
+    expected = assign_puma_neighborhood(
+        crimes, quadtree_chi_neighborhoods, "neighborhood"
+    )
+    for backend in ("quadtree", "sjoin"):
+        joined = join_puma_neighborhood(crimes, neighborhoods, "neighborhood",
+                                        backend)
+        assert joined.equals(expected)
+        # The same backend on the polygons of the tree
+        assert assign_puma_neighborhood(
+            crimes, quadtree_chi_neighborhoods, "neighborhood", backend=backend
+        ).equals(expected)
+
+    with pytest.raises(ValueError):
+        assign_puma_neighborhood(crimes, neighborhoods, "neighborhood",
+                                 backend="postgis")